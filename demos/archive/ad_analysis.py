@@ -4,24 +4,20 @@
 不搞花哨的，直接算核心指标，用数据说话
 """
 
-import pandas as pd
-import numpy as np
+import sys
 
-def analyze_ad_performance(csv_file):
-    """
-    分析广告数据，计算关键指标
-    "Bad programmers worry about the code. Good programmers worry about data structures."
-    - Linus Torvalds
-    """
-    # 读取数据 - 最简单直接的方式
-    df = pd.read_csv(csv_file)
-    
-    print("=== 原始数据检查 ===")
-    print(f"总共 {len(df)} 个广告")
-    print(f"涉及 {df['campaign'].nunique()} 个活动")
-    print()
-    
-    # 计算核心指标 - 没有特殊情况，就是简单的数学
+from alert_rules import load_alert_rules
+from marketing_schema import load_marketing_csv, widen_money
+from quantile_sketch import RATIO, MetricSketches
+from reporting import ConsoleReporter, Reporter
+from selection import select_k
+
+# 异常高CTR: 超过CTR上四分位数的倍数
+HIGH_CTR_MULTIPLIER = 2
+
+
+def compute_core_metrics(df):
+    """在df上原地追加CTR/转化率/ROI/CPC/CPA (比例值，不乘100)"""
     df['CTR'] = df['clicks'] / df['impressions']
     df['conversion_rate'] = df['conversions'] / df['clicks'] 
     df['ROI'] = (df['revenue'] - df['cost']) / df['cost']
@@ -29,18 +25,77 @@ def analyze_ad_performance(csv_file):
     # 计算CPC和CPA - 虽然题目没要求，但这是基础指标
     df['CPC'] = df['cost'] / df['clicks']
     df['CPA'] = df['cost'] / df['conversions']
+    return df
+
+
+def sketch_ad_metrics(csv_file, chunksize=100_000, k=200):
+    """
+    分块读取CSV，为CTR/转化率/ROI/CPA建分位数草图 (比例值，unit为RATIO)
+    建草图时整表不必进内存；各分区的草图可以merge后传给analyze_ad_performance
+    """
+    sketches = MetricSketches(k=k, unit=RATIO)
+    for chunk in load_marketing_csv(csv_file, chunksize=chunksize):
+        sketches.update(compute_core_metrics(widen_money(chunk)))
+    return sketches
+
+
+def analyze_ad_performance(csv_file, reporter: Reporter = None, sketches: MetricSketches = None,
+                           return_alerts: bool = False):
+    """
+    分析广告数据，计算关键指标
+    "Bad programmers worry about the code. Good programmers worry about data structures."
+    - Linus Torvalds
     
-    print("=== 关键指标汇总 ===")
-    print("Ad_ID  Campaign      CTR%    Conv%    ROI%     CPC    CPA     Revenue")
-    print("-" * 75)
-    
-    for _, row in df.iterrows():
-        print(f"{row['ad_id']:<6} {row['campaign']:<12} "
-              f"{row['CTR']*100:>6.2f}  {row['conversion_rate']*100:>6.2f}  "
-              f"{row['ROI']*100:>6.1f}   {row['CPC']:>6.1f}  {row['CPA']:>6.1f}   "
-              f"{row['revenue']:>7.0f}")
+    reporter默认输出完整控制台报告；批量任务传入静默/汇总reporter时不做任何格式化
+    传入sketches (见sketch_ad_metrics) 时，诊断用的均值和高CTR阈值取自草图而不是对整列排序；
+    这只替代阈值计算，CSV仍然整表读入 (逐广告明细和最差广告需要每一行)
+    草图均值按Series.mean()的方式处理±inf，分位数只基于有限值 (CTR只有展示数为0而点击数非0时才为inf)
+    返回 (df, worst_ads, campaign_stats)；return_alerts为True时追加 (rules, alert_bits)，规则位图供调用方复用，不再重复求值
+    """
+    if sketches is not None and sketches.unit != RATIO:
+        raise ValueError(f"analyze_ad_performance需要比例值草图 (unit={RATIO})，传入的是 {sketches.unit}")
+    reporter = reporter or ConsoleReporter()
+    out = reporter.line
+    
+    # 读取数据 - 按schema直接给出紧凑类型，ad_id保留前导零
+    df = load_marketing_csv(csv_file)
+    # 存储用紧凑类型，计算时金额恢复float64
+    df = widen_money(df)
+    
+    if reporter.verbose:
+        out("=== 原始数据检查 ===")
+        out(f"总共 {len(df)} 个广告")
+        out(f"涉及 {df['campaign'].nunique()} 个活动")
+        out()
     
-    print()
+    # 计算核心指标 - 没有特殊情况，就是简单的数学
+    compute_core_metrics(df)
+    
+    # 诊断用的均值和异常阈值只算一次，不在逐广告循环里重复扫描整列
+    if sketches is None:
+        metric_means = df[['CTR', 'conversion_rate', 'ROI']].mean().to_dict()
+        ctr_q3 = df['CTR'].quantile(0.75)
+    else:
+        metric_means = sketches.means(include_inf=True)
+        ctr_q3 = sketches.quantile('CTR', 0.75)
+    high_ctr_threshold = ctr_q3 * HIGH_CTR_MULTIPLIER
+    
+    # ROI告警阈值来自规则配置 (alert_rules.json的ad_analysis分组)，一次求值得到每个广告的位图
+    rules = load_alert_rules()
+    alert_bits = rules.evaluate(df, ['ad_analysis'])
+    
+    if reporter.verbose:
+        out("=== 关键指标汇总 ===")
+        out("Ad_ID  Campaign      CTR%    Conv%    ROI%     CPC    CPA     Revenue")
+        out("-" * 75)
+        
+        for _, row in df.iterrows():
+            out(f"{row['ad_id']:<6} {row['campaign']:<12} "
+                f"{row['CTR']*100:>6.2f}  {row['conversion_rate']*100:>6.2f}  "
+                f"{row['ROI']*100:>6.1f}   {row['CPC']:>6.1f}  {row['CPA']:>6.1f}   "
+                f"{row['revenue']:>7.0f}")
+        
+        out()
     
     # 找出表现最差的广告
     # Linus会说：用最简单的方法，综合评分然后排序
@@ -50,33 +105,36 @@ def analyze_ad_performance(csv_file):
         df['ROI'] * 0.4             # ROI权重40%（最重要）
     )
     
-    worst_ads = df.nsmallest(3, 'composite_score')
-    
-    print("=== 表现最差的3个广告 ===")
-    for i, (_, ad) in enumerate(worst_ads.iterrows(), 1):
-        print(f"\n{i}. 广告 {ad['ad_id']} ({ad['campaign']})")
-        print(f"   CTR: {ad['CTR']*100:.2f}% (点击率)")
-        print(f"   转化率: {ad['conversion_rate']*100:.2f}%")  
-        print(f"   ROI: {ad['ROI']*100:.1f}%")
-        print(f"   问题分析:")
-        
-        # 简单直接的问题诊断，不搞复杂算法
-        problems = []
-        if ad['CTR'] < df['CTR'].mean():
-            problems.append(f"点击率低于平均值({df['CTR'].mean()*100:.2f}%)")
-        if ad['conversion_rate'] < df['conversion_rate'].mean():
-            problems.append(f"转化率低于平均值({df['conversion_rate'].mean()*100:.2f}%)")
-        if ad['ROI'] < 0:
-            problems.append("ROI为负，亏损严重")
-        elif ad['ROI'] < df['ROI'].mean():
-            problems.append(f"ROI低于平均值({df['ROI'].mean()*100:.1f}%)")
+    # 部分选择最差的3个，不对全表排序
+    worst_positions = select_k(df['composite_score'].to_numpy(), 3)
+    worst_ads = df.iloc[worst_positions]
+    
+    if reporter.verbose:
+        out("=== 表现最差的3个广告 ===")
+        worst_negative = rules.mask(alert_bits[worst_positions], 'negative_roi')
+        for i, (_, ad) in enumerate(worst_ads.iterrows(), 1):
+            out(f"\n{i}. 广告 {ad['ad_id']} ({ad['campaign']})")
+            out(f"   CTR: {ad['CTR']*100:.2f}% (点击率)")
+            out(f"   转化率: {ad['conversion_rate']*100:.2f}%")  
+            out(f"   ROI: {ad['ROI']*100:.1f}%")
+            out(f"   问题分析:")
             
-        for problem in problems:
-            print(f"     - {problem}")
+            # 简单直接的问题诊断，不搞复杂算法
+            problems = []
+            if ad['CTR'] < metric_means['CTR']:
+                problems.append(f"点击率低于平均值({metric_means['CTR']*100:.2f}%)")
+            if ad['conversion_rate'] < metric_means['conversion_rate']:
+                problems.append(f"转化率低于平均值({metric_means['conversion_rate']*100:.2f}%)")
+            if worst_negative[i - 1]:
+                problems.append("ROI为负，亏损严重")
+            elif ad['ROI'] < metric_means['ROI']:
+                problems.append(f"ROI低于平均值({metric_means['ROI']*100:.1f}%)")
+                
+            for problem in problems:
+                out(f"     - {problem}")
     
     # 活动层面分析
-    print(f"\n=== 活动层面分析 ===")
-    campaign_stats = df.groupby('campaign').agg({
+    campaign_stats = df.groupby('campaign', observed=True).agg({
         'impressions': 'sum',
         'clicks': 'sum', 
         'conversions': 'sum',
@@ -89,55 +147,78 @@ def analyze_ad_performance(csv_file):
     campaign_stats['conversion_rate'] = campaign_stats['conversions'] / campaign_stats['clicks']
     campaign_stats['ROI'] = (campaign_stats['revenue'] - campaign_stats['cost']) / campaign_stats['cost']
     
-    print("Campaign        总展示   总点击  总转化   总成本   总收入    CTR%   Conv%   ROI%")
-    print("-" * 85)
-    for campaign, stats in campaign_stats.iterrows():
-        print(f"{campaign:<12} {stats['impressions']:>8.0f} {stats['clicks']:>8.0f} "
-              f"{stats['conversions']:>7.0f} {stats['cost']:>8.0f} {stats['revenue']:>8.0f} "
-              f"{stats['CTR']*100:>6.2f} {stats['conversion_rate']*100:>6.2f} {stats['ROI']*100:>6.1f}")
-    
-    # 数据洞察 - Linus式直接判断
-    print(f"\n=== 数据洞察与建议 ===")
-    
-    # 找异常值 - 用最简单的方法，不搞复杂统计
-    print("1. 异常数据点检测:")
-    if (df['CTR'] > df['CTR'].quantile(0.75) * 2).any():
-        high_ctr = df[df['CTR'] > df['CTR'].quantile(0.75) * 2]['ad_id'].tolist()
-        print(f"   - 异常高CTR广告: {high_ctr}")
-    
-    if (df['ROI'] < -0.5).any():
-        severe_loss = df[df['ROI'] < -0.5]['ad_id'].tolist() 
-        print(f"   - 严重亏损广告(ROI<-50%): {severe_loss}")
-    
-    # 活动表现排序
-    campaign_roi = campaign_stats.sort_values('ROI', ascending=False)
-    print(f"\n2. 活动表现排序(按ROI):")
-    for i, (campaign, stats) in enumerate(campaign_roi.iterrows(), 1):
-        status = "优秀" if stats['ROI'] > 1 else "一般" if stats['ROI'] > 0 else "亏损"
-        print(f"   {i}. {campaign}: ROI {stats['ROI']*100:.1f}% ({status})")
-    
+    reporter.event('analyze_ad_performance', ads=len(df), campaigns=len(campaign_stats),
+                   worst_ads=worst_ads['ad_id'].tolist())
+    
+    if reporter.verbose:
+        out(f"\n=== 活动层面分析 ===")
+        out("Campaign        总展示   总点击  总转化   总成本   总收入    CTR%   Conv%   ROI%")
+        out("-" * 85)
+        for campaign, stats in campaign_stats.iterrows():
+            out(f"{campaign:<12} {stats['impressions']:>8.0f} {stats['clicks']:>8.0f} "
+                f"{stats['conversions']:>7.0f} {stats['cost']:>8.0f} {stats['revenue']:>8.0f} "
+                f"{stats['CTR']*100:>6.2f} {stats['conversion_rate']*100:>6.2f} {stats['ROI']*100:>6.1f}")
+        
+        # 数据洞察 - Linus式直接判断
+        out(f"\n=== 数据洞察与建议 ===")
+        
+        # 找异常值 - 用最简单的方法，不搞复杂统计
+        out("1. 异常数据点检测:")
+        high_ctr_mask = df['CTR'] > high_ctr_threshold
+        if high_ctr_mask.any():
+            high_ctr = df.loc[high_ctr_mask, 'ad_id'].tolist()
+            out(f"   - 异常高CTR广告: {high_ctr}")
+        
+        severe_mask = rules.mask(alert_bits, 'severe_loss')
+        if severe_mask.any():
+            severe_loss = df.loc[severe_mask, 'ad_id'].tolist()
+            out(f"   - 严重亏损广告(ROI<{rules.rule('severe_loss')['when'][0][2]:.0%}): {severe_loss}")
+        
+        # 活动表现排序
+        campaign_roi = campaign_stats.sort_values('ROI', ascending=False)
+        out(f"\n2. 活动表现排序(按ROI):")
+        for i, (campaign, stats) in enumerate(campaign_roi.iterrows(), 1):
+            status = "优秀" if stats['ROI'] > 1 else "一般" if stats['ROI'] > 0 else "亏损"
+            out(f"   {i}. {campaign}: ROI {stats['ROI']*100:.1f}% ({status})")
+    
+    if return_alerts:
+        return df, worst_ads, campaign_stats, (rules, alert_bits)
     return df, worst_ads, campaign_stats
 
+def print_report(csv_file, reporter: Reporter = None):
+    """完整的广告报告: 标题、analyze_ad_performance的明细和最终结论 (quick_report.py有同样文字的纯Python实现)"""
+    reporter = reporter or ConsoleReporter()
+    out = reporter.line
+    
+    if reporter.verbose:
+        out("广告数据分析报告")
+        out("=" * 50)
+        out("分析师: Linus式数据驱动方法")
+        out("原则: 用数据说话，不搞理论，直接给结论\n")
+    
+    df, worst_ads, campaign_stats, (rules, alert_bits) = analyze_ad_performance(csv_file, reporter,
+                                                                                return_alerts=True)
+    if not reporter.verbose:
+        return df, worst_ads, campaign_stats
+    
+    out(f"\n=== 终极结论和建议 ===")
+    out("基于数据的硬核事实:")
+    out(f"1. 最差广告是 {worst_ads.iloc[0]['ad_id']}，ROI仅{worst_ads.iloc[0]['ROI']*100:.1f}%")
+    out(f"2. 最佳活动是 {campaign_stats.sort_values('ROI', ascending=False).index[0]}")
+    out(f"3. 整体平均ROI: {df['ROI'].mean()*100:.1f}%")
+    
+    out(f"\n立即行动建议:")
+    negative_roi = rules.mask(alert_bits, 'negative_roi')
+    out(f"1. 停掉ROI<0的广告: {list(df.loc[negative_roi, 'ad_id'])}")
+    out(f"2. 增加投入到最佳广告: {list(df.nlargest(2, 'ROI')['ad_id'])}")
+    out(f"3. 重点优化转化率<2%的广告")
+    
+    out(f"\n数据就是这样，不会撒谎。")
+    return df, worst_ads, campaign_stats
+
+
 if __name__ == "__main__":
     # Linus说：Keep it simple, stupid
-    csv_file = "/Users/zhangqingyue/Gaussian/test/learnagent/demo-data/sales-data.csv"
-    
-    print("广告数据分析报告")
-    print("=" * 50)
-    print("分析师: Linus式数据驱动方法")
-    print("原则: 用数据说话，不搞理论，直接给结论\n")
-    
-    df, worst_ads, campaign_stats = analyze_ad_performance(csv_file)
-    
-    print(f"\n=== 终极结论和建议 ===")
-    print("基于数据的硬核事实:")
-    print(f"1. 最差广告是 {worst_ads.iloc[0]['ad_id']}，ROI仅{worst_ads.iloc[0]['ROI']*100:.1f}%")
-    print(f"2. 最佳活动是 {campaign_stats.sort_values('ROI', ascending=False).index[0]}")
-    print(f"3. 整体平均ROI: {df['ROI'].mean()*100:.1f}%")
-    
-    print(f"\n立即行动建议:")
-    print(f"1. 停掉ROI<0的广告: {list(df[df['ROI'] < 0]['ad_id'])}")
-    print(f"2. 增加投入到最佳广告: {list(df.nlargest(2, 'ROI')['ad_id'])}")
-    print(f"3. 重点优化转化率<2%的广告")
-    
-    print(f"\n数据就是这样，不会撒谎。")
\ No newline at end of file
+    # 等同于 marketing_cli.py report [csv]
+    from marketing_cli import main
+    main(['report'] + sys.argv[1:])
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置驱动的告警规则
+规则从JSON文件加载 (默认同目录下的alert_rules.json，可用环境变量MARKETING_ALERT_RULES指定)，
+编译成一份执行计划: 相同的 (列, 比较, 阈值) 条件只计算一次，每列只取一次numpy数组，
+一次遍历得到每个广告的规则命中位图 (第i位 = 第i条规则)
+
+规则格式:
+  {"name": 规则名, "group": 分组, "when": [[列, 比较符, 阈值], ...], 其余字段原样保留}
+when中的条件全部成立时命中 (AND)；NaN参与比较时不命中
+anomaly规则可带 "range": [下限, 上限] 表示该指标的正常区间 (null为不设上限)，用于输出异常检测阈值
+分组: anomaly (异常检测，百分比单位)、optimization (dashboard优化清单，百分比单位)、
+ad_analysis (ad_analysis.py，指标为比例值，ROI=-0.5即-50%)
+规则文件修改后，下次加载时按mtime自动重新编译，不需要重新部署
+"""
+
+import json
+import operator
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alert_rules.json')
+
+# 环境变量: 指定另一份规则文件
+RULES_PATH_ENV = 'MARKETING_ALERT_RULES'
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# 位图最多容纳的规则数
+MAX_RULES = 64
+
+
+def _bits_dtype(count: int):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if count <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"规则数 {count} 超过上限 {MAX_RULES}")
+
+
+class RuleSet:
+    """编译后的规则集合，evaluate返回每行的命中位图"""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        self.names = [rule['name'] for rule in rules]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("规则名重复")
+        self.bits_dtype = _bits_dtype(len(rules))
+
+        # 执行计划: 去重后的条件列表，以及每条规则依赖的条件下标
+        self.conditions = []
+        self.rule_conditions = []
+        condition_index = {}
+        for rule in rules:
+            indices = []
+            for column, op, value in rule['when']:
+                if op not in OPERATORS:
+                    raise ValueError(f"规则 {rule['name']} 使用了不支持的比较符: {op}")
+                key = (column, op, float(value))
+                if key not in condition_index:
+                    condition_index[key] = len(self.conditions)
+                    self.conditions.append(key)
+                indices.append(condition_index[key])
+            self.rule_conditions.append(indices)
+        self.columns = sorted({column for column, _, _ in self.conditions})
+
+    def group(self, name: str) -> List[str]:
+        """某个分组的规则名，按定义顺序"""
+        return [rule['name'] for rule in self.rules if rule.get('group') == name]
+
+    def rule(self, name: str) -> Dict:
+        return self.rules[self.names.index(name)]
+
+    def bit(self, name: str) -> int:
+        return 1 << self.names.index(name)
+
+    def evaluate(self, frame: pd.DataFrame, groups: List[str] = None) -> np.ndarray:
+        """
+        对frame一次性计算规则位图；groups指定时只计算这些分组的规则 (其余位为0)
+        frame缺少某条规则用到的列时跳过该规则
+        """
+        selected = [i for i, rule in enumerate(self.rules)
+                    if (groups is None or rule.get('group') in groups)
+                    and all(column in frame for column, _, _ in rule['when'])]
+        needed = sorted({c for i in selected for c in self.rule_conditions[i]})
+
+        arrays = {column: frame[column].to_numpy(dtype='float64')
+                  for column in {self.conditions[c][0] for c in needed}}
+        results = {}
+        for c in needed:
+            column, op, value = self.conditions[c]
+            results[c] = OPERATORS[op](arrays[column], value)
+
+        bits = np.zeros(len(frame), dtype=self.bits_dtype)
+        for i in selected:
+            hit = np.logical_and.reduce([results[c] for c in self.rule_conditions[i]])
+            bits |= hit.astype(self.bits_dtype) << self.bits_dtype(i)
+        return bits
+
+    def mask(self, bits: np.ndarray, name: str) -> np.ndarray:
+        """位图中命中某条规则的行"""
+        return (bits & self.bits_dtype(self.bit(name))) != 0
+
+    def count(self, bits: np.ndarray, names: List[str]) -> np.ndarray:
+        """每行命中names中规则的条数"""
+        counts = np.zeros(len(bits), dtype=np.int64)
+        for name in names:
+            counts += self.mask(bits, name)
+        return counts
+
+
+_compiled: Dict[str, tuple] = {}
+
+
+def load_alert_rules(path: str = None) -> RuleSet:
+    """加载并编译规则文件，文件未变化时复用已编译的RuleSet"""
+    path = path or os.environ.get(RULES_PATH_ENV) or DEFAULT_RULES_PATH
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = (mtime, RuleSet(json.load(f)['rules']))
+        _compiled[path] = cached
+    return cached[1]
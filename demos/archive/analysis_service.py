@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻分析服务 - 本地HTTP/JSON接口
+进程常驻，分析结果保存在内存中并预先序列化，查询只是返回现成的字节；
+数据文件变化时在后台重新分析，完成后整体替换快照，读请求不加锁
+
+接口 (GET):
+  /dashboard   dashboard_data
+  /anomalies   异常广告
+  /worst       最差表现广告
+  /campaigns   campaign分析表
+  /insights    数据洞察与诊断
+  /quality     数据质量报告
+  /health      服务状态: 数据版本、加载时间、最近一次错误
+POST /reload 立即重新分析
+"""
+
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from data_cache import default_cache_dir
+from marketing_analysis import MarketingDataAnalyzer
+from reporting import REPORTERS, Reporter, make_reporter
+from result_export import encode_json
+
+# 路由 -> run_complete_analysis结果中的字段
+ROUTES = {
+    '/dashboard': 'dashboard_data',
+    '/anomalies': 'anomalies',
+    '/worst': 'worst_performers',
+    '/campaigns': 'campaign_analysis',
+    '/insights': 'insights',
+    '/quality': 'quality_report',
+}
+
+
+class AnalysisSnapshot:
+    """一次完整分析的只读快照，各接口的响应体在构建时就序列化好"""
+
+    def __init__(self, results: Dict, source_signature: Tuple, rows: int, seconds: float):
+        self.version = f"{source_signature[1]}-{source_signature[0]}"
+        self.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.rows = rows
+        self.analysis_seconds = round(seconds, 3)
+        self.bodies = {route: encode_json(results.get(key)) for route, key in ROUTES.items()}
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class AnalysisService:
+    """
+    持有最新的分析快照，并在数据文件变化时重新分析
+    重新分析在单独的锁下进行，失败时保留旧快照，下一轮轮询再试
+    """
+
+    def __init__(self, data_path: str, cache_dir: str = None, poll_interval: float = 2.0,
+                 reporter: Reporter = None):
+        self.data_path = data_path
+        self.cache_dir = cache_dir
+        self.poll_interval = poll_interval
+        self.reporter = reporter or Reporter()
+        self.snapshot: Optional[AnalysisSnapshot] = None
+        self.last_error: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def reload(self, force: bool = False) -> bool:
+        """数据文件有变化 (或force) 时重新分析并替换快照，返回是否替换"""
+        with self._reload_lock:
+            signature = _file_signature(self.data_path)
+            current = self.snapshot
+            if not force and current is not None and current.version == f"{signature[1]}-{signature[0]}":
+                return False
+
+            start = time.perf_counter()
+            try:
+                # 分析过程静默，服务只通过reporter报告加载事件
+                analyzer = MarketingDataAnalyzer(self.data_path, cache_dir=self.cache_dir,
+                                                 reporter=Reporter())
+                results = analyzer.run_complete_analysis()
+            except Exception as exc:  # 文件写到一半等情况，保留旧快照
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                self.reporter.event('service_reload_failed', error=self.last_error)
+                if self.reporter.verbose:
+                    self.reporter.line(f"⚠️  重新分析失败，继续使用旧数据: {self.last_error}")
+                return False
+
+            # 分析期间文件又变了时仍用本次结果，下一轮轮询会再次加载
+            self.snapshot = AnalysisSnapshot(results, signature, len(analyzer.metrics_data),
+                                             time.perf_counter() - start)
+            self.last_error = None
+            self.reporter.event('service_reload', rows=self.snapshot.rows,
+                                seconds=self.snapshot.analysis_seconds)
+            if self.reporter.verbose:
+                self.reporter.line(f"🔄 已加载 {self.snapshot.rows} 个广告 "
+                                   f"({self.snapshot.analysis_seconds}s)")
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except OSError as exc:  # 文件被替换的瞬间可能不存在
+                self.last_error = f"{type(exc).__name__}: {exc}"
+
+    def start_watching(self):
+        self._watcher = threading.Thread(target=self._watch, name='analysis-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def health(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            'status': 'ok' if snapshot is not None else 'loading',
+            'data_path': os.path.abspath(self.data_path),
+            'version': snapshot.version if snapshot else None,
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'rows': snapshot.rows if snapshot else None,
+            'analysis_seconds': snapshot.analysis_seconds if snapshot else None,
+            'last_error': self.last_error,
+        }
+
+
+def make_handler(service: AnalysisService):
+    """生成绑定到service的请求处理类"""
+
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, body: bytes, etag: str = None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/') or '/'
+            if path == '/health':
+                self._send(200, encode_json(service.health()))
+                return
+            if path not in ROUTES:
+                self._send(404, encode_json({'error': f"未知接口: {path}", 'routes': list(ROUTES)}))
+                return
+
+            # 只读一次快照引用，整个请求都使用同一版本的数据
+            snapshot = service.snapshot
+            if snapshot is None:
+                self._send(503, encode_json({'error': '数据加载中'}))
+                return
+            etag = f'"{snapshot.version}"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', etag)
+                return
+            self._send(200, snapshot.bodies[path], etag)
+
+        do_HEAD = do_GET
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/reload':
+                self._send(404, encode_json({'error': f"未知接口: {self.path}"}))
+                return
+            reloaded = service.reload(force=True)
+            self._send(200, encode_json({'reloaded': reloaded, **service.health()}))
+
+        def log_message(self, format, *args):
+            if service.reporter.verbose:
+                service.reporter.line(f"{self.address_string()} {format % args}")
+
+    return AnalysisRequestHandler
+
+
+def serve(data_path: str, host: str = '127.0.0.1', port: int = 8765, poll_interval: float = 2.0,
+          cache_dir: str = None, reporter: Reporter = None) -> ThreadingHTTPServer:
+    """首次分析完成后启动服务并返回server，调用方负责serve_forever/shutdown"""
+    service = AnalysisService(data_path, cache_dir, poll_interval, reporter)
+    service.reload(force=True)
+    service.start_watching()
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="营销分析常驻服务")
+    parser.add_argument('data', help="广告数据CSV路径")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="检查文件变化的间隔(秒)")
+    parser.add_argument('--no-cache', action='store_true', help="不使用解析结果缓存")
+    parser.add_argument('--report', default='console', choices=list(REPORTERS), help="服务日志模式")
+    args = parser.parse_args()
+
+    cache_dir = None if args.no_cache else default_cache_dir(args.data)
+    server = serve(args.data, args.host, args.port, args.poll_interval, cache_dir,
+                   make_reporter(args.report))
+    print(f"🚀 分析服务已启动: http://{args.host}:{server.server_address[1]}/dashboard")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
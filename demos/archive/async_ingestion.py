@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多数据源异步并发导入
+监视多个目录中落地的CSV文件和stdin管道，用线程池并发解析，
+解析出的数据块经有界队列交给累加器/分析器: 队列满时读取端暂停 (背压)，
+I/O等待与指标计算重叠进行，内存占用由队列长度和分块大小决定
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from marketing_analysis import CampaignAccumulator, MarketingDataAnalyzer, build_accumulated_results
+from marketing_schema import COUNTER_COLUMNS, MONEY_COLUMNS, compact_dtypes, load_marketing_csv
+from reporting import REPORTERS, ConsoleReporter, Reporter, make_reporter
+from result_export import export_results
+
+# 队列结束标记
+_DONE = object()
+
+# 累加器需要的列，数据块缺少其中任何一列时整个数据源记为错误
+REQUIRED_COLUMNS = ['campaign'] + COUNTER_COLUMNS + MONEY_COLUMNS
+
+
+class DirectorySource:
+    """
+    目录数据源: 按文件名顺序导入匹配pattern的文件，每个路径只导入一次
+    watch=True时持续轮询新文件，文件大小和mtime在两次轮询间不再变化才导入，避免读到写了一半的文件
+    """
+
+    def __init__(self, directory: str, pattern: str = '*.csv', watch: bool = False,
+                 poll_interval: float = 1.0):
+        self.directory = directory
+        self.pattern = pattern
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.label = directory
+        self._seen = set()
+        self._pending: Dict[str, tuple] = {}
+
+    def _scan(self) -> List[str]:
+        ready = []
+        for path in sorted(glob.glob(os.path.join(self.directory, self.pattern))):
+            if path in self._seen:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:  # 扫描和stat之间文件被移走
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if not self.watch or self._pending.get(path) == signature:
+                self._seen.add(path)
+                self._pending.pop(path, None)
+                ready.append(path)
+            else:
+                self._pending[path] = signature
+        return ready
+
+    async def paths(self, stop: asyncio.Event):
+        """逐个产出可以导入的文件路径"""
+        while True:
+            for path in self._scan():
+                yield path
+            if not self.watch or stop.is_set():
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+class StreamSource:
+    """流数据源 (默认stdin): 带表头的CSV，读到EOF为止"""
+
+    def __init__(self, stream=None, label: str = 'stdin'):
+        self.stream = stream
+        self.label = label
+
+
+class AsyncIngestor:
+    """
+    并发导入器
+    max_parallel: 同时解析的文件/流个数；queue_size: 已解析但未处理的数据块上限
+    每个数据块先并入CampaignAccumulator，keep_frames=True时还保留原始块供完整分析使用
+    """
+
+    def __init__(self, sources: List, max_parallel: int = 4, queue_size: int = 8,
+                 chunksize: int = 50_000, keep_frames: bool = False, reporter: Reporter = None):
+        self.sources = sources
+        self.max_parallel = max_parallel
+        self.queue_size = queue_size
+        self.chunksize = chunksize
+        self.keep_frames = keep_frames
+        self.reporter = reporter or ConsoleReporter()
+        self.accumulator = CampaignAccumulator()
+        self.frames: List[pd.DataFrame] = []
+        self.stats = {'files': 0, 'batches': 0, 'rows': 0, 'errors': []}
+
+    async def run(self, stop: asyncio.Event = None) -> CampaignAccumulator:
+        """导入全部数据源；watch模式的目录源持续运行到stop被设置"""
+        stop = stop or asyncio.Event()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        slots = asyncio.Semaphore(self.max_parallel)
+
+        # 解析线程与计算线程分开: 累加器只在单个线程里更新，不需要加锁
+        with ThreadPoolExecutor(self.max_parallel, thread_name_prefix='ingest-read') as read_pool, \
+                ThreadPoolExecutor(1, thread_name_prefix='ingest-compute') as compute_pool:
+            consumer = asyncio.create_task(self._consume(queue, compute_pool))
+            producers = [asyncio.create_task(self._produce(source, queue, slots, read_pool, stop))
+                         for source in self.sources]
+            producing = asyncio.gather(*producers)
+            try:
+                # 消费端异常退出后没有人再取队列，读取端会永远阻塞在put上: 先抛出消费端的异常，再取消读取端
+                await asyncio.wait([consumer, producing], return_when=asyncio.FIRST_COMPLETED)
+                if consumer.done():
+                    consumer.result()
+                producing.result()
+            finally:
+                for producer in producers:
+                    producer.cancel()
+                await asyncio.gather(producing, return_exceptions=True)
+                if not consumer.done():
+                    await queue.put(_DONE)
+                    await consumer
+
+        self.reporter.event('async_ingestion', **{k: v for k, v in self.stats.items() if k != 'errors'},
+                            errors=len(self.stats['errors']))
+        return self.accumulator
+
+    async def _produce(self, source, queue: asyncio.Queue, slots: asyncio.Semaphore,
+                       pool: ThreadPoolExecutor, stop: asyncio.Event):
+        if isinstance(source, StreamSource):
+            stream = source.stream or sys.stdin.buffer
+            await self._read(source.label, stream, queue, slots, pool)
+            return
+
+        tasks = []
+        async for path in source.paths(stop):
+            tasks.append(asyncio.create_task(self._read(path, path, queue, slots, pool)))
+            self.stats['files'] += 1
+        await asyncio.gather(*tasks)
+
+    async def _read(self, label: str, target, queue: asyncio.Queue, slots: asyncio.Semaphore,
+                    pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        async with slots:
+            try:
+                reader = await loop.run_in_executor(
+                    pool, lambda: load_marketing_csv(target, chunksize=self.chunksize))
+                while True:
+                    chunk = await loop.run_in_executor(pool, next, reader, None)
+                    if chunk is None:
+                        break
+                    missing = [col for col in REQUIRED_COLUMNS if col not in chunk]
+                    if missing:
+                        raise ValueError(f"缺少必需列 {missing}")
+                    # 队列满时在这里等待，暂停该来源的读取
+                    await queue.put((label, chunk))
+            except (OSError, ValueError, KeyError) as exc:
+                self._record_error(label, exc)
+                if self.reporter.verbose:
+                    self.reporter.line(f"⚠️  跳过无法解析的数据源 {label}: {exc}")
+
+    def _record_error(self, label: str, exc: Exception):
+        self.stats['errors'].append({'source': label, 'error': f"{type(exc).__name__}: {exc}"})
+
+    async def _consume(self, queue: asyncio.Queue, pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            label, chunk = item
+            try:
+                await loop.run_in_executor(pool, self.accumulator.update, chunk)
+            except (ValueError, KeyError, TypeError) as exc:
+                # 单个数据块出错只跳过该块，不能让消费端退出 (读取端会阻塞在满队列上)
+                self._record_error(label, exc)
+                if self.reporter.verbose:
+                    self.reporter.line(f"⚠️  跳过无法处理的数据块 {label}: {exc}")
+                continue
+            if self.keep_frames:
+                self.frames.append(chunk)
+            self.stats['batches'] += 1
+            self.stats['rows'] += len(chunk)
+            if self.reporter.verbose:
+                self.reporter.line(f"📥 {label}: +{len(chunk)} 行 (累计 {self.stats['rows']})")
+
+    def combined_data(self) -> pd.DataFrame:
+        """合并保留的数据块，campaign重新统一为categorical，计数列重新收缩"""
+        if not self.frames:
+            return pd.DataFrame()
+        data = pd.concat(self.frames, ignore_index=True)
+        data['campaign'] = data['campaign'].astype('category')
+        return compact_dtypes(data)
+
+
+def ingest_sources(sources: List, full_analysis: bool = False, max_parallel: int = 4,
+                   queue_size: int = 8, chunksize: int = 50_000, reporter: Reporter = None) -> Dict:
+    """
+    导入全部数据源并返回分析结果
+    full_analysis=False时只保留累加统计，结果结构与流式分析相同；
+    True时把导入的数据交给MarketingDataAnalyzer做完整分析 (没有导入任何行时同False)
+    """
+    reporter = reporter or ConsoleReporter()
+    ingestor = AsyncIngestor(sources, max_parallel, queue_size, chunksize,
+                             keep_frames=full_analysis, reporter=reporter)
+    
+    async def run():
+        # Ctrl+C只停止监视新文件，已开始的导入处理完再输出结果
+        stop = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows或非主线程
+            pass
+        return await ingestor.run(stop)
+    
+    accumulator = asyncio.run(run())
+
+    # 没有导入任何数据 (目录为空、全部数据源出错或watch模式下提前停止) 时，
+    # 完整分析无从谈起，返回累加器的空结果 (结构与流式分析相同)
+    if full_analysis and ingestor.frames:
+        analyzer = MarketingDataAnalyzer(reporter=reporter)
+        analyzer.data = ingestor.combined_data()
+        results = analyzer.run_complete_analysis()
+    else:
+        results = build_accumulated_results(accumulator)
+    results['ingestion'] = ingestor.stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多数据源异步导入并分析")
+    parser.add_argument('directories', nargs='*', help="存放CSV文件的目录")
+    parser.add_argument('--pattern', default='*.csv')
+    parser.add_argument('--stdin', action='store_true', help="同时从stdin读取CSV")
+    parser.add_argument('--watch', action='store_true', help="持续监视目录，Ctrl+C停止监视并输出结果")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--max-parallel', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--full', action='store_true', help="保留广告级数据并做完整分析")
+    parser.add_argument('--report', default='summary', choices=list(REPORTERS))
+    parser.add_argument('--output', default='ingestion_results.json')
+    args = parser.parse_args()
+
+    sources = [DirectorySource(d, args.pattern, args.watch, args.poll_interval) for d in args.directories]
+    if args.stdin:
+        sources.append(StreamSource())
+    if not sources:
+        parser.error("至少需要一个目录或--stdin")
+
+    results = ingest_sources(sources, args.full, args.max_parallel, args.queue_size,
+                             args.chunksize, make_reporter(args.report))
+    export_results(results, args.output)
+    print(f"📄 导入 {results['ingestion']['rows']} 行，结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析器性能基准
+用合成数据逐阶段测量MarketingDataAnalyzer和analyze_ad_performance的耗时与峰值内存，
+结果写成JSON，可与之前的结果对比
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+import ad_analysis
+from instrumentation import StageRecorder
+from marketing_analysis import MarketingDataAnalyzer
+from reporting import Reporter
+from synthetic_data import generate_marketing_csv
+
+
+def measure(fn: Callable, trace_memory: bool = True) -> Dict:
+    """执行fn，返回耗时(秒)和执行期间新增的峰值内存(MB)"""
+    if trace_memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if trace_memory:
+        peak_mb = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024 / 1024, 2)
+    return {'seconds': round(seconds, 4), 'peak_mb': peak_mb}
+
+
+def run_benchmark(data_path: str, repeat: int = 1, trace_memory: bool = True,
+                  chunksize: int = 100_000) -> List[Dict]:
+    """
+    对每个阶段执行repeat次，取最短耗时和最大峰值内存
+    内存追踪本身有开销，只比较耗时时可以关闭
+    """
+    if trace_memory:
+        tracemalloc.start()
+
+    runs = []
+    try:
+        for _ in range(repeat):
+            timings = {}
+            holder = {}
+
+            def load():
+                holder['analyzer'] = MarketingDataAnalyzer(data_path, reporter=Reporter())
+            timings['load'] = measure(load, trace_memory)
+
+            # 分析器各阶段由其自带的StageRecorder采集
+            analyzer = holder['analyzer']
+            analyzer.recorder = StageRecorder(trace_memory)
+            analyzer.run_complete_analysis()
+            for record in analyzer.recorder.stages:
+                timings[record['stage']] = {'seconds': round(record['wall_seconds'], 4),
+                                            'peak_mb': record['peak_mb']}
+            del holder, analyzer
+
+            timings['analyze_ad_performance'] = measure(
+                lambda: ad_analysis.analyze_ad_performance(data_path, reporter=Reporter()), trace_memory)
+            timings['run_streaming_analysis'] = measure(
+                lambda: MarketingDataAnalyzer(data_path, chunksize=chunksize,
+                                              reporter=Reporter()).run_streaming_analysis(),
+                trace_memory)
+            runs.append(timings)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    results = []
+    for stage in runs[0]:
+        peaks = [run[stage]['peak_mb'] for run in runs]
+        results.append({
+            'stage': stage,
+            'seconds': min(run[stage]['seconds'] for run in runs),
+            'peak_mb': max(peaks) if trace_memory else None,
+        })
+    return results
+
+
+def write_results(output_path: str, data_path: str, results: List[Dict], meta: Dict):
+    with open(data_path, 'rb') as f:
+        rows = sum(1 for _ in f) - 1
+    payload = {
+        'meta': {
+            'data_path': os.path.abspath(data_path),
+            'rows': rows,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            **meta,
+        },
+        'results': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def compare_results(baseline_path: str, current_path: str) -> List[Dict]:
+    """逐阶段对比两次基准结果，ratio<1表示变快"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['stage']: r for r in json.load(f)['results']}
+    with open(current_path, encoding='utf-8') as f:
+        current = {r['stage']: r for r in json.load(f)['results']}
+
+    rows = []
+    for stage, result in current.items():
+        if stage not in baseline:
+            continue
+        old = baseline[stage]
+        rows.append({
+            'stage': stage,
+            'baseline_seconds': old['seconds'],
+            'current_seconds': result['seconds'],
+            'ratio': round(result['seconds'] / old['seconds'], 3) if old['seconds'] else None,
+            'baseline_peak_mb': old.get('peak_mb'),
+            'current_peak_mb': result.get('peak_mb'),
+        })
+    return rows
+
+
+def _print_results(results: List[Dict]):
+    print(f"{'阶段':<34}{'耗时(s)':>10}{'峰值(MB)':>12}")
+    print("-" * 56)
+    for r in results:
+        peak = '-' if r['peak_mb'] is None else f"{r['peak_mb']:.2f}"
+        print(f"{r['stage']:<34}{r['seconds']:>10.4f}{peak:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="营销分析器性能基准")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="生成(或复用)数据并测量各阶段")
+    run.add_argument('--data', help="已有CSV路径，不指定时按--rows生成合成数据")
+    run.add_argument('--rows', type=int, default=100_000)
+    run.add_argument('--campaigns', type=int, default=50)
+    run.add_argument('--zero-click-rate', type=float, default=0.05)
+    run.add_argument('--zero-conversion-rate', type=float, default=0.2)
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--no-memory', action='store_true', help="关闭tracemalloc内存追踪")
+    run.add_argument('--output', default='benchmark_results.json')
+
+    compare = sub.add_parser('compare', help="对比两次基准结果")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        print(f"{'阶段':<34}{'基准(s)':>10}{'当前(s)':>10}{'比值':>8}")
+        print("-" * 62)
+        for r in compare_results(args.baseline, args.current):
+            # 基准耗时为0时没有比值
+            ratio = '-' if r['ratio'] is None else f"{r['ratio']:.3f}"
+            print(f"{r['stage']:<34}{r['baseline_seconds']:>10.4f}"
+                  f"{r['current_seconds']:>10.4f}{ratio:>8}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = args.data
+        meta = {}
+        if data_path is None:
+            data_path = os.path.join(tmp_dir, 'synthetic.csv')
+            generate_marketing_csv(data_path, args.rows, args.campaigns,
+                                   args.zero_click_rate, args.zero_conversion_rate)
+            meta = {'synthetic': True, 'campaigns': args.campaigns,
+                    'zero_click_rate': args.zero_click_rate,
+                    'zero_conversion_rate': args.zero_conversion_rate}
+
+        results = run_benchmark(data_path, args.repeat, not args.no_memory)
+        write_results(args.output, data_path, results, meta)
+
+    _print_results(results)
+    print(f"\n📄 基准结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
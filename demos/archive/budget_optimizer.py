@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预算重新分配优化
+每个广告的收入-花费关系取边际递减的幂函数 revenue(s) = r·(s/c)^b (c、r为当前花费和收入，b为弹性)，
+当前花费处的边际ROAS = b·ROAS；在总预算、单广告上下限和campaign上限约束下最大化总收入
+最优解满足各广告边际ROAS相等 (=λ)，对λ二分即可，全程向量化，百万级广告数秒内完成
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# 默认弹性: 花费翻倍时收入约增加2^0.6-1≈52%
+DEFAULT_ELASTICITY = 0.6
+
+# 单个广告最多放大到当前花费的倍数，超出观测范围太远的外推不可信
+DEFAULT_MAX_SCALE = 3.0
+
+# λ二分次数 (对数空间)，60次后相对误差远小于1e-9
+BISECT_ITERATIONS = 60
+
+# dashboard中列出的调整幅度最大的广告数
+TOP_AD_CHANGES = 10
+
+
+class BudgetOptimizer:
+    """
+    约束:
+    - 总预算 total_budget (默认等于当前总花费，即原预算内重新分配)
+    - 单个广告花费在 [当前花费×min_spend_ratio, 当前花费×max_scale] 之间
+    - campaign_caps: campaign -> 花费上限；campaign_cap_share: 任一campaign占总预算的上限比例
+    当前花费为0的广告无法估计响应，保持0
+    """
+
+    def __init__(self, elasticity: float = DEFAULT_ELASTICITY, min_spend_ratio: float = 0.0,
+                 max_scale: float = DEFAULT_MAX_SCALE, campaign_caps: Dict[str, float] = None,
+                 campaign_cap_share: float = None):
+        if not 0 < elasticity < 1:
+            raise ValueError("弹性必须在(0, 1)之间，才是边际递减的凹函数")
+        if not 0 <= min_spend_ratio <= 1 <= max_scale:
+            raise ValueError("需要 0 <= min_spend_ratio <= 1 <= max_scale")
+        self.elasticity = elasticity
+        self.min_spend_ratio = min_spend_ratio
+        self.max_scale = max_scale
+        self.campaign_caps = campaign_caps or {}
+        self.campaign_cap_share = campaign_cap_share
+
+    def _spend(self, lam: np.ndarray) -> np.ndarray:
+        """边际ROAS等于lam时各广告的花费: s = c·(m/λ)^(1/(1-b))，再截到上下限"""
+        with np.errstate(divide='ignore', over='ignore'):
+            spend = self._cost * (self._marginal / lam) ** self._exponent
+        return np.clip(spend, self._low, self._high)
+
+    def _solve(self, ads: np.ndarray, groups: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        对每个组分别二分λ，使组内花费合计等于targets[组]，所有组同时迭代
+        ads为参与求解的广告下标，groups为这些广告的组号
+        """
+        n_groups = len(targets)
+        marginal = self._marginal[ads]
+        # λ上界: 最大边际ROAS的若干倍，此时所有广告都落在下限
+        upper = max(float(marginal.max(initial=0)), 1e-12) * 1e6
+        log_low = np.full(n_groups, np.log(1e-12))
+        log_high = np.full(n_groups, np.log(upper))
+
+        cost, low, high = self._cost[ads], self._low[ads], self._high[ads]
+        for _ in range(BISECT_ITERATIONS):
+            log_mid = (log_low + log_high) / 2
+            with np.errstate(divide='ignore', over='ignore'):
+                spend = np.clip(cost * np.exp(self._exponent * (np.log(marginal) - log_mid[groups])), low, high)
+            over = np.bincount(groups, spend, n_groups) > targets
+            # 花费超过目标说明λ偏小
+            log_low = np.where(over, log_mid, log_low)
+            log_high = np.where(over, log_high, log_mid)
+        return np.exp(log_high)
+
+    def optimize(self, metrics_data: pd.DataFrame, total_budget: float = None) -> pd.DataFrame:
+        """
+        求解广告级预算计划，返回 ad_id/campaign/current_spend/planned_spend/marginal_roas/expected_revenue
+        """
+        cost = metrics_data['cost'].to_numpy(dtype='float64')
+        revenue = metrics_data['revenue'].to_numpy(dtype='float64')
+        valid = np.isfinite(cost) & np.isfinite(revenue) & (cost > 0)
+        cost = np.where(valid, cost, 0.0)
+        revenue = np.where(valid, np.maximum(revenue, 0.0), 0.0)
+
+        b = self.elasticity
+        self._exponent = 1.0 / (1.0 - b)
+        self._cost = cost
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._marginal = np.where(valid, b * revenue / cost, 0.0)
+        self._low = cost * self.min_spend_ratio
+        self._high = cost * self.max_scale
+
+        requested = float(cost.sum()) if total_budget is None else float(total_budget)
+        budget = requested
+        codes, campaigns = pd.factorize(metrics_data['campaign'], sort=True)
+        caps = np.full(len(campaigns), np.inf)
+        if self.campaign_cap_share is not None:
+            caps[:] = budget * self.campaign_cap_share
+        for name, cap in self.campaign_caps.items():
+            position = campaigns.get_indexer([name])[0]
+            if position >= 0:
+                caps[position] = min(caps[position], cap)
+        # 上限低于最低花费时以最低花费为准
+        campaign_low = np.bincount(codes, self._low, len(campaigns))
+        caps = np.maximum(caps, campaign_low)
+
+        # 总预算超出所有上限时只能分配到上限；低于所有下限时按下限分配
+        capacity = float(np.minimum(np.bincount(codes, self._high, len(campaigns)), caps).sum())
+        budget = min(max(budget, float(self._low.sum())), capacity)
+
+        # 先不考虑campaign上限求全局λ，超出上限的campaign固定在上限 (组内单独求λ)，
+        # 其余campaign分剩余预算，直到没有campaign超限；固定集合只增不减
+        lam = np.zeros(len(cost))
+        global_lam = None
+        fixed = np.zeros(len(campaigns), dtype=bool)
+        while True:
+            free_ads = np.flatnonzero(~fixed[codes])
+            remaining = budget - float(caps[fixed].sum())
+            if len(free_ads) == 0:
+                break
+            global_lam = self._solve(free_ads, np.zeros(len(free_ads), dtype=np.int64), np.array([remaining]))[0]
+            lam[free_ads] = global_lam
+            campaign_spend = np.bincount(codes, self._spend(lam), len(campaigns))
+            newly_capped = ~fixed & (campaign_spend > caps * (1 + 1e-9))
+            if not newly_capped.any():
+                break
+            capped_ids = np.flatnonzero(newly_capped)
+            capped_ads = np.flatnonzero(newly_capped[codes])
+            group_of = np.full(len(campaigns), -1)
+            group_of[capped_ids] = np.arange(len(capped_ids))
+            lam[capped_ads] = self._solve(capped_ads, group_of[codes[capped_ads]], caps[capped_ids])[group_of[codes[capped_ads]]]
+            fixed |= newly_capped
+
+        planned = self._spend(np.where(lam > 0, lam, np.inf))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = np.where(valid, revenue * (planned / cost) ** b, 0.0)
+            marginal_at_plan = np.where(planned > 0, b * expected / planned, 0.0)
+
+        plan = pd.DataFrame({
+            'ad_id': metrics_data['ad_id'].to_numpy(),
+            'campaign': metrics_data['campaign'].to_numpy(),
+            'current_spend': cost,
+            'planned_spend': planned,
+            'current_revenue': revenue,
+            'expected_revenue': expected,
+            'marginal_roas': marginal_at_plan,
+            'campaign_capped': fixed[codes],
+        })
+        plan.attrs['requested_budget'] = requested
+        # 未触及campaign上限的广告在最优解处共同的边际ROAS
+        plan.attrs['marginal_roas'] = global_lam
+        return plan
+
+
+def summarize_plan(plan: pd.DataFrame, top_n: int = TOP_AD_CHANGES) -> Dict:
+    """预算计划的dashboard摘要: 总量、各campaign计划和调整幅度最大的广告"""
+    grouped = plan.groupby('campaign', observed=True, sort=True)
+    campaigns = grouped[['current_spend', 'planned_spend', 'current_revenue', 'expected_revenue']].sum()
+    campaigns['change_pct'] = ((campaigns['planned_spend'] / campaigns['current_spend'] - 1) * 100)
+    campaigns['capped'] = grouped['campaign_capped'].any()
+    campaigns = campaigns.round(2).replace([np.inf, -np.inf], np.nan)
+
+    change = plan['planned_spend'] - plan['current_spend']
+    columns = ['ad_id', 'campaign', 'current_spend', 'planned_spend', 'marginal_roas']
+    largest, smallest = change.nlargest(top_n), change.nsmallest(top_n)
+    increases = plan.loc[largest.index[largest > 0], columns].round(2)
+    decreases = plan.loc[smallest.index[smallest < 0], columns].round(2)
+
+    current_revenue = float(plan['current_revenue'].sum())
+    expected_revenue = float(plan['expected_revenue'].sum())
+    allocated = float(plan['planned_spend'].sum())
+    funded = plan['planned_spend'] > 0
+    marginal_roas = plan.attrs.get('marginal_roas')
+    return {
+        "total_budget": round(plan.attrs.get('requested_budget', allocated), 2),
+        "allocated": round(allocated, 2),
+        "current_spend": round(float(plan['current_spend'].sum()), 2),
+        "current_revenue": round(current_revenue, 2),
+        "expected_revenue": round(expected_revenue, 2),
+        "expected_roas": round(expected_revenue / allocated, 2) if allocated else None,
+        "revenue_lift_pct": round((expected_revenue / current_revenue - 1) * 100, 1) if current_revenue else None,
+        "marginal_roas": round(float(marginal_roas), 3) if marginal_roas is not None else None,
+        "paused_ads": int((~funded & (plan['current_spend'] > 0)).sum()),
+        "campaigns": campaigns.reset_index().to_dict('records'),
+        "top_increases": increases.to_dict('records'),
+        "top_decreases": decreases.to_dict('records'),
+    }
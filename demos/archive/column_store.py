@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存映射的列式存储
+把marketing_data.csv同schema的数据按campaign排序后，每列存为一个.npy文件，
+另存campaign -> [起始行, 结束行) 索引；打开存储只读索引，列在首次访问时才内存映射，
+取单个campaign只读取该行区间所在的页
+"""
+
+import argparse
+import json
+import os
+import shutil
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from marketing_analysis import MarketingDataAnalyzer, compute_ad_metrics
+from marketing_schema import COUNTER_COLUMNS, MONEY_COLUMNS, TIMESTAMP_COLUMN, load_marketing_csv
+from reporting import Reporter
+
+INDEX_FILE = 'index.json'
+
+# 存储格式版本，格式变化时旧存储需要重建
+FORMAT_VERSION = 1
+
+_INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _source_signature(data_path: str) -> Dict:
+    stat = os.stat(data_path)
+    return {'path': os.path.abspath(data_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _scan_layout(data_path: str, chunksize: int) -> Dict:
+    """
+    第一遍: 统计每个campaign的行数，并确定每列在整个文件上都安全的最小类型
+    有campaign缺失的行时抛出ValueError
+    """
+    counts = {}
+    ranges = {col: [0, 0] for col in COUNTER_COLUMNS}
+    float_counters = set()
+    float32_money = {col: True for col in MONEY_COLUMNS}
+    id_bytes = 1
+    timestamp_dtype = None
+
+    rows_seen = 0
+    for chunk in load_marketing_csv(data_path, chunksize=chunksize):
+        # 行区间按campaign索引，campaign缺失的行无处存放: 直接拒绝，不静默丢行
+        missing = chunk['campaign'].isna()
+        if missing.any():
+            first = rows_seen + int(np.argmax(missing.to_numpy()))
+            raise ValueError(f"{data_path} 第{first + 1}行数据的campaign缺失，无法建立列式存储")
+        rows_seen += len(chunk)
+        for campaign, count in chunk['campaign'].value_counts(sort=False).items():
+            counts[campaign] = counts.get(campaign, 0) + int(count)
+        for col in COUNTER_COLUMNS:
+            if not pd.api.types.is_integer_dtype(chunk[col]):
+                float_counters.add(col)
+            elif len(chunk):
+                ranges[col][0] = min(ranges[col][0], int(chunk[col].min()))
+                ranges[col][1] = max(ranges[col][1], int(chunk[col].max()))
+        for col in MONEY_COLUMNS:
+            # load_marketing_csv只在无损时给出float32，任一分块不是float32整列就保留float64
+            float32_money[col] &= chunk[col].dtype == np.float32
+        if len(chunk):
+            id_bytes = max(id_bytes, int(chunk['ad_id'].str.encode('utf-8').str.len().max()))
+        if TIMESTAMP_COLUMN in chunk and timestamp_dtype is None:
+            # 沿用解析出的时间精度 (不同pandas版本为ns或us)
+            timestamp_dtype = np.dtype(chunk[TIMESTAMP_COLUMN].dtype).name
+
+    dtypes = {'ad_id': f'S{id_bytes}'}
+    for col in COUNTER_COLUMNS:
+        if col in float_counters:
+            dtypes[col] = 'float64'
+        else:
+            low, high = ranges[col]
+            dtypes[col] = next(np.dtype(t).name for t in _INT_DTYPES
+                               if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+    for col in MONEY_COLUMNS:
+        dtypes[col] = 'float32' if float32_money[col] else 'float64'
+    if timestamp_dtype is not None:
+        dtypes[TIMESTAMP_COLUMN] = timestamp_dtype
+
+    return {'counts': counts, 'dtypes': dtypes}
+
+
+def build_column_store(data_path: str, store_dir: str, chunksize: int = 1_000_000) -> 'ColumnStore':
+    """
+    由CSV建立列式存储 (两遍分块读取，内存与文件大小无关)
+    campaign按名称排序，同一campaign内保持原始行顺序；先写临时目录，完成后整体替换
+    """
+    layout = _scan_layout(data_path, chunksize)
+    campaigns = sorted(layout['counts'])
+    starts = np.cumsum([0] + [layout['counts'][c] for c in campaigns])
+    rows = int(starts[-1])
+
+    tmp_dir = store_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = {col: np.lib.format.open_memmap(os.path.join(tmp_dir, f'{col}.npy'), mode='w+',
+                                              dtype=np.dtype(dtype), shape=(rows,))
+               for col, dtype in layout['dtypes'].items()}
+
+    # 第二遍: 每个分块按campaign稳定排序后，逐段写到该campaign的当前写入位置
+    cursor = dict(zip(campaigns, starts[:-1].tolist()))
+    for chunk in load_marketing_csv(data_path, chunksize=chunksize):
+        codes, names = pd.factorize(chunk['campaign'], sort=True)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        values = {}
+        for col in columns:
+            series = chunk[col]
+            if col == 'ad_id':
+                values[col] = series.str.encode('utf-8').to_numpy()[order]
+            else:
+                values[col] = series.to_numpy(dtype=columns[col].dtype)[order]
+        for i, name in enumerate(names):
+            begin, end = bounds[i], bounds[i + 1]
+            target = slice(cursor[name], cursor[name] + end - begin)
+            for col, column in columns.items():
+                column[target] = values[col][begin:end]
+            cursor[name] += end - begin
+
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    index = {
+        'format_version': FORMAT_VERSION,
+        'rows': rows,
+        'dtypes': layout['dtypes'],
+        'campaigns': {name: [int(starts[i]), int(starts[i + 1])] for i, name in enumerate(campaigns)},
+        'source': _source_signature(data_path),
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return ColumnStore(store_dir)
+
+
+class ColumnStore:
+    """
+    只读的列式存储
+    打开时只读索引 (与数据量无关)，列在首次访问时以只读方式内存映射
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE), encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"列式存储格式版本不匹配，请重建: {store_dir}")
+        self.rows = self.index['rows']
+        self._columns = {}
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.index['dtypes'])
+
+    def campaigns(self) -> List[str]:
+        return list(self.index['campaigns'])
+
+    def campaign_range(self, campaign: str) -> slice:
+        """campaign在存储中的行区间"""
+        if campaign not in self.index['campaigns']:
+            raise KeyError(f"未知campaign: {campaign}")
+        start, end = self.index['campaigns'][campaign]
+        return slice(start, end)
+
+    def is_stale(self, data_path: str) -> bool:
+        """源CSV在建立存储后是否变化"""
+        return self.index['source'] != _source_signature(data_path)
+
+    def column(self, name: str) -> np.ndarray:
+        """整列的只读内存映射数组"""
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.store_dir, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def frame(self, campaign: str = None, columns: List[str] = None) -> pd.DataFrame:
+        """
+        取出一个campaign (不指定时为全部) 的DataFrame，列类型与load_marketing_csv一致
+        只复制该campaign行区间内的数据
+        """
+        rows = self.campaign_range(campaign) if campaign is not None else slice(0, self.rows)
+        data = {}
+        for name in columns or self.columns:
+            values = self.column(name)[rows]
+            data[name] = np.char.decode(values, 'utf-8') if name == 'ad_id' else np.array(values)
+        frame = pd.DataFrame(data)
+        if 'ad_id' in frame:
+            # 与read_csv的dtype={'ad_id': str}一致
+            frame['ad_id'] = frame['ad_id'].astype(str)
+
+        # campaign不逐行存储，由索引还原为categorical
+        ranges = self.index['campaigns']
+        names = [campaign] if campaign is not None else list(ranges)
+        lengths = [ranges[name][1] - ranges[name][0] for name in names]
+        codes = np.repeat(np.arange(len(names)), lengths)
+        frame.insert(1 if 'ad_id' in frame else 0, 'campaign',
+                     pd.Categorical.from_codes(codes, categories=names))
+        return frame
+
+    def campaign_metrics(self, campaign: str) -> pd.DataFrame:
+        """单个campaign的广告级指标 (与calculate_key_metrics相同的列)"""
+        return compute_ad_metrics(self.frame(campaign))
+
+    def analyzer(self, campaign: str = None, reporter: Reporter = None) -> MarketingDataAnalyzer:
+        """以存储中的数据 (或单个campaign) 初始化分析器，不再解析CSV"""
+        analyzer = MarketingDataAnalyzer(reporter=reporter)
+        analyzer.data = self.frame(campaign)
+        return analyzer
+
+
+def open_column_store(data_path: str, store_dir: str = None, chunksize: int = 1_000_000) -> ColumnStore:
+    """打开data_path对应的列式存储，不存在或源文件已变化时重建"""
+    store_dir = store_dir or os.path.join(os.path.dirname(os.path.abspath(data_path)),
+                                          '.marketing_store', os.path.splitext(os.path.basename(data_path))[0])
+    if os.path.exists(os.path.join(store_dir, INDEX_FILE)):
+        try:
+            store = ColumnStore(store_dir)
+            if not store.is_stale(data_path):
+                return store
+        except ValueError:  # 旧格式，重建
+            pass
+    return build_column_store(data_path, store_dir, chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="建立/查询营销数据的列式存储")
+    parser.add_argument('data', help="广告数据CSV路径")
+    parser.add_argument('--store', help="存储目录，默认为CSV同目录下的.marketing_store/<文件名>")
+    parser.add_argument('--campaign', help="输出该campaign的广告级指标")
+    args = parser.parse_args()
+
+    store = open_column_store(args.data, args.store)
+    if args.campaign is None:
+        print(f"✅ 列式存储: {store.store_dir} ({store.rows:,} 行, {len(store.campaigns())} 个campaign)")
+        return
+    metrics = store.campaign_metrics(args.campaign)
+    print(metrics[['ad_id', 'campaign', 'CTR', 'conversion_rate', 'ROI', 'ROAS', 'CPC', 'CPA']].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+广告创意近似重复索引 (MinHash + LSH)
+标题和描述规范化后取字符n-gram (默认二元组，中文不需要分词)，用MinHash估计Jaccard相似度；
+签名按band分段，每个band的键排序后存成数组，查询时对每个band二分查找同桶的候选，
+只对候选计算相似度，不需要和全部创意两两比较
+"""
+
+import argparse
+import os
+import re
+import unicodedata
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from result_export import export_results
+
+# 参与相似度计算的文本列
+TEXT_COLUMNS = ['title', 'description']
+
+# 默认的创意数据 (demos/ad-performance.csv)
+DEFAULT_CREATIVES = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 '..', 'ad-performance.csv'))
+
+# 默认签名长度和band数: 每band 4行，Jaccard约0.42以上的创意大概率落入同一个桶
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+
+# 每个查询返回的相似创意数
+TOP_SIMILAR = 5
+
+# 空文本的签名取值 (uint32最大值)
+_EMPTY = np.iinfo('uint32').max
+
+# 每个Unicode码位占21位，三元组正好放进一个uint64
+_CODEPOINT_BITS = 21
+_MAX_NGRAM = 3
+
+# 字段之间的分隔符 (含分隔符的窗口无效) 和短字段的补齐字符
+_SEPARATOR = '\x00'
+_PADDING = '\x01'
+
+# 计算MinHash时每块处理的n-gram数，限制 (签名长度 × 块大小) 临时矩阵的内存
+_BLOCK_SHINGLES = 1 << 16
+
+# 计算候选相似度时每块处理的 (查询, 创意) 对数
+_BLOCK_PAIRS = 1 << 16
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_text(text) -> str:
+    """NFKC (全角转半角)、小写，去掉空白和标点；缺失值为空串"""
+    if not isinstance(text, str):
+        return ''
+    return _NON_WORD.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def shingle_hashes(frame: pd.DataFrame, ngram: int = 2, columns: List[str] = None):
+    """
+    每行各文本列的字符n-gram哈希 (uint64，小于2^32)，返回 (哈希, 每行的起始偏移)
+    第i行的哈希为 hashes[offsets[i]:offsets[i + 1]]；短于ngram的字段补齐后作为一个n-gram
+    所有行拼成一个UTF-32码位数组，窗口键和哈希都是数组运算
+    """
+    if not 1 <= ngram <= _MAX_NGRAM:
+        raise ValueError(f"ngram必须在1到{_MAX_NGRAM}之间: {ngram}")
+    columns = columns or [col for col in TEXT_COLUMNS if col in frame]
+    if not columns:
+        raise ValueError(f"缺少文本列: 至少需要 {TEXT_COLUMNS} 之一")
+    parts = []
+    for values in zip(*(frame[col].tolist() for col in columns)):
+        for value in values:
+            text = normalize_text(value)
+            if text and len(text) < ngram:
+                text += _PADDING * (ngram - len(text))
+            parts.append(text)
+            parts.append(_SEPARATOR)
+    codes = np.frombuffer(''.join(parts).encode('utf-32-le'), dtype='<u4').astype('uint64')
+
+    # 每行的结束位置 = 该行最后一个分隔符之后
+    row_ends = np.flatnonzero(codes == 0)[len(columns) - 1::len(columns)] + 1
+    windows = max(len(codes) - ngram + 1, 0)
+    keys = np.zeros(windows, dtype='uint64')
+    valid = np.ones(windows, dtype=bool)
+    for j in range(ngram):
+        window_codes = codes[j:j + windows]
+        keys = (keys << np.uint64(_CODEPOINT_BITS)) | window_codes
+        valid &= window_codes != 0
+    positions = np.flatnonzero(valid)
+
+    # 乘法哈希取高32位
+    offsets = np.concatenate([[0], np.searchsorted(positions, row_ends)])
+    return (keys[positions] * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32), offsets
+
+
+class CreativeIndex:
+    """
+    创意相似度索引
+    signatures为每个创意的MinHash签名 (uint32，空文本为全_EMPTY，不进入任何桶)，
+    creatives为插入时的行 (含ad_id和表现指标列)，与signatures同顺序
+    band键在插入后的第一次查询时排序，批量插入只在查询前排序一次
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS,
+                 ngram: int = 2, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError(f"签名长度{num_perm}不能被band数{bands}整除")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.ngram = ngram
+        # 每个置换是一个multiply-shift哈希 (a·x + b) mod 2^64 的高32位，a为奇数
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, np.iinfo('uint64').max, num_perm, dtype='uint64', endpoint=True) | np.uint64(1)
+        self._b = rng.integers(0, np.iinfo('uint64').max, num_perm, dtype='uint64', endpoint=True)
+
+        self.signatures = np.empty((0, num_perm), dtype='uint32')
+        self.creatives = pd.DataFrame()
+        self._band_keys = None
+        self._band_order = None
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signatures_for(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        frame每行的MinHash签名，按n-gram分块计算后用reduceat取每行最小值
+        取高32位是单调的，先对64位值取最小再移位，移位只做在每行一个值上
+        """
+        hashes, offsets = shingle_hashes(frame, self.ngram)
+        signatures = np.full((len(frame), self.num_perm), _EMPTY, dtype='uint32')
+        rows = np.flatnonzero(np.diff(offsets) > 0)
+        starts = offsets[rows]
+        # 块边界对齐到行的起点，每块最多约_BLOCK_SHINGLES个n-gram (单行超长时该块就是这一行)
+        bounds = np.searchsorted(starts, np.arange(0, len(hashes), _BLOCK_SHINGLES))
+        bounds = np.unique(np.append(bounds, len(rows)))
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            low, high = starts[first], offsets[rows[last - 1] + 1]
+            values = self._a[:, None] * hashes[None, low:high]
+            values += self._b[:, None]
+            minima = np.minimum.reduceat(values, starts[first:last] - low, axis=1)
+            signatures[rows[first:last]] = (minima >> np.uint64(32)).T
+        return signatures
+
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        """每个band的行合成一个uint64键，返回 (bands, 创意数)；空文本的键为0 (不参与匹配)"""
+        banded = signatures.reshape(len(signatures), self.bands, self.rows_per_band).astype('uint64')
+        keys = np.zeros((len(signatures), self.bands), dtype='uint64')
+        for j in range(self.rows_per_band):
+            keys = keys * np.uint64(0x100000001B3) ^ banded[:, :, j]
+        keys |= np.uint64(1)
+        keys[(signatures == _EMPTY).all(axis=1)] = 0
+        return np.ascontiguousarray(keys.T)
+
+    def add(self, frame: pd.DataFrame) -> 'CreativeIndex':
+        """批量插入创意，frame需有title/description，其余列 (ad_id、ctr等) 原样保存用于返回"""
+        signatures = self.signatures_for(frame)
+        self.signatures = np.concatenate([self.signatures, signatures])
+        if len(self.creatives):
+            self.creatives = pd.concat([self.creatives, frame], ignore_index=True)
+        else:
+            self.creatives = frame.reset_index(drop=True)
+        self._band_keys = None
+        return self
+
+    def _ensure_bands(self):
+        if self._band_keys is not None:
+            return
+        keys = self._band_hashes(self.signatures)
+        self._band_order = np.argsort(keys, axis=1, kind='stable')
+        self._band_keys = np.take_along_axis(keys, self._band_order, axis=1)
+
+    def candidates(self, signatures: np.ndarray):
+        """与查询签名至少有一个band相同的 (查询位置, 创意位置) 对，已去重"""
+        self._ensure_bands()
+        query_keys = self._band_hashes(signatures)
+        queries, items = [], []
+        for band in range(self.bands):
+            keys = query_keys[band]
+            low = np.searchsorted(self._band_keys[band], keys, side='left')
+            counts = np.searchsorted(self._band_keys[band], keys, side='right') - low
+            counts[keys == 0] = 0
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # 展开每个查询命中的区间 [low, low + count)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(np.repeat(np.arange(len(keys)), counts))
+            items.append(self._band_order[band][np.repeat(low, counts) + within])
+        if not queries:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+        pairs = np.unique(np.concatenate(queries) * len(self) + np.concatenate(items))
+        return pairs // len(self), pairs % len(self)
+
+    def estimate_similarity(self, signatures: np.ndarray, queries: np.ndarray, items: np.ndarray) -> np.ndarray:
+        """签名中相同位置取值相等的比例，即Jaccard相似度的无偏估计"""
+        similarity = np.empty(len(queries))
+        for start in range(0, len(queries), _BLOCK_PAIRS):
+            block = slice(start, start + _BLOCK_PAIRS)
+            similarity[block] = (signatures[queries[block]] == self.signatures[items[block]]).mean(axis=1)
+        return similarity
+
+    def query(self, frame: pd.DataFrame, top_k: int = TOP_SIMILAR, min_similarity: float = 0.0,
+              exclude_same_id: bool = False) -> pd.DataFrame:
+        """
+        对frame每行查找最相似的top_k个已索引创意
+        返回列: query (查询行的ad_id，没有时为行位置)、similarity，以及命中创意的全部列 (ad_id、表现指标等)
+        exclude_same_id时跳过ad_id相同的创意 (用目录自身查询时排除自己)
+        """
+        if len(self) == 0 or len(frame) == 0:
+            return pd.DataFrame(columns=['query', 'similarity'] + list(self.creatives.columns))
+        signatures = self.signatures_for(frame)
+        queries, items = self.candidates(signatures)
+        query_ids = frame['ad_id'].to_numpy() if 'ad_id' in frame else np.arange(len(frame))
+        if exclude_same_id and 'ad_id' in self.creatives:
+            keep = query_ids[queries] != self.creatives['ad_id'].to_numpy()[items]
+            queries, items = queries[keep], items[keep]
+
+        similarity = self.estimate_similarity(signatures, queries, items)
+        keep = similarity >= min_similarity
+        queries, items, similarity = queries[keep], items[keep], similarity[keep]
+
+        # 每个查询内按相似度降序 (同分按插入顺序)，取前top_k
+        order = np.lexsort((items, -similarity, queries))
+        queries, items, similarity = queries[order], items[order], similarity[order]
+        group_start = np.searchsorted(queries, queries, side='left')
+        keep = np.arange(len(queries)) - group_start < top_k
+        queries, items, similarity = queries[keep], items[keep], similarity[keep]
+
+        result = self.creatives.iloc[items].reset_index(drop=True)
+        result.insert(0, 'similarity', similarity.round(4))
+        result.insert(0, 'query', query_ids[queries])
+        return result
+
+    def bucket_pairs(self):
+        """
+        已索引创意之间至少有一个band同桶的对 (i < j)，已去重
+        band键已排序，同桶的创意连续排列: 依次比较相隔1、2、...个位置的键，直到没有相等的为止
+        """
+        self._ensure_bands()
+        pairs = []
+        for band in range(self.bands):
+            keys, order = self._band_keys[band], self._band_order[band]
+            distance = 1
+            while distance < len(keys):
+                same = (keys[distance:] == keys[:-distance]) & (keys[distance:] != 0)
+                if not same.any():
+                    break
+                first, second = order[:-distance][same], order[distance:][same]
+                pairs.append(np.minimum(first, second) * len(self) + np.maximum(first, second))
+                distance += 1
+        if not pairs:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+        pairs = np.unique(np.concatenate(pairs))
+        return pairs // len(self), pairs % len(self)
+
+    def near_duplicates(self, min_similarity: float = 0.8) -> pd.DataFrame:
+        """已索引创意中相似度不低于min_similarity的创意对 (每对只出现一次)"""
+        queries, items = self.bucket_pairs()
+        similarity = self.estimate_similarity(self.signatures, queries, items)
+        keep = similarity >= min_similarity
+        queries, items, similarity = queries[keep], items[keep], similarity[keep]
+        order = np.lexsort((items, queries, -similarity))
+        left = self.creatives.iloc[queries[order]].reset_index(drop=True)
+        right = self.creatives.iloc[items[order]].reset_index(drop=True)
+        pairs = pd.concat([left.add_suffix('_a'), right.add_suffix('_b')], axis=1)
+        pairs.insert(0, 'similarity', similarity[order].round(4))
+        return pairs
+
+
+def load_creatives(csv_file: str) -> pd.DataFrame:
+    """读取创意数据 (ad-performance.csv格式)，ad_id按字符串读取"""
+    return pd.read_csv(csv_file, dtype={'ad_id': str}, skipinitialspace=True)
+
+
+def build_index(frame: pd.DataFrame, **kwargs) -> CreativeIndex:
+    return CreativeIndex(**kwargs).add(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查找相似的广告创意")
+    parser.add_argument('catalog', nargs='?', default=DEFAULT_CREATIVES, help="已有创意CSV (需有title/description)")
+    parser.add_argument('--query', help="新创意CSV，不指定时列出目录中的近似重复创意")
+    parser.add_argument('--top', type=int, default=TOP_SIMILAR, help="每个新创意返回的相似创意数")
+    parser.add_argument('--min-similarity', type=float, help="相似度下限 (默认查询0.3，列重复0.8)")
+    parser.add_argument('--output', help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    index = build_index(load_creatives(args.catalog))
+    if args.query:
+        result = index.query(load_creatives(args.query), args.top,
+                             0.3 if args.min_similarity is None else args.min_similarity)
+    else:
+        result = index.near_duplicates(0.8 if args.min_similarity is None else args.min_similarity)
+
+    if args.output:
+        export_results({"similar_creatives": result}, args.output)
+        print(f"📄 相似创意已保存到: {args.output}")
+    else:
+        print(f"已索引 {len(index):,} 个创意，找到 {len(result):,} 条相似记录")
+        if len(result):
+            print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
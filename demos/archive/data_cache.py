@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析结果缓存
+以 (文件路径, 大小, mtime) 为键，把解析后的DataFrame存为Arrow/Feather列式文件
+后续运行直接内存映射读取，跳过CSV解析；源文件变化后旧缓存自动淘汰，
+表的列结构或计算方式变化 (FORMAT_VERSIONS递增) 后旧格式的缓存不再命中
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # 未安装pyarrow时缓存自动关闭，退回直接解析CSV
+    feather = None
+
+# 各缓存表的格式版本，列结构或内容的算法变化时递增
+# metrics 2: 增加每个广告的显著性列 (significance.add_significance_columns)
+# metrics 3: 没有基线或试验数为0的广告win_prob改为NaN
+FORMAT_VERSIONS = {'data': 1, 'metrics': 3}
+
+
+def default_cache_dir(data_path: str) -> str:
+    """默认缓存目录: 与数据文件同目录下的 .marketing_cache"""
+    return os.path.join(os.path.dirname(os.path.abspath(data_path)), '.marketing_cache')
+
+
+class ParsedDataCache:
+    """按源文件状态索引的列式缓存"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @property
+    def enabled(self) -> bool:
+        return feather is not None
+
+    def _source_dir(self, data_path: str) -> str:
+        """同一源文件的所有缓存版本放在同一目录下，便于淘汰旧版本"""
+        digest = hashlib.sha1(os.path.abspath(data_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, digest)
+
+    def _entry_dir(self, data_path: str) -> str:
+        stat = os.stat(data_path)
+        return os.path.join(self._source_dir(data_path), f"{stat.st_size}_{stat.st_mtime_ns}")
+
+    def _frame_path(self, data_path: str, name: str) -> str:
+        return os.path.join(self._entry_dir(data_path), f"{name}.v{FORMAT_VERSIONS.get(name, 1)}.feather")
+
+    def load_frame(self, data_path: str, name: str = 'data') -> Optional[pd.DataFrame]:
+        """读取缓存的DataFrame，未命中时返回None"""
+        if not self.enabled:
+            return None
+        frame_path = self._frame_path(data_path, name)
+        if not os.path.exists(frame_path):
+            return None
+        return feather.read_table(frame_path, memory_map=True).to_pandas()
+
+    def store_frame(self, data_path: str, frame: pd.DataFrame, name: str = 'data'):
+        """写入缓存，同时淘汰该源文件的旧版本缓存和该表的旧格式文件"""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(data_path)
+        self._evict_versions(data_path, keep=entry_dir)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'source': os.path.abspath(data_path)}, f, ensure_ascii=False)
+
+        frame_path = self._frame_path(data_path, name)
+        for stale in glob.glob(os.path.join(entry_dir, f"{glob.escape(name)}.*feather")):
+            if stale != frame_path:
+                os.remove(stale)
+
+        # 不压缩才能内存映射；先写临时文件再替换，避免读到半个文件
+        tmp_path = frame_path + '.tmp'
+        feather.write_feather(frame.reset_index(drop=True), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, frame_path)
+
+    def _evict_versions(self, data_path: str, keep: str = None):
+        source_dir = self._source_dir(data_path)
+        if not os.path.isdir(source_dir):
+            return
+        for entry in os.listdir(source_dir):
+            entry_dir = os.path.join(source_dir, entry)
+            if entry_dir != keep:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def evict_stale(self) -> int:
+        """清理源文件已删除或已变化的缓存，返回清理的条目数"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        evicted = 0
+        for digest in os.listdir(self.cache_dir):
+            source_dir = os.path.join(self.cache_dir, digest)
+            # 缓存目录中的其他文件 (非本缓存写入的) 不处理
+            if not os.path.isdir(source_dir):
+                continue
+            for entry in os.listdir(source_dir):
+                entry_dir = os.path.join(source_dir, entry)
+                if not os.path.isdir(entry_dir):
+                    continue
+                meta_path = os.path.join(entry_dir, 'meta.json')
+                source = None
+                if os.path.exists(meta_path):
+                    with open(meta_path, encoding='utf-8') as f:
+                        source = json.load(f).get('source')
+                if source is None or not os.path.exists(source) or self._entry_dir(source) != entry_dir:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    evicted += 1
+            if not os.listdir(source_dir):
+                os.rmdir(source_dir)
+        return evicted
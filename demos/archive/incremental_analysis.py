@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量分析 - 面向只追加的广告数据源
+磁盘上保存campaign/全局可合并统计量和读取位置，每次只解析新追加的行
+排名类得分需要完整分布，由紧凑的广告级摘要重新计算
+"""
+
+import glob
+import io
+import os
+import pickle
+from typing import Dict
+
+import pandas as pd
+
+from budget_optimizer import summarize_plan
+from marketing_analysis import (
+    AD_LEVEL_COLUMNS, NUMERIC_COLUMNS, CampaignAccumulator, MarketingDataAnalyzer,
+    compute_ad_metrics, optimization_flags
+)
+from marketing_schema import load_marketing_csv
+from reporting import ConsoleReporter, Reporter
+from significance import add_significance_columns, significance_summary
+
+# 广告级摘要保留的列: dashboard明细、异常检测、最差广告评分和显著性检验所需的全部字段
+AD_SUMMARY_COLUMNS = AD_LEVEL_COLUMNS + NUMERIC_COLUMNS
+
+# 摘要分片数超过该值时合并为一个文件
+MAX_SUMMARY_PARTS = 32
+
+# 状态文件；LEGACY_STATE_FILES是旧版本分开保存的位置和累加器，遇到时删除并从头重建
+STATE_FILE = 'state.pkl'
+LEGACY_STATE_FILES = ['state.json', 'accumulator.pkl']
+
+
+class _ByteRange(io.RawIOBase):
+    """只暴露文件中 [start, end) 区间的只读流，供read_csv分块解析"""
+
+    def __init__(self, f, start: int, end: int):
+        f.seek(start)
+        self._f = f
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        data = self._f.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+class IncrementalAnalyzer:
+    """
+    只追加数据源的增量分析器
+    state_dir中保存: 读取位置、表头、摘要分片清单和campaign累加器 (同一个state.pkl，整体原子替换)，
+    以及按批追加的广告级摘要分片 (ads_*.pkl)；不在清单中的分片是中断留下的残余，随时可以删除
+    """
+
+    def __init__(self, data_path: str, state_dir: str, chunksize: int = 100_000,
+                 reporter: Reporter = None):
+        self.data_path = data_path
+        self.state_dir = state_dir
+        self.chunksize = chunksize
+        self.reporter = reporter or ConsoleReporter()
+        os.makedirs(state_dir, exist_ok=True)
+        self._load_state()
+
+    def _state_path(self, name: str) -> str:
+        return os.path.join(self.state_dir, name)
+
+    def _load_state(self):
+        state_path = self._state_path(STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, 'rb') as f:
+                self.state = pickle.load(f)
+            self.accumulator = self.state.pop('accumulator')
+            # 摘要列变化后旧分片不能再用，从头重建
+            if self.state.get('summary_columns') != AD_SUMMARY_COLUMNS:
+                self._reset_state()
+        else:
+            self._reset_state()
+        self._remove_stale_files()
+
+    def _reset_state(self):
+        # 只重置内存中的状态，旧分片在新状态落盘后才删除
+        self.state = {'offset': 0, 'header': None, 'parts': [], 'next_part': 0,
+                      'summary_columns': list(AD_SUMMARY_COLUMNS)}
+        self.accumulator = CampaignAccumulator()
+
+    def _save_state(self):
+        # 位置、分片清单和累加器写在同一个文件里，一次os.replace切换，不会出现彼此不一致的中间状态
+        tmp_path = self._state_path(STATE_FILE + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({**self.state, 'accumulator': self.accumulator}, f)
+        os.replace(tmp_path, self._state_path(STATE_FILE))
+
+    def _remove_stale_files(self):
+        """删除不在分片清单中的摘要分片、未完成的临时文件和旧版本的状态文件"""
+        referenced = set(self.state['parts'])
+        stale = [path for path in glob.glob(self._state_path('ads_*.pkl'))
+                 if os.path.basename(path) not in referenced]
+        stale += [self._state_path(name) for name in LEGACY_STATE_FILES + [STATE_FILE + '.tmp']]
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def update(self) -> int:
+        """
+        把上次之后追加的完整行并入统计量，返回新增行数
+        新分片和合并后的分片在状态落盘前都不会被引用；中途出错时丢弃内存中的改动，
+        回到上次落盘的状态，下次调用会重新处理这些行
+        """
+        try:
+            new_rows = self._update()
+        except BaseException:
+            self._load_state()
+            raise
+        self._remove_stale_files()
+        return new_rows
+
+    def _update(self) -> int:
+        with open(self.data_path, 'rb') as f:
+            header = f.readline()
+            size = os.fstat(f.fileno()).st_size
+
+            # 表头变化或文件变短说明不是追加写入，从头重建
+            if self.state['header'] != header.decode('utf-8') or size < self.state['offset']:
+                self._reset_state()
+                self.state['header'] = header.decode('utf-8')
+                self.state['offset'] = len(header)
+
+            end = self._last_complete_line_end(f, self.state['offset'], size)
+            if end <= self.state['offset']:
+                return 0
+
+            columns = [col.strip() for col in self.state['header'].strip().split(',')]
+            reader = io.BufferedReader(_ByteRange(f, self.state['offset'], end))
+            new_rows = 0
+            for chunk in load_marketing_csv(reader, chunksize=self.chunksize,
+                                            header=None, names=columns):
+                self.accumulator.update(chunk)
+                self._append_summary(compute_ad_metrics(chunk.copy())[AD_SUMMARY_COLUMNS])
+                new_rows += len(chunk)
+
+        self.state['offset'] = end
+        self._compact_summary()
+        self._save_state()
+        return new_rows
+
+    @staticmethod
+    def _last_complete_line_end(f, start: int, size: int, block: int = 65536) -> int:
+        """从文件尾向前找最后一个换行符，未写完的最后一行留到下次处理"""
+        position = size
+        while position > start:
+            read_from = max(start, position - block)
+            f.seek(read_from)
+            data = f.read(position - read_from)
+            newline = data.rfind(b'\n')
+            if newline >= 0:
+                return read_from + newline + 1
+            position = read_from
+        return start
+
+    def _append_summary(self, summary: pd.DataFrame):
+        # 每个分片使用新文件名，不覆盖已落盘状态引用的分片
+        name = f"ads_{self.state['next_part']:06d}.pkl"
+        summary.reset_index(drop=True).to_pickle(self._state_path(name))
+        self.state['parts'].append(name)
+        self.state['next_part'] += 1
+
+    def _compact_summary(self):
+        # 先写合并后的分片，旧分片在新状态落盘后由_remove_stale_files删除
+        if len(self.state['parts']) <= MAX_SUMMARY_PARTS:
+            return
+        merged = self.load_ad_summary()
+        self.state['parts'] = []
+        self._append_summary(merged)
+
+    def load_ad_summary(self) -> pd.DataFrame:
+        """读取分片清单中的全部广告级摘要"""
+        if not self.state['parts']:
+            return pd.DataFrame(columns=AD_SUMMARY_COLUMNS)
+        return pd.concat([pd.read_pickle(self._state_path(part)) for part in self.state['parts']],
+                         ignore_index=True)
+
+    def dashboard_data(self) -> Dict:
+        """
+        刷新dashboard_data
+        campaign汇总和全局指标直接取自累加器，异常、最差广告和显著性检验由广告级摘要重算
+        字段和类型与MarketingDataAnalyzer.generate_dashboard_data相同 (ad_level_metrics为DataFrame，位图为ndarray)
+        """
+        analyzer = MarketingDataAnalyzer(reporter=self.reporter)
+        # 留一基线依赖整个campaign的合计，显著性列只能在完整摘要上计算
+        analyzer.metrics_data = add_significance_columns(self.load_ad_summary())
+        anomalies = analyzer.detect_anomalies()
+        worst_performers = analyzer.identify_worst_performers()
+
+        return {
+            "overall_metrics": self.accumulator.overall_metrics(),
+            "ad_level_metrics": analyzer.metrics_data[AD_LEVEL_COLUMNS],
+            "campaign_summary": self.accumulator.campaign_summary().to_dict('index'),
+            "anomaly_alerts": anomalies['anomalous_ads'][:3],
+            "worst_performers": worst_performers,
+            "optimization_flags": optimization_flags(analyzer.metrics_data, *analyzer.alert_bits()),
+            "alert_bits": {"rules": analyzer.alert_bits()[0].names, "bits": analyzer.alert_bits()[1]},
+            "budget_plan": summarize_plan(analyzer.budget_plan()),
+            "significance": significance_summary(analyzer.metrics_data,
+                                                 analyzer.campaign_table()[NUMERIC_COLUMNS])
+        }
+
+    def run(self) -> Dict:
+        """并入新数据并返回最新dashboard_data"""
+        new_rows = self.update()
+        self.reporter.event('incremental_update', new_rows=new_rows,
+                            total_records=self.accumulator.total_records)
+        if self.reporter.verbose:
+            self.reporter.line(f"📥 新增 {new_rows} 行，累计 {self.accumulator.total_records} 行")
+        return self.dashboard_data()
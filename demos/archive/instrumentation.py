@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析阶段指标采集
+StageRecorder记录每个阶段的墙钟时间、CPU时间、峰值内存和输入行数；
+分析器未配置recorder时不做任何采集
+"""
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不记录进程RSS
+    resource = None
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # Linux上ru_maxrss单位为KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+
+class StageRecorder:
+    """
+    阶段指标记录器
+    任何实现了 stage(name, rows) 上下文管理器、reset()、stages和export()的对象都可以替代它接入分析器
+    trace_memory=True时用tracemalloc统计阶段内新增的峰值内存 (有额外开销)
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: List[Dict] = []
+
+    def reset(self):
+        """清空已记录的阶段 (分析器在每次完整分析开始时调用)"""
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None):
+        started_here = False
+        if self.trace_memory:
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                'stage': name,
+                'rows': rows,
+                'wall_seconds': round(time.perf_counter() - wall_start, 6),
+                'cpu_seconds': round(time.process_time() - cpu_start, 6),
+                'peak_mb': None,
+                'max_rss_mb': _max_rss_mb(),
+            }
+            if self.trace_memory:
+                record['peak_mb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024 / 1024, 2)
+                if started_here:
+                    tracemalloc.stop()
+            self.stages.append(record)
+
+    def export(self, output_path: str):
+        """把阶段指标写成JSON文件"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stages}, f, ensure_ascii=False, indent=2)
@@ -6,23 +6,437 @@
 分析营销数据，识别异常广告，计算关键指标
 """
 
+import sys
+
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple
 import warnings
+
+from alert_rules import RuleSet, load_alert_rules
+from budget_optimizer import BudgetOptimizer, summarize_plan
+from data_cache import ParsedDataCache
+from instrumentation import StageRecorder
+from marketing_schema import MONEY_COLUMNS, TIMESTAMP_COLUMN, load_marketing_csv, widen_money
+from quantile_sketch import PERCENT, MetricSketches
+from reporting import ConsoleReporter, Reporter
+from selection import grouped_select_k, select_k, weighted_rank_score
+from significance import add_significance_columns, significance_summary
 warnings.filterwarnings('ignore')
 
+# 可加总的原始计数列
+NUMERIC_COLUMNS = ['impressions', 'clicks', 'conversions', 'cost', 'revenue']
+
+# dashboard中按campaign取平均值的广告级指标
+MEAN_METRICS = ['CTR', 'conversion_rate', 'ROI', 'ROAS']
+
+# 广告综合表现评分权重: ROI(40%) + ROAS(30%) + 转化率(20%) + CTR(10%)
+PERFORMANCE_WEIGHTS = {'ROI': 0.4, 'ROAS': 0.3, 'conversion_rate': 0.2, 'CTR': 0.1}
+
+# 每日ROI监控阈值 (%)，最近一个完整自然日低于该值的campaign进入优先行动
+DAILY_ROI_ALERT = 30.0
+
+# dashboard中广告级明细输出的列
+AD_LEVEL_COLUMNS = ['ad_id', 'campaign', 'CTR', 'conversion_rate', 'ROI', 'ROAS', 'CPC', 'CPA']
+
+
+def compute_ad_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """在df上原地追加广告级指标列 (CTR/转化率/ROI/ROAS/CPC/CPA) 并返回df"""
+    widen_money(df)
+    
+    # CTR (点击率) = 点击数 / 展示数
+    df['CTR'] = (df['clicks'] / df['impressions'] * 100).round(2)
+    
+    # 转化率 = 转化数 / 点击数
+    df['conversion_rate'] = np.where(df['clicks'] > 0, 
+                                   (df['conversions'] / df['clicks'] * 100).round(2), 0)
+    
+    # ROI (投资回报率) = (收入 - 成本) / 成本 * 100
+    df['ROI'] = ((df['revenue'] - df['cost']) / df['cost'] * 100).round(2)
+    
+    # ROAS (广告支出回报率) = 收入 / 成本
+    df['ROAS'] = (df['revenue'] / df['cost']).round(2)
+    
+    # CPC (每次点击成本) = 成本 / 点击数
+    df['CPC'] = np.where(df['clicks'] > 0, 
+                        (df['cost'] / df['clicks']).round(2), 0)
+    
+    # CPA (每次获客成本) = 成本 / 转化数
+    df['CPA'] = np.where(df['conversions'] > 0, 
+                        (df['cost'] / df['conversions']).round(2), 0)
+    
+    return df
+
+
+def compute_campaign_ratios(campaign_metrics: pd.DataFrame) -> pd.DataFrame:
+    """由campaign汇总的计数列计算campaign级别比率指标 (原地追加列)"""
+    campaign_metrics['CTR'] = (campaign_metrics['clicks'] / campaign_metrics['impressions'] * 100).round(2)
+    campaign_metrics['conversion_rate'] = (campaign_metrics['conversions'] / campaign_metrics['clicks'] * 100).round(2)
+    campaign_metrics['ROI'] = ((campaign_metrics['revenue'] - campaign_metrics['cost']) / campaign_metrics['cost'] * 100).round(2)
+    campaign_metrics['ROAS'] = (campaign_metrics['revenue'] / campaign_metrics['cost']).round(2)
+    campaign_metrics['CPC'] = (campaign_metrics['cost'] / campaign_metrics['clicks']).round(2)
+    campaign_metrics['CPA'] = (campaign_metrics['cost'] / campaign_metrics['conversions']).round(2)
+    return campaign_metrics
+
+
+def rank_campaigns(campaign_metrics: pd.DataFrame) -> pd.DataFrame:
+    """计算campaign综合得分并按得分降序排列"""
+    campaign_metrics['performance_score'] = (
+        campaign_metrics['ROI'].rank(pct=True) * 0.4 +
+        campaign_metrics['ROAS'].rank(pct=True) * 0.3 + 
+        campaign_metrics['conversion_rate'].rank(pct=True) * 0.3
+    ).round(2)
+    
+    return campaign_metrics.sort_values('performance_score', ascending=False)
+
+
+def optimization_flags(metrics_data: pd.DataFrame, rules: RuleSet = None, bits: np.ndarray = None) -> Dict:
+    """
+    dashboard中需要立即处理的广告清单 (告警规则optimization分组，每条规则一个清单)
+    已有规则位图时直接复用，不再扫描metrics_data
+    """
+    rules = rules or load_alert_rules()
+    if bits is None:
+        bits = rules.evaluate(metrics_data, ['optimization'])
+    ad_ids = metrics_data['ad_id']
+    return {name: ad_ids[rules.mask(bits, name)].tolist() for name in rules.group('optimization')}
+
+
+def _add_frames(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    """按索引对齐相加两个汇总表，整数列保持整数类型"""
+    combined = left.add(right, fill_value=0)
+    for col in combined.columns:
+        if pd.api.types.is_integer_dtype(left[col]) and pd.api.types.is_integer_dtype(right[col]):
+            combined[col] = combined[col].astype('int64')
+    return combined
+
+
+class CampaignAccumulator:
+    """
+    可合并的campaign级别累加器
+    只保存campaign汇总、全局合计、数据质量计数和广告级指标的分位数草图，
+    内存占用与数据行数无关
+    """
+    
+    def __init__(self):
+        self.campaign_sums = None
+        self.total_records = 0
+        self.data_types = {}
+        self.missing_values = {}
+        self.negative_values = {col: 0 for col in NUMERIC_COLUMNS}
+        self.zero_values = {col: 0 for col in NUMERIC_COLUMNS}
+        self.clicks_over_impressions = 0
+        self.conversions_over_clicks = 0
+        # compute_ad_metrics的比率指标是百分数
+        self.metric_sketches = MetricSketches(unit=PERCENT)
+    
+    def update(self, chunk: pd.DataFrame) -> 'CampaignAccumulator':
+        """累加一个数据块 (原始列)"""
+        if not self.data_types:
+            self.data_types = chunk.dtypes.to_dict()
+        self.total_records += len(chunk)
+        
+        for col, count in chunk.isnull().sum().items():
+            self.missing_values[col] = self.missing_values.get(col, 0) + int(count)
+        for col in NUMERIC_COLUMNS:
+            self.negative_values[col] += int((chunk[col] < 0).sum())
+            self.zero_values[col] += int((chunk[col] == 0).sum())
+        self.clicks_over_impressions += int((chunk['clicks'] > chunk['impressions']).sum())
+        self.conversions_over_clicks += int((chunk['conversions'] > chunk['clicks']).sum())
+        
+        metrics = compute_ad_metrics(chunk[['campaign'] + NUMERIC_COLUMNS].copy())
+        grouped = metrics.groupby('campaign', observed=True)
+        chunk_sums = grouped[NUMERIC_COLUMNS].sum()
+        # 广告级指标的和与有效计数，用于还原按campaign的平均值
+        chunk_sums = chunk_sums.join(grouped[MEAN_METRICS].sum().add_suffix('_sum'))
+        chunk_sums = chunk_sums.join(grouped[MEAN_METRICS].count().add_suffix('_count'))
+        chunk_sums['ad_count'] = grouped.size()
+        
+        self._merge_sums(chunk_sums)
+        self.metric_sketches.update(metrics)
+        return self
+    
+    def merge(self, other: 'CampaignAccumulator') -> 'CampaignAccumulator':
+        """合并另一个累加器 (例如另一个分块或分区的结果)"""
+        if not self.data_types:
+            self.data_types = dict(other.data_types)
+        self.total_records += other.total_records
+        for col, count in other.missing_values.items():
+            self.missing_values[col] = self.missing_values.get(col, 0) + count
+        for col in NUMERIC_COLUMNS:
+            self.negative_values[col] += other.negative_values[col]
+            self.zero_values[col] += other.zero_values[col]
+        self.clicks_over_impressions += other.clicks_over_impressions
+        self.conversions_over_clicks += other.conversions_over_clicks
+        if other.campaign_sums is not None:
+            self._merge_sums(other.campaign_sums)
+        self.metric_sketches.merge(other.metric_sketches)
+        return self
+    
+    def _merge_sums(self, sums: pd.DataFrame):
+        if self.campaign_sums is None:
+            self.campaign_sums = sums.copy()
+        else:
+            self.campaign_sums = _add_frames(self.campaign_sums, sums)
+    
+    def quality_report(self) -> Dict:
+        """与validate_data_quality相同结构的数据质量报告"""
+        logical_issues = []
+        if self.clicks_over_impressions:
+            logical_issues.append("点击数超过展示数")
+        if self.conversions_over_clicks:
+            logical_issues.append("转化数超过点击数")
+        
+        return {
+            "total_records": self.total_records,
+            "missing_values": dict(self.missing_values),
+            "data_types": dict(self.data_types),
+            "negative_values": dict(self.negative_values),
+            "zero_values": dict(self.zero_values),
+            "logical_issues": logical_issues
+        }
+    
+    def _sums(self) -> pd.DataFrame:
+        """campaign汇总表；还没有累加任何数据时为同结构的空表"""
+        if self.campaign_sums is not None:
+            return self.campaign_sums
+        columns = (NUMERIC_COLUMNS + [f'{metric}_sum' for metric in MEAN_METRICS]
+                   + [f'{metric}_count' for metric in MEAN_METRICS] + ['ad_count'])
+        dtypes = {col: 'float64' if col in MONEY_COLUMNS or col.endswith('_sum') else 'int64' for col in columns}
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='campaign', dtype=object)).astype(dtypes)
+    
+    def campaign_metrics(self) -> pd.DataFrame:
+        """与analyze_campaigns相同结构的campaign表现表"""
+        sums = self._sums()
+        campaign_metrics = sums[NUMERIC_COLUMNS].reset_index()
+        campaign_metrics = compute_campaign_ratios(campaign_metrics)
+        campaign_metrics['ad_count'] = sums['ad_count'].to_numpy()
+        return rank_campaigns(campaign_metrics)
+    
+    def campaign_summary(self) -> pd.DataFrame:
+        """与generate_dashboard_data中campaign_summary相同的汇总表"""
+        sums = self._sums()
+        summary = sums[NUMERIC_COLUMNS].copy()
+        for metric in MEAN_METRICS:
+            summary[metric] = sums[f'{metric}_sum'] / sums[f'{metric}_count']
+        return summary.round(2)
+    
+    def overall_metrics(self) -> Dict:
+        """与generate_dashboard_data中overall_metrics相同的全局指标，没有数据时比率为NaN"""
+        sums = self._sums()
+        totals = sums[NUMERIC_COLUMNS].sum()
+        ctr_sum = sums['CTR_sum'].sum()
+        ctr_count = sums['CTR_count'].sum()
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                "total_cost": float(totals['cost']),
+                "total_revenue": float(totals['revenue']),
+                "overall_roi": float(np.round((totals['revenue'] - totals['cost']) / totals['cost'] * 100, 1)),
+                "total_conversions": int(totals['conversions']),
+                "avg_ctr": float(np.round(np.float64(ctr_sum) / ctr_count, 2))
+            }
+
+
+def accumulate_csv(data_path: str, chunksize: int = 100_000) -> CampaignAccumulator:
+    """分块读取单个CSV并返回其campaign累加器"""
+    accumulator = CampaignAccumulator()
+    for chunk in load_marketing_csv(data_path, chunksize=chunksize):
+        accumulator.update(chunk)
+    return accumulator
+
+
+def build_accumulated_results(accumulator: CampaignAccumulator) -> Dict:
+    """由累加器生成质量报告、campaign分析和dashboard汇总"""
+    return {
+        'quality_report': accumulator.quality_report(),
+        'campaign_analysis': accumulator.campaign_metrics(),
+        # 广告级指标分布的近似分位数，流式/并行模式下替代整列排序
+        'metric_distribution': accumulator.metric_sketches.summary(),
+        'dashboard_data': {
+            "overall_metrics": accumulator.overall_metrics(),
+            "campaign_summary": accumulator.campaign_summary().to_dict('index')
+        }
+    }
+
+
+def analyze_files_parallel(data_paths: List[str], max_workers: int = None,
+                           chunksize: int = 100_000, reporter: Reporter = None) -> Dict:
+    """
+    多文件并行分析 - 每个进程负责一个CSV并返回部分累加结果，主进程合并
+    所有文件需与marketing_data.csv同schema，输出结构与流式分析相同
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    reporter = reporter or ConsoleReporter()
+    reporter.line(f"🚀 开始多文件并行分析: {len(data_paths)} 个文件")
+    
+    merged = CampaignAccumulator()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map按输入顺序返回，保证合并结果可复现
+        for partial in executor.map(accumulate_csv, data_paths, [chunksize] * len(data_paths)):
+            merged.merge(partial)
+    
+    results = build_accumulated_results(merged)
+    results['file_count'] = len(data_paths)
+    
+    reporter.event('analyze_files_parallel', files=len(data_paths),
+                   records=results['quality_report']['total_records'],
+                   campaigns=len(results['campaign_analysis']))
+    if reporter.verbose:
+        reporter.line(f"总记录数: {results['quality_report']['total_records']}")
+        reporter.line(f"Campaign数量: {len(results['campaign_analysis'])}")
+        reporter.line(f"整体ROI: {results['dashboard_data']['overall_metrics']['overall_roi']}%")
+        reporter.line("✅ 并行分析完成！")
+    
+    return results
+
+
 class MarketingDataAnalyzer:
-    def __init__(self, data_path: str):
-        """初始化营销数据分析器"""
-        self.data = pd.read_csv(data_path)
+    def __init__(self, data_path: str = None, chunksize: int = None, cache_dir: str = None,
+                 reporter: Reporter = None, recorder: StageRecorder = None,
+                 budget_optimizer: BudgetOptimizer = None):
+        """
+        初始化营销数据分析器
+        指定chunksize时进入流式模式: 不整体加载数据，只能调用run_streaming_analysis
+        指定cache_dir时复用按 (路径, 大小, mtime) 缓存的解析结果和指标表
+        不指定data_path时不加载数据，由调用方直接提供metrics_data
+        reporter决定输出方式，默认ConsoleReporter输出完整报告
+        recorder用于采集各阶段耗时/内存，不配置时没有任何采集开销
+        budget_optimizer决定预算计划的弹性和约束，默认在当前总花费内重新分配
+        """
+        self.data_path = data_path
+        self.chunksize = chunksize
+        self.cache = ParsedDataCache(cache_dir) if cache_dir else None
+        self.reporter = reporter or ConsoleReporter()
+        self.recorder = recorder
+        self.budget_optimizer = budget_optimizer or BudgetOptimizer()
+        self._aggregates = {}
+        self.data = None if chunksize or data_path is None else self._load_data()
+        # data仍是data_path解析出的数据时，指标表才能按data_path读写缓存 (替换data后清除)
+        self._data_from_cache_source = self.data is not None
         self.results = {}
+    
+    @property
+    def data(self) -> pd.DataFrame:
+        return self._data
+    
+    @data.setter
+    def data(self, value: pd.DataFrame):
+        """替换原始数据时，派生的指标表和聚合表一并失效，也不再对应data_path的缓存"""
+        self._data = value
+        self._data_from_cache_source = False
+        self._metrics_data = None
+        self._aggregates.clear()
+    
+    @property
+    def metrics_data(self) -> pd.DataFrame:
+        return self._metrics_data
+    
+    @metrics_data.setter
+    def metrics_data(self, value: pd.DataFrame):
+        self._metrics_data = value
+        self._aggregates.clear()
+    
+    def _aggregate(self, name: str, builder):
+        """按名称缓存由metrics_data派生的聚合结果，同一份数据只计算一次"""
+        if name not in self._aggregates:
+            self._aggregates[name] = builder()
+        return self._aggregates[name]
+    
+    def campaign_table(self) -> pd.DataFrame:
+        """
+        campaign级别聚合表 (单次groupby): 计数列合计、广告级指标均值和广告数量
+        analyze_campaigns、洞察和dashboard共用
+        """
+        def build():
+            grouped = self.metrics_data.groupby('campaign', observed=True)
+            table = grouped[NUMERIC_COLUMNS].sum()
+            table = table.join(grouped[MEAN_METRICS].mean())
+            table['ad_count'] = grouped.size()
+            return table
+        return self._aggregate('campaign_table', build)
+    
+    def ad_performance_score(self) -> pd.Series:
+        """
+        广告综合表现评分 (与metrics_data同索引)
+        权重: ROI(40%) + ROAS(30%) + 转化率(20%) + CTR(10%)
+        """
+        def build():
+            score = weighted_rank_score(self.metrics_data, PERFORMANCE_WEIGHTS)
+            return pd.Series(score, index=self.metrics_data.index).round(3)
+        return self._aggregate('ad_performance_score', build)
+    
+    def time_windows(self) -> Dict:
+        """
+        按DASHBOARD_WINDOWS建立的时间窗口聚合器 (名称 -> WindowedAggregator)
+        数据没有timestamp列时返回空字典
+        """
+        def build():
+            if TIMESTAMP_COLUMN not in self.metrics_data:
+                return {}
+            from windowed_metrics import build_windows
+            return build_windows(self.metrics_data)
+        return self._aggregate('time_windows', build)
+    
+    def alert_bits(self) -> Tuple[RuleSet, np.ndarray]:
+        """
+        告警规则 (异常检测和优化清单两个分组) 对metrics_data的一次性求值结果
+        返回编译后的规则和每个广告的命中位图，规则与位图一起缓存，保证二者对应
+        """
+        def build():
+            rules = load_alert_rules()
+            return rules, rules.evaluate(self.metrics_data, ['anomaly', 'optimization'])
+        return self._aggregate('alert_bits', build)
+    
+    def rollup_cube(self, dimensions: List[str] = None):
+        """
+        多维汇总立方体 (见rollup_cube)，默认维度为campaign，有timestamp时再加day
+        按维度配置缓存，之后的切片和下钻查询只读立方体，不再扫描原始数据
+        """
+        def build():
+            from rollup_cube import build_cube
+            source = self.metrics_data if self.metrics_data is not None else self.data
+            return build_cube(source, dimensions)
+        return self._aggregate(f"rollup_cube:{','.join(dimensions or [])}", build)
+    
+    def slice(self, by: List[str] = (), where: Dict = None, dimensions: List[str] = None) -> pd.DataFrame:
+        """
+        按维度切片/下钻的合计和比率指标，例如 slice(['campaign', 'day'], {'campaign': 'x'})
+        dimensions为立方体的维度配置，默认见rollup_cube
+        """
+        return self.rollup_cube(dimensions).query(by, where)
+    
+    def budget_plan(self) -> pd.DataFrame:
+        """按各广告边际ROAS求解的广告级预算计划 (见budget_optimizer)"""
+        return self._aggregate('budget_plan', lambda: self.budget_optimizer.optimize(self.metrics_data))
+    
+    def select_performers(self, n: int = 3, worst: bool = True, per_campaign: bool = False) -> pd.DataFrame:
+        """
+        按综合得分选出最差 (worst=False时最佳) 的n个广告，per_campaign=True时每个campaign各选n个
+        只取选中行，不复制整表
+        """
+        scores = self.ad_performance_score().to_numpy()
+        if per_campaign:
+            positions = grouped_select_k(scores, self.metrics_data['campaign'], n, largest=not worst)
+        else:
+            positions = select_k(scores, n, largest=not worst)
+        return self.metrics_data.iloc[positions].assign(performance_score=scores[positions])
+    
+    def _load_data(self) -> pd.DataFrame:
+        """加载原始数据，命中缓存时跳过CSV解析"""
+        if self.cache is None:
+            return load_marketing_csv(self.data_path)
+        
+        data = self.cache.load_frame(self.data_path, 'data')
+        if data is None:
+            data = load_marketing_csv(self.data_path)
+            self.cache.store_frame(self.data_path, data, 'data')
+        return data
         
     def validate_data_quality(self) -> Dict:
         """数据质量检查"""
-        print("=" * 50)
-        print("📊 数据质量检查")
-        print("=" * 50)
+        self.reporter.section("📊 数据质量检查")
         
         quality_report = {
             "total_records": len(self.data),
@@ -38,8 +452,9 @@ class MarketingDataAnalyzer:
             quality_report["negative_values"][col] = (self.data[col] < 0).sum()
             quality_report["zero_values"][col] = (self.data[col] == 0).sum()
         
-        print(f"总记录数: {quality_report['total_records']}")
-        print(f"缺失值情况: {dict(quality_report['missing_values'])}")
+        if self.reporter.verbose:
+            self.reporter.line(f"总记录数: {quality_report['total_records']}")
+            self.reporter.line(f"缺失值情况: {dict(quality_report['missing_values'])}")
         
         # 数据逻辑验证
         logical_issues = []
@@ -50,188 +465,151 @@ class MarketingDataAnalyzer:
             
         quality_report["logical_issues"] = logical_issues
         
+        self.reporter.event('validate_data_quality', records=quality_report['total_records'],
+                            logical_issues=len(logical_issues))
         if logical_issues:
-            print(f"⚠️  数据逻辑问题: {logical_issues}")
+            self.reporter.line(f"⚠️  数据逻辑问题: {logical_issues}")
         else:
-            print("✅ 数据逻辑检查通过")
+            self.reporter.line("✅ 数据逻辑检查通过")
         
         return quality_report
     
     def calculate_key_metrics(self) -> pd.DataFrame:
         """计算关键营销指标"""
-        print("\n" + "=" * 50)
-        print("🧮 关键指标计算")
-        print("=" * 50)
-        
-        df = self.data.copy()
-        
-        # CTR (点击率) = 点击数 / 展示数
-        df['CTR'] = (df['clicks'] / df['impressions'] * 100).round(2)
+        self.reporter.section("🧮 关键指标计算")
         
-        # 转化率 = 转化数 / 点击数
-        df['conversion_rate'] = np.where(df['clicks'] > 0, 
-                                       (df['conversions'] / df['clicks'] * 100).round(2), 0)
-        
-        # ROI (投资回报率) = (收入 - 成本) / 成本 * 100
-        df['ROI'] = ((df['revenue'] - df['cost']) / df['cost'] * 100).round(2)
-        
-        # ROAS (广告支出回报率) = 收入 / 成本
-        df['ROAS'] = (df['revenue'] / df['cost']).round(2)
-        
-        # CPC (每次点击成本) = 成本 / 点击数
-        df['CPC'] = np.where(df['clicks'] > 0, 
-                            (df['cost'] / df['clicks']).round(2), 0)
-        
-        # CPA (每次获客成本) = 成本 / 转化数
-        df['CPA'] = np.where(df['conversions'] > 0, 
-                            (df['cost'] / df['conversions']).round(2), 0)
+        use_cache = self.cache is not None and self._data_from_cache_source
+        df = self.cache.load_frame(self.data_path, 'metrics') if use_cache else None
+        if df is None:
+            # 指标之外附带每个广告相对campaign基线的显著性 (见significance)
+            df = add_significance_columns(compute_ad_metrics(self.data.copy()))
+            if use_cache:
+                self.cache.store_frame(self.data_path, df, 'metrics')
         
         self.metrics_data = df
         
         # 显示计算结果
         key_metrics = ['CTR', 'conversion_rate', 'ROI', 'ROAS', 'CPC', 'CPA']
-        print("关键指标计算公式:")
-        print("• CTR = 点击数 / 展示数 × 100%")
-        print("• 转化率 = 转化数 / 点击数 × 100%") 
-        print("• ROI = (收入 - 成本) / 成本 × 100%")
-        print("• ROAS = 收入 / 成本")
-        print("• CPC = 成本 / 点击数")
-        print("• CPA = 成本 / 转化数")
+        self.reporter.event('calculate_key_metrics', ads=len(df))
+        if self.reporter.verbose:
+            self.reporter.line("关键指标计算公式:")
+            self.reporter.line("• CTR = 点击数 / 展示数 × 100%")
+            self.reporter.line("• 转化率 = 转化数 / 点击数 × 100%") 
+            self.reporter.line("• ROI = (收入 - 成本) / 成本 × 100%")
+            self.reporter.line("• ROAS = 收入 / 成本")
+            self.reporter.line("• CPC = 成本 / 点击数")
+            self.reporter.line("• CPA = 成本 / 转化数")
         
         return df[['ad_id', 'campaign'] + key_metrics]
     
     def detect_anomalies(self) -> Dict:
         """异常检测 - 使用统计学方法识别异常广告"""
-        print("\n" + "=" * 50)
-        print("🚨 异常广告检测")
-        print("=" * 50)
+        self.reporter.section("🚨 异常广告检测")
         
         df = self.metrics_data
-        anomalies = {}
-        
-        # 定义异常检测标准
-        metrics_thresholds = {
-            'CTR': {'low': 2.0, 'high': 15.0, 'name': '点击率'},
-            'conversion_rate': {'low': 1.0, 'high': 10.0, 'name': '转化率'}, 
-            'ROI': {'low': 50.0, 'high': float('inf'), 'name': 'ROI'},
-            'ROAS': {'low': 2.0, 'high': float('inf'), 'name': 'ROAS'},
-            'CPC': {'low': 0, 'high': 5.0, 'name': '每次点击成本'},
-            'CPA': {'low': 0, 'high': 100.0, 'name': '每次获客成本'}
-        }
-        
-        anomalous_ads = []
+        rules, bits = self.alert_bits()
+        anomaly_rules = rules.group('anomaly')
+        
+        # 异常检测标准取自规则配置 (alert_rules.json的anomaly分组)，每个指标给出正常区间的low/high；
+        # 规则没有range字段时只能从首个条件得到一侧的阈值
+        metrics_thresholds = {}
+        for name in anomaly_rules:
+            rule = rules.rule(name)
+            metric, op, value = rule['when'][0]
+            if 'range' in rule:
+                low, high = rule['range']
+                bounds = {'low': low, 'high': float('inf') if high is None else high}
+            else:
+                bounds = {'low' if op in ('<', '<=') else 'high': value}
+            metrics_thresholds.setdefault(metric, {}).update(bounds, name=rule.get('label', metric))
+        
+        # 规则位图已经一次性算好，这里只按规则取出命中行并生成问题描述
+        issue_rows, issue_rules = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        issue_texts = [np.empty(0, dtype=object)]
+        for rule_idx, name in enumerate(anomaly_rules):
+            rule = rules.rule(name)
+            values = df[rule['when'][0][0]]
+            hit_rows = np.flatnonzero(rules.mask(bits, name))
+            issue_rows.append(hit_rows)
+            issue_rules.append(np.full(len(hit_rows), rule_idx))
+            issue_texts.append((rule.get('prefix', '') + values.iloc[hit_rows].astype(str)
+                                + rule.get('suffix', '')).to_numpy(dtype=object))
+        
+        severity = rules.count(bits, anomaly_rules)
+        
+        # 按(行, 规则)排序后切分，得到每个异常广告的问题列表，顺序与规则定义一致
+        issue_rows = np.concatenate(issue_rows)
+        issue_order = np.lexsort((np.concatenate(issue_rules), issue_rows))
+        issue_texts = np.concatenate(issue_texts)[issue_order].tolist()
+        anomalous_rows, starts = np.unique(issue_rows[issue_order], return_index=True)
+        ends = np.append(starts[1:], len(issue_texts)).tolist()
+        starts = starts.tolist()
+        
+        # 按严重程度降序排列，同分保持原始顺序
+        rank_order = np.argsort(-severity[anomalous_rows], kind='stable').tolist()
+        ad_ids = df['ad_id'].to_numpy()[anomalous_rows].tolist()
+        campaigns = df['campaign'].to_numpy()[anomalous_rows].tolist()
+        scores = severity[anomalous_rows].tolist()
+        
+        anomalous_ads = [
+            {
+                'ad_id': ad_ids[i],
+                'campaign': campaigns[i],
+                'issues': issue_texts[starts[i]:ends[i]],
+                'severity_score': scores[i]
+            }
+            for i in rank_order
+        ]
         
-        for _, row in df.iterrows():
-            ad_issues = []
-            
-            # 检查各项指标
-            if row['CTR'] < metrics_thresholds['CTR']['low']:
-                ad_issues.append(f"CTR异常低: {row['CTR']}% (正常>2%)")
-            
-            if row['conversion_rate'] < metrics_thresholds['conversion_rate']['low']:
-                ad_issues.append(f"转化率异常低: {row['conversion_rate']}% (正常>1%)")
-                
-            if row['ROI'] < metrics_thresholds['ROI']['low']:
-                ad_issues.append(f"ROI异常低: {row['ROI']}% (正常>50%)")
-                
-            if row['ROAS'] < metrics_thresholds['ROAS']['low']:
-                ad_issues.append(f"ROAS异常低: {row['ROAS']} (正常>2.0)")
-                
-            if row['CPC'] > metrics_thresholds['CPC']['high']:
-                ad_issues.append(f"CPC异常高: ¥{row['CPC']} (正常<5元)")
-                
-            if row['CPA'] > metrics_thresholds['CPA']['high'] and row['CPA'] > 0:
-                ad_issues.append(f"CPA异常高: ¥{row['CPA']} (正常<100元)")
-            
-            if ad_issues:
-                anomalous_ads.append({
-                    'ad_id': row['ad_id'],
-                    'campaign': row['campaign'],
-                    'issues': ad_issues,
-                    'severity_score': len(ad_issues)
-                })
-        
-        # 按严重程度排序
-        anomalous_ads.sort(key=lambda x: x['severity_score'], reverse=True)
-        
-        print(f"发现 {len(anomalous_ads)} 个异常广告:")
-        for i, ad in enumerate(anomalous_ads[:3], 1):
-            print(f"\n{i}. 广告 {ad['ad_id']} ({ad['campaign']})")
-            print(f"   问题数量: {ad['severity_score']}")
-            for issue in ad['issues']:
-                print(f"   • {issue}")
+        self.reporter.event('detect_anomalies', anomalous_ads=len(anomalous_ads))
+        if self.reporter.verbose:
+            self.reporter.line(f"发现 {len(anomalous_ads)} 个异常广告:")
+            for i, ad in enumerate(anomalous_ads[:3], 1):
+                self.reporter.line(f"\n{i}. 广告 {ad['ad_id']} ({ad['campaign']})")
+                self.reporter.line(f"   问题数量: {ad['severity_score']}")
+                for issue in ad['issues']:
+                    self.reporter.line(f"   • {issue}")
         
         return {'anomalous_ads': anomalous_ads, 'thresholds': metrics_thresholds}
     
     def analyze_campaigns(self) -> pd.DataFrame:
         """活动级别分析"""
-        print("\n" + "=" * 50)
-        print("📈 Campaign整体表现分析")
-        print("=" * 50)
+        self.reporter.section("📈 Campaign整体表现分析")
         
-        df = self.metrics_data
+        table = self.campaign_table()
         
         # 按campaign聚合数据
-        campaign_metrics = df.groupby('campaign').agg({
-            'impressions': 'sum',
-            'clicks': 'sum', 
-            'conversions': 'sum',
-            'cost': 'sum',
-            'revenue': 'sum'
-        }).reset_index()
+        campaign_metrics = table[NUMERIC_COLUMNS].reset_index()
         
         # 计算campaign级别指标
-        campaign_metrics['CTR'] = (campaign_metrics['clicks'] / campaign_metrics['impressions'] * 100).round(2)
-        campaign_metrics['conversion_rate'] = (campaign_metrics['conversions'] / campaign_metrics['clicks'] * 100).round(2)
-        campaign_metrics['ROI'] = ((campaign_metrics['revenue'] - campaign_metrics['cost']) / campaign_metrics['cost'] * 100).round(2)
-        campaign_metrics['ROAS'] = (campaign_metrics['revenue'] / campaign_metrics['cost']).round(2)
-        campaign_metrics['CPC'] = (campaign_metrics['cost'] / campaign_metrics['clicks']).round(2)
-        campaign_metrics['CPA'] = (campaign_metrics['cost'] / campaign_metrics['conversions']).round(2)
+        campaign_metrics = compute_campaign_ratios(campaign_metrics)
         
         # 添加ad数量
-        ad_counts = df.groupby('campaign').size().reset_index(name='ad_count')
-        campaign_metrics = campaign_metrics.merge(ad_counts, on='campaign')
+        campaign_metrics['ad_count'] = table['ad_count'].to_numpy()
         
         # 性能排名
-        campaign_metrics['performance_score'] = (
-            campaign_metrics['ROI'].rank(pct=True) * 0.4 +
-            campaign_metrics['ROAS'].rank(pct=True) * 0.3 + 
-            campaign_metrics['conversion_rate'].rank(pct=True) * 0.3
-        ).round(2)
-        
-        campaign_metrics = campaign_metrics.sort_values('performance_score', ascending=False)
-        
-        print("Campaign表现排名:")
-        for _, row in campaign_metrics.iterrows():
-            print(f"\n📊 {row['campaign']}")
-            print(f"   广告数量: {row['ad_count']}")
-            print(f"   总投入: ¥{row['cost']:,}")
-            print(f"   总收入: ¥{row['revenue']:,}")
-            print(f"   ROI: {row['ROI']}%")
-            print(f"   ROAS: {row['ROAS']}")
-            print(f"   综合得分: {row['performance_score']}")
+        campaign_metrics = rank_campaigns(campaign_metrics)
+        
+        self.reporter.event('analyze_campaigns', campaigns=len(campaign_metrics))
+        if self.reporter.verbose:
+            self.reporter.line("Campaign表现排名:")
+            for _, row in campaign_metrics.iterrows():
+                self.reporter.line(f"\n📊 {row['campaign']}")
+                self.reporter.line(f"   广告数量: {row['ad_count']}")
+                self.reporter.line(f"   总投入: ¥{row['cost']:,}")
+                self.reporter.line(f"   总收入: ¥{row['revenue']:,}")
+                self.reporter.line(f"   ROI: {row['ROI']}%")
+                self.reporter.line(f"   ROAS: {row['ROAS']}")
+                self.reporter.line(f"   综合得分: {row['performance_score']}")
         
         return campaign_metrics
     
     def identify_worst_performers(self, n=3) -> List[Dict]:
         """识别表现最差的广告"""
-        print("\n" + "=" * 50)
-        print(f"🔻 表现最差的{n}个广告")
-        print("=" * 50)
-        
-        df = self.metrics_data.copy()
+        self.reporter.section(f"🔻 表现最差的{n}个广告")
         
-        # 综合表现评分算法
-        # 权重: ROI(40%) + ROAS(30%) + 转化率(20%) + CTR(10%)
-        df['performance_score'] = (
-            df['ROI'].rank(pct=True) * 0.4 +
-            df['ROAS'].rank(pct=True) * 0.3 +
-            df['conversion_rate'].rank(pct=True) * 0.2 +
-            df['CTR'].rank(pct=True) * 0.1
-        ).round(3)
-        
-        # 获取最差的n个
-        worst_ads = df.nsmallest(n, 'performance_score')
+        # 综合表现评分算法 (与洞察阶段共用)，只取最差的n个，不复制整表也不全量排序
+        worst_ads = self.select_performers(n, worst=True)
         
         worst_performers = []
         for _, row in worst_ads.iterrows():
@@ -255,28 +633,30 @@ class MarketingDataAnalyzer:
             }
             worst_performers.append(performer)
         
-        print("评分算法: ROI(40%) + ROAS(30%) + 转化率(20%) + CTR(10%)")
-        print("\n最差表现广告:")
-        
-        for i, ad in enumerate(worst_performers, 1):
-            print(f"\n{i}. 广告 {ad['ad_id']} - {ad['campaign']}")
-            print(f"   综合得分: {ad['performance_score']}")
-            print(f"   CTR: {ad['metrics']['CTR']}")
-            print(f"   转化率: {ad['metrics']['conversion_rate']}")
-            print(f"   ROI: {ad['metrics']['ROI']}")
-            print(f"   ROAS: {ad['metrics']['ROAS']}")
-            print(f"   投入: ¥{ad['financial_impact']['cost']:,}")
-            print(f"   亏损: ¥{ad['financial_impact']['loss']:,}")
+        self.reporter.event('identify_worst_performers', worst_ads=[ad['ad_id'] for ad in worst_performers])
+        if self.reporter.verbose:
+            self.reporter.line("评分算法: ROI(40%) + ROAS(30%) + 转化率(20%) + CTR(10%)")
+            self.reporter.line("\n最差表现广告:")
+            
+            for i, ad in enumerate(worst_performers, 1):
+                self.reporter.line(f"\n{i}. 广告 {ad['ad_id']} - {ad['campaign']}")
+                self.reporter.line(f"   综合得分: {ad['performance_score']}")
+                self.reporter.line(f"   CTR: {ad['metrics']['CTR']}")
+                self.reporter.line(f"   转化率: {ad['metrics']['conversion_rate']}")
+                self.reporter.line(f"   ROI: {ad['metrics']['ROI']}")
+                self.reporter.line(f"   ROAS: {ad['metrics']['ROAS']}")
+                self.reporter.line(f"   投入: ¥{ad['financial_impact']['cost']:,}")
+                self.reporter.line(f"   亏损: ¥{ad['financial_impact']['loss']:,}")
         
         return worst_performers
     
     def generate_insights_and_diagnosis(self) -> Dict:
         """生成数据洞察和问题诊断"""
-        print("\n" + "=" * 50)
-        print("💡 数据洞察与问题诊断")
-        print("=" * 50)
+        self.reporter.section("💡 数据洞察与问题诊断")
         
         df = self.metrics_data
+        table = self.campaign_table()
+        performance_score = self.ad_performance_score()
         
         insights = {
             "executive_summary": [],
@@ -286,32 +666,33 @@ class MarketingDataAnalyzer:
         }
         
         # 执行摘要生成
-        total_cost = df['cost'].sum()
-        total_revenue = df['revenue'].sum()
+        total_cost = table['cost'].sum()
+        total_revenue = table['revenue'].sum()
         overall_roi = ((total_revenue - total_cost) / total_cost * 100).round(1)
+        negative_roi = df['ROI'] < 0
         
         insights["executive_summary"] = [
             f"总广告投入: ¥{total_cost:,}，总收入: ¥{total_revenue:,}",
             f"整体ROI: {overall_roi}% ({'盈利' if overall_roi > 0 else '亏损'})",
-            f"共分析8个广告，4个campaign",
-            f"发现{len([ad for ad in df.iterrows() if ad[1]['ROI'] < 0])}个亏损广告",
-            f"最佳campaign ROI差异达{df.groupby('campaign')['ROI'].mean().max() - df.groupby('campaign')['ROI'].mean().min():.1f}%"
+            f"共分析{len(df)}个广告，{len(table)}个campaign",
+            f"发现{negative_roi.sum()}个亏损广告",
+            f"最佳campaign ROI差异达{table['ROI'].max() - table['ROI'].min():.1f}%"
         ]
         
         # 关键发现
-        high_performers = df[df['performance_score'] > 0.7]
-        low_performers = df[df['performance_score'] < 0.3]
+        high_performers = df[performance_score > 0.7]
+        low_performers = df[performance_score < 0.3]
         
         insights["key_findings"] = [
             f"高效广告特征: CTR>{high_performers['CTR'].mean():.1f}%, 转化率>{high_performers['conversion_rate'].mean():.1f}%",
             f"低效广告问题: 平均ROI仅{low_performers['ROI'].mean():.1f}%, 远低于50%基准线",
             f"成本控制失衡: CPA分布从¥{df[df['CPA']>0]['CPA'].min():.0f}到¥{df[df['CPA']>0]['CPA'].max():.0f}",
-            f"渠道效率差异: 最佳vs最差campaign ROAS相差{df.groupby('campaign')['ROAS'].mean().max() - df.groupby('campaign')['ROAS'].mean().min():.1f}倍"
+            f"渠道效率差异: 最佳vs最差campaign ROAS相差{table['ROAS'].max() - table['ROAS'].min():.1f}倍"
         ]
         
         # 优化建议
         insights["optimization_recommendations"] = [
-            "立即暂停ROI<0%的广告，预计可节省成本¥" + str(df[df['ROI']<0]['cost'].sum()),
+            "立即暂停ROI<0%的广告，预计可节省成本¥" + str(df.loc[negative_roi, 'cost'].sum()),
             "将预算重新分配给ROI>100%的高效广告",
             "针对CTR<2%的广告优化创意和定向",
             "分析转化率>5%的广告成功因素，复制到其他广告",
@@ -319,139 +700,202 @@ class MarketingDataAnalyzer:
         ]
         
         # 优先级行动
-        worst_ad = df.loc[df['performance_score'].idxmin()]
-        best_campaign = df.groupby('campaign')['ROI'].mean().idxmax()
+        worst_ad = df.loc[performance_score.idxmin()]
+        best_campaign = table['ROI'].idxmax()
+        # 预算调整幅度取自预算计划，而不是固定比例
+        plan = self.budget_plan()
+        best_plan = plan[plan['campaign'] == best_campaign]
+        budget_change = (best_plan['planned_spend'].sum() / best_plan['current_spend'].sum() - 1) * 100
         
         insights["priority_actions"] = [
             f"🚨 紧急: 立即停止广告{worst_ad['ad_id']} (已亏损¥{worst_ad['cost']-worst_ad['revenue']})",
-            f"📈 机会: 增加{best_campaign}预算50%，预期ROI可达{df[df['campaign']==best_campaign]['ROI'].mean():.0f}%",
+            f"📈 机会: {'增加' if budget_change >= 0 else '减少'}{best_campaign}预算{abs(budget_change):.0f}%"
+            f" (按边际ROAS重新分配)，预期ROI可达{table.loc[best_campaign, 'ROI']:.0f}%",
             f"🔧 优化: 重写CTR<2%广告的创意文案",
-            f"📊 监控: 建立每日ROI监控，阈值设为30%"
+            f"📊 监控: 建立每日ROI监控，阈值设为{DAILY_ROI_ALERT:.0f}%"
         ]
         
+        # 有事件时间时直接检查最近一个完整自然日的campaign ROI
+        daily = self.time_windows().get('daily_campaign')
+        if daily is not None:
+            closed = daily.closed_windows()
+            if len(closed):
+                last_day = closed[closed['window_end'] == closed['window_end'].max()]
+                below = last_day[last_day['ROI'] < DAILY_ROI_ALERT]
+                if len(below):
+                    day = last_day['window_start'].iloc[0].strftime('%Y-%m-%d')
+                    insights["priority_actions"].append(
+                        f"⏰ 日监控: {day} ROI低于{DAILY_ROI_ALERT:.0f}%的campaign: "
+                        f"{', '.join(map(str, below['campaign']))}")
+        
         # 输出洞察
-        print("📋 执行摘要:")
-        for item in insights["executive_summary"]:
-            print(f"• {item}")
-            
-        print("\n🔍 关键发现:")
-        for item in insights["key_findings"]:
-            print(f"• {item}")
-            
-        print("\n💰 优化建议:")
-        for item in insights["optimization_recommendations"]:
-            print(f"• {item}")
-            
-        print("\n🎯 优先行动:")
-        for item in insights["priority_actions"]:
-            print(f"• {item}")
+        self.reporter.event('generate_insights_and_diagnosis', overall_roi=float(overall_roi))
+        if self.reporter.verbose:
+            self.reporter.line("📋 执行摘要:")
+            for item in insights["executive_summary"]:
+                self.reporter.line(f"• {item}")
+                
+            self.reporter.line("\n🔍 关键发现:")
+            for item in insights["key_findings"]:
+                self.reporter.line(f"• {item}")
+                
+            self.reporter.line("\n💰 优化建议:")
+            for item in insights["optimization_recommendations"]:
+                self.reporter.line(f"• {item}")
+                
+            self.reporter.line("\n🎯 优先行动:")
+            for item in insights["priority_actions"]:
+                self.reporter.line(f"• {item}")
         
         return insights
     
     def generate_dashboard_data(self) -> Dict:
-        """生成仪表板数据供下游ad-optimizer使用"""
-        campaign_summary = self.metrics_data.groupby('campaign').agg({
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'conversions': 'sum', 
-            'cost': 'sum',
-            'revenue': 'sum',
-            'CTR': 'mean',
-            'conversion_rate': 'mean',
-            'ROI': 'mean',
-            'ROAS': 'mean'
-        }).round(2)
+        """
+        生成仪表板数据供下游ad-optimizer使用
+        ad_level_metrics为DataFrame (AD_LEVEL_COLUMNS)，alert_bits['bits']为ndarray，不是list:
+        避免为每个广告构造dict/list；序列化请用result_export的export_results/encode_json (按批编码)，
+        需要记录列表时调用 ad_level_metrics.to_dict('records')
+        """
+        table = self.campaign_table()
+        campaign_summary = table[NUMERIC_COLUMNS + MEAN_METRICS].round(2)
+        totals = table[NUMERIC_COLUMNS].sum()
         
         dashboard_data = {
             "overall_metrics": {
-                "total_cost": float(self.data['cost'].sum()),
-                "total_revenue": float(self.data['revenue'].sum()),
-                "overall_roi": float(((self.data['revenue'].sum() - self.data['cost'].sum()) / self.data['cost'].sum() * 100).round(1)),
-                "total_conversions": int(self.data['conversions'].sum()),
+                "total_cost": float(totals['cost']),
+                "total_revenue": float(totals['revenue']),
+                "overall_roi": float(round((totals['revenue'] - totals['cost']) / totals['cost'] * 100, 1)),
+                "total_conversions": int(totals['conversions']),
                 "avg_ctr": float(self.metrics_data['CTR'].mean().round(2))
             },
-            "ad_level_metrics": self.metrics_data[['ad_id', 'campaign', 'CTR', 'conversion_rate', 'ROI', 'ROAS', 'CPC', 'CPA']].to_dict('records'),
+            # DataFrame和位图数组原样放入，由result_export按批编码，不逐个广告构造dict/list
+            "ad_level_metrics": self.metrics_data[AD_LEVEL_COLUMNS],
             "campaign_summary": campaign_summary.to_dict('index'),
             "anomaly_alerts": self.results.get('anomalies', {}).get('anomalous_ads', [])[:3],
             "worst_performers": self.results.get('worst_performers', []),
-            "optimization_flags": {
-                "negative_roi_ads": self.metrics_data[self.metrics_data['ROI'] < 0]['ad_id'].tolist(),
-                "low_ctr_ads": self.metrics_data[self.metrics_data['CTR'] < 2.0]['ad_id'].tolist(),
-                "high_cpa_ads": self.metrics_data[self.metrics_data['CPA'] > 80]['ad_id'].tolist()
-            }
+            "optimization_flags": optimization_flags(self.metrics_data, *self.alert_bits()),
+            # 每个广告的规则命中位图，与ad_level_metrics同顺序，第i位对应rules[i]
+            "alert_bits": {"rules": self.alert_bits()[0].names, "bits": self.alert_bits()[1]},
+            "budget_plan": summarize_plan(self.budget_plan()),
+            # 广告相对campaign基线 (BH校正) 和campaign两两之间 (Holm校正) 的显著CTR/转化率差异
+            "significance": significance_summary(self.metrics_data, table[NUMERIC_COLUMNS])
         }
         
+        # 有事件时间时附加每日和滚动24小时的campaign趋势
+        windows = self.time_windows()
+        if windows:
+            from windowed_metrics import dashboard_windows
+            dashboard_data["time_windows"] = dashboard_windows(windows)
+        
         return dashboard_data
     
-    def run_complete_analysis(self) -> Dict:
-        """执行完整分析流程"""
-        print("🚀 开始营销数据完整分析流程")
-        print("分析师：资深数字营销数据分析专家 (10年+经验)")
+    def _run_stage(self, key: str, method):
+        """执行一个分析阶段并立即写入self.results，配置了recorder时记录阶段指标"""
+        if self.recorder is None:
+            self.results[key] = method()
+        else:
+            source = self.metrics_data if self.metrics_data is not None else self.data
+            with self.recorder.stage(method.__name__, rows=len(source)):
+                self.results[key] = method()
+        return self.results[key]
+    
+    def run_complete_analysis(self, stage_metrics_path: str = None, snapshot_path: str = None,
+                              previous_snapshot: str = None) -> Dict:
+        """
+        执行完整分析流程
+        各阶段结果依次写入self.results，后续阶段 (如dashboard) 可以直接引用前面的结果
+        配置recorder时阶段指标放在results['stage_metrics']，指定stage_metrics_path时另存为JSON
+        指定snapshot_path时把广告级指标和告警位图另存为二进制快照 (见result_snapshot)，
+        指定previous_snapshot时与上一次的快照比较，差异摘要放在results['snapshot_diff']
+        """
+        self.reporter.line("🚀 开始营销数据完整分析流程")
+        self.reporter.line("分析师：资深数字营销数据分析专家 (10年+经验)")
+        self.results = {}
+        if self.recorder is not None:
+            # 每次运行只报告本次的阶段指标
+            self.recorder.reset()
         
         # 1. 数据质量检查
-        quality_report = self.validate_data_quality()
+        self._run_stage('quality_report', self.validate_data_quality)
         
         # 2. 计算关键指标
-        metrics_df = self.calculate_key_metrics()
+        self._run_stage('metrics', self.calculate_key_metrics)
         
         # 3. 异常检测
-        anomalies = self.detect_anomalies()
+        self._run_stage('anomalies', self.detect_anomalies)
         
         # 4. Campaign分析
-        campaign_analysis = self.analyze_campaigns()
+        self._run_stage('campaign_analysis', self.analyze_campaigns)
         
         # 5. 识别最差表现者
-        worst_performers = self.identify_worst_performers()
+        self._run_stage('worst_performers', self.identify_worst_performers)
         
         # 6. 生成洞察
-        insights = self.generate_insights_and_diagnosis()
+        self._run_stage('insights', self.generate_insights_and_diagnosis)
         
         # 7. 生成结构化输出
-        dashboard_data = self.generate_dashboard_data()
-        
-        # 保存结果
-        self.results = {
-            'quality_report': quality_report,
-            'metrics': metrics_df,
-            'anomalies': anomalies,
-            'campaign_analysis': campaign_analysis,
-            'worst_performers': worst_performers,
-            'insights': insights,
-            'dashboard_data': dashboard_data
-        }
+        self._run_stage('dashboard_data', self.generate_dashboard_data)
+        
+        if self.recorder is not None:
+            self.results['stage_metrics'] = list(self.recorder.stages)
+            if stage_metrics_path:
+                self.recorder.export(stage_metrics_path)
+        
+        if snapshot_path or previous_snapshot:
+            from result_snapshot import DuplicateAdIdError, ResultSnapshot, diff_snapshots, load_snapshot
+            try:
+                snapshot = ResultSnapshot.from_analyzer(self)
+            except DuplicateAdIdError as exc:
+                # 快照只是附加输出，ad_id重复时跳过快照，不影响分析结果
+                snapshot = None
+                self.reporter.event('snapshot_skipped', reason=str(exc))
+                self.reporter.line(f"⚠️  跳过结果快照: {exc}")
+            if snapshot is not None and previous_snapshot:
+                diff = diff_snapshots(load_snapshot(previous_snapshot), snapshot)
+                self.results['snapshot_diff'] = diff.summary()
+                self.reporter.event('snapshot_diff', changed=int(diff.changed.sum()),
+                                    added=int(diff.added.sum()), removed=int(diff.removed.sum()))
+            if snapshot is not None and snapshot_path:
+                snapshot.save(snapshot_path)
+        
+        self.reporter.event('run_complete_analysis', ads=len(self.metrics_data))
+        self.reporter.section("✅ 分析完成！结果已准备好供ad-optimizer使用")
         
-        print("\n" + "=" * 50)
-        print("✅ 分析完成！结果已准备好供ad-optimizer使用")
-        print("=" * 50)
+        return self.results
+
+    def run_streaming_analysis(self) -> Dict:
+        """
+        流式分析 - 按chunksize分块读取CSV，只累加campaign汇总和全局统计
+        峰值内存由分块大小和campaign数量决定，与文件大小无关
+        广告级明细 (异常广告、最差广告等) 需要整表数据，流式模式不输出
+        """
+        self.reporter.line("🚀 开始营销数据流式分析流程")
+        if self.reporter.verbose:
+            self.reporter.line(f"分块大小: {self.chunksize:,} 行")
+        
+        accumulator = accumulate_csv(self.data_path, self.chunksize)
+        self.results = build_accumulated_results(accumulator)
+        quality_report = self.results['quality_report']
+        campaign_analysis = self.results['campaign_analysis']
+        dashboard_data = self.results['dashboard_data']
+        
+        self.reporter.event('run_streaming_analysis', records=quality_report['total_records'],
+                            campaigns=len(campaign_analysis))
+        if self.reporter.verbose:
+            self.reporter.line(f"总记录数: {quality_report['total_records']}")
+            if quality_report['logical_issues']:
+                self.reporter.line(f"⚠️  数据逻辑问题: {quality_report['logical_issues']}")
+            self.reporter.line(f"Campaign数量: {len(campaign_analysis)}")
+            self.reporter.line(f"整体ROI: {dashboard_data['overall_metrics']['overall_roi']}%")
+            self.reporter.line("✅ 流式分析完成！")
         
         return self.results
 
+
 def main():
-    """主函数"""
-    # 初始化分析器
-    analyzer = MarketingDataAnalyzer('/Users/zhangqingyue/Gaussian/test/learnagent/marketing_data.csv')
-    
-    # 执行完整分析
-    results = analyzer.run_complete_analysis()
-    
-    # 保存结构化结果供下游使用
-    import json
-    
-    # 处理不可序列化的对象
-    serializable_results = {}
-    for key, value in results.items():
-        if isinstance(value, pd.DataFrame):
-            serializable_results[key] = value.to_dict('records')
-        else:
-            serializable_results[key] = value
-    
-    # 保存为JSON格式
-    with open('/Users/zhangqingyue/Gaussian/test/learnagent/marketing_analysis_results.json', 'w', encoding='utf-8') as f:
-        json.dump(serializable_results, f, ensure_ascii=False, indent=2)
-    
-    print(f"\n📄 结构化分析结果已保存到: /Users/zhangqingyue/Gaussian/test/learnagent/marketing_analysis_results.json")
-    
-    return results
+    """主函数 - 等同于 marketing_cli.py analyze [csv] [选项]"""
+    from marketing_cli import main as cli_main
+    return cli_main(['analyze'] + sys.argv[1:])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
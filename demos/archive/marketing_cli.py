@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+营销分析统一命令行入口
+  report     广告报告 (ad_analysis)，小文件走纯Python实现 (quick_report)，不导入pandas
+  analyze    完整分析 (run_complete_analysis，指定--chunksize时为流式分析)，结果导出为JSON
+  dashboard  只导出dashboard数据，默认写到stdout
+模块顶层只导入标准库和reporting，pandas/numpy在子命令真正需要时才导入
+"""
+
+import argparse
+import os
+import sys
+from typing import List
+
+from reporting import REPORTERS, make_reporter
+
+ARCHIVE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 各子命令不指定数据文件时使用的示例数据
+DEFAULT_REPORT_DATA = os.path.normpath(os.path.join(ARCHIVE_DIR, '..', 'demo-data', 'sales-data.csv'))
+DEFAULT_ANALYSIS_DATA = os.path.join(ARCHIVE_DIR, 'marketing_data.csv')
+
+# analyze默认把结果写到数据文件同目录下的该文件
+RESULTS_FILE = 'marketing_analysis_results.json'
+
+
+def run_report(args):
+    """engine=auto时，console模式且文件不超过QUICK_MAX_BYTES走纯Python实现，解析失败时退回pandas"""
+    if args.engine != 'pandas' and args.report == 'console':
+        from quick_report import QUICK_MAX_BYTES, print_quick_report
+        if args.engine == 'quick' or os.path.getsize(args.data) <= QUICK_MAX_BYTES:
+            try:
+                return print_quick_report(args.data)
+            except ValueError:
+                if args.engine == 'quick':
+                    raise
+
+    from ad_analysis import print_report
+    print_report(args.data, make_reporter(args.report))
+
+
+def _analyzer(args):
+    from data_cache import default_cache_dir
+    from marketing_analysis import MarketingDataAnalyzer
+
+    cache_dir = None if args.no_cache or args.chunksize else default_cache_dir(args.data)
+    return MarketingDataAnalyzer(args.data, chunksize=args.chunksize, cache_dir=cache_dir,
+                                 reporter=make_reporter(args.report))
+
+
+def run_analyze(args):
+    from result_export import PRETTY_MAX_ROWS, export_results
+
+    analyzer = _analyzer(args)
+    if args.chunksize:
+        results = analyzer.run_streaming_analysis()
+    else:
+        results = analyzer.run_complete_analysis(snapshot_path=args.snapshot,
+                                                 previous_snapshot=args.previous_snapshot)
+
+    # 保存结构化结果供下游使用 - DataFrame按列流式写出，小结果保留缩进格式
+    output_path = args.output or os.path.join(os.path.dirname(os.path.abspath(args.data)), RESULTS_FILE)
+    pretty = analyzer.metrics_data is not None and len(analyzer.metrics_data) <= PRETTY_MAX_ROWS
+    export_results(results, output_path, fmt=args.format, pretty=pretty)
+    analyzer.reporter.line(f"\n📄 结构化分析结果已保存到: {output_path}")
+    return results
+
+
+def run_dashboard(args):
+    from result_export import encode_json
+
+    analyzer = _analyzer(args)
+    results = analyzer.run_streaming_analysis() if args.chunksize else analyzer.run_complete_analysis()
+    body = encode_json(results['dashboard_data'])
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body + b'\n')
+    return results['dashboard_data']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="营销数据分析命令行")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help="广告表现报告")
+    report.add_argument('data', nargs='?', default=DEFAULT_REPORT_DATA, help="广告数据CSV路径")
+    report.add_argument('--engine', default='auto', choices=['auto', 'quick', 'pandas'],
+                        help="auto: 小文件用纯Python实现，其余用pandas")
+    report.add_argument('--report', default='console', choices=list(REPORTERS))
+    report.set_defaults(handler=run_report)
+
+    for name, handler, help_text, default_report in [
+        ('analyze', run_analyze, "完整分析并导出结果", 'console'),
+        ('dashboard', run_dashboard, "导出dashboard数据", 'silent'),
+    ]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('data', nargs='?', default=DEFAULT_ANALYSIS_DATA, help="广告数据CSV路径")
+        command.add_argument('--output', help="输出路径")
+        command.add_argument('--chunksize', type=int, help="分块流式分析 (只输出campaign级结果)")
+        command.add_argument('--no-cache', action='store_true', help="不使用解析结果缓存")
+        command.add_argument('--report', default=default_report, choices=list(REPORTERS))
+        command.set_defaults(handler=handler)
+
+    analyze = commands.choices['analyze']
+    analyze.add_argument('--format', default='json', choices=['json', 'jsonl'])
+    analyze.add_argument('--snapshot', help="另存二进制结果快照的路径")
+    analyze.add_argument('--previous-snapshot', help="与该快照比较，差异放在snapshot_diff")
+    return parser
+
+
+def main(argv: List[str] = None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+营销数据CSV的紧凑类型加载
+campaign用categorical，ad_id保留为字符串 ("001"不再变成1)，
+计数列按实际取值收缩到最小的安全整数宽度，金额列在无损时使用float32；
+可选的timestamp列 (事件时间) 解析为datetime64，供时间窗口指标使用
+"""
+
+import numpy as np
+import pandas as pd
+
+# 计数列: 先按int64解析，再按取值范围收缩
+COUNTER_COLUMNS = ['impressions', 'clicks', 'conversions']
+
+# 金额列: 先按float64解析，能无损表示时转为float32
+MONEY_COLUMNS = ['cost', 'revenue']
+
+# 可选的事件时间列，没有该列的数据只能做静态快照分析
+TIMESTAMP_COLUMN = 'timestamp'
+
+# read_csv直接使用的列类型
+MARKETING_SCHEMA = {
+    'ad_id': str,
+    'campaign': 'category',
+    **{col: 'float64' for col in MONEY_COLUMNS}
+}
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """原地收缩计数列和金额列的数值宽度并返回df"""
+    for col in COUNTER_COLUMNS:
+        if col in df and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in MONEY_COLUMNS:
+        if col not in df:
+            continue
+        values = df[col].to_numpy(dtype='float64')
+        compact = values.astype(np.float32)
+        # 只有每个值都能原样还原时才降为float32，避免金额被悄悄改写
+        if np.array_equal(compact.astype(np.float64), values, equal_nan=True):
+            df[col] = compact
+
+    return df
+
+
+def parse_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    """存在timestamp列时原地解析为datetime64并返回df"""
+    if TIMESTAMP_COLUMN in df and not pd.api.types.is_datetime64_any_dtype(df[TIMESTAMP_COLUMN]):
+        df[TIMESTAMP_COLUMN] = pd.to_datetime(df[TIMESTAMP_COLUMN])
+    return df
+
+
+def widen_money(df: pd.DataFrame) -> pd.DataFrame:
+    """计算前把金额列恢复为float64 (原地)，保证比率和合计的精度与原始数据一致"""
+    for col in MONEY_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype('float64')
+    return df
+
+
+def load_marketing_csv(data_path: str, chunksize: int = None, **read_csv_kwargs):
+    """
+    按MARKETING_SCHEMA读取营销数据CSV
+    chunksize为空时返回DataFrame，否则返回逐块收缩类型后的生成器
+    """
+    dtype = {**MARKETING_SCHEMA, **read_csv_kwargs.pop('dtype', {})}
+
+    if chunksize is None:
+        return parse_timestamps(compact_dtypes(pd.read_csv(data_path, dtype=dtype, **read_csv_kwargs)))
+
+    reader = pd.read_csv(data_path, dtype=dtype, chunksize=chunksize, **read_csv_kwargs)
+    return (parse_timestamps(compact_dtypes(chunk)) for chunk in reader)
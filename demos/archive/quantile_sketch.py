@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可合并的分位数草图 (KLL)
+分块或分区数据各自建草图再合并，内存只与k有关，与数据行数无关；
+用于在无法整列排序的大数据上估计异常阈值
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# 默认做草图的广告级指标
+SKETCH_METRICS = ['CTR', 'conversion_rate', 'ROI', 'CPA']
+
+# 比率指标 (CTR/转化率/ROI) 的单位: ad_analysis为比例值，marketing_analysis为百分数 (两位小数)
+RATIO = 'ratio'
+PERCENT = 'percent'
+
+# 每层容量相对上一层的衰减系数 (KLL论文推荐值)
+_CAPACITY_DECAY = 2.0 / 3.0
+
+
+class KLLSketch:
+    """
+    KLL分位数草图
+    第h层的每个元素代表2^h个原始值，层满时排序后隔一个取一个提升到上一层；
+    默认k=200时单个分位数的归一化排名误差约1.3% (99%置信)
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.total = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        # ±inf不进入草图，只计数，供需要与pandas均值一致的调用方使用
+        self.pos_inf = 0
+        self.neg_inf = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def update(self, values) -> 'KLLSketch':
+        """加入一批值，NaN忽略；无穷大只计数，不参与分位数"""
+        values = np.asarray(values, dtype='float64')
+        self.pos_inf += int(np.count_nonzero(values == np.inf))
+        self.neg_inf += int(np.count_nonzero(values == -np.inf))
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = float(np.fmin(self.min, values.min()))
+        self.max = float(np.fmax(self.max, values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """合并另一个草图 (例如另一个分块或分区的结果)"""
+        self.pos_inf += other.pos_inf
+        self.neg_inf += other.neg_inf
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.total += other.total
+        self.min = float(np.fmin(self.min, other.min))
+        self.max = float(np.fmax(self.max, other.max))
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            # 个数为奇数时留下一个，其余排序后随机取奇数位或偶数位，提升一层权重翻倍
+            items = np.sort(items)
+            keep = items[:len(items) % 2]
+            paired = items[len(keep):]
+            promoted = paired[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # 新增一层后下层容量变小，从最底层重新检查
+            level = 0
+
+    def _weighted_items(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """估计q分位数，q可以是标量或数组；没有数据时返回NaN"""
+        q_array = np.atleast_1d(np.asarray(q, dtype='float64'))
+        if self.count == 0:
+            result = np.full(len(q_array), np.nan)
+        else:
+            values, cumulative = self._weighted_items()
+            targets = q_array * cumulative[-1]
+            result = values[np.minimum(np.searchsorted(cumulative, targets), len(values) - 1)]
+            # 两端用精确的最小/最大值
+            result = np.where(q_array <= 0, self.min, np.where(q_array >= 1, self.max, result))
+        return float(result[0]) if np.ndim(q) == 0 else result
+
+    def rank(self, value: float) -> float:
+        """估计小于等于value的值所占比例"""
+        if self.count == 0:
+            return np.nan
+        values, cumulative = self._weighted_items()
+        position = np.searchsorted(values, value, side='right')
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def mean(self, include_inf: bool = False) -> float:
+        """
+        有限值的精确均值 (和与计数都可合并)
+        include_inf为True时与Series.mean()一致: 出现+inf为inf，出现-inf为-inf，两者都有为NaN
+        """
+        if include_inf and (self.pos_inf or self.neg_inf):
+            if self.pos_inf and self.neg_inf:
+                return np.nan
+            return np.inf if self.pos_inf else -np.inf
+        return self.total / self.count if self.count else np.nan
+
+    def rank_error(self) -> float:
+        """单个分位数的归一化排名误差上界 (99%置信，Apache DataSketches的经验公式，非PMF)"""
+        return 2.296 / self.k ** 0.9723
+
+    def retained(self) -> int:
+        """草图中实际保存的元素数"""
+        return sum(len(items) for items in self.levels)
+
+
+class MetricSketches:
+    """
+    多个广告级指标的草图集合，按列从数据块更新，可整体合并
+    同时给出每个指标的均值，调用方不必为每个广告重复计算
+    unit记录比率指标的单位 (RATIO或PERCENT)，单位不同的草图不能合并
+    """
+
+    def __init__(self, metrics: List[str] = None, k: int = 200, seed: int = 0, unit: str = RATIO):
+        if unit not in (RATIO, PERCENT):
+            raise ValueError(f"未知的指标单位: {unit}")
+        self.metrics = list(metrics or SKETCH_METRICS)
+        self.unit = unit
+        self.sketches = {metric: KLLSketch(k, seed) for metric in self.metrics}
+
+    def update(self, frame: pd.DataFrame) -> 'MetricSketches':
+        for metric, sketch in self.sketches.items():
+            sketch.update(frame[metric].to_numpy(dtype='float64'))
+        return self
+
+    def merge(self, other: 'MetricSketches') -> 'MetricSketches':
+        if other.unit != self.unit:
+            raise ValueError(f"指标单位不同的草图不能合并: {self.unit} 和 {other.unit}")
+        for metric, sketch in self.sketches.items():
+            sketch.merge(other.sketches[metric])
+        return self
+
+    def quantile(self, metric: str, q):
+        return self.sketches[metric].quantile(q)
+
+    def means(self, include_inf: bool = False) -> Dict[str, float]:
+        """每个指标的均值，include_inf含义见KLLSketch.mean"""
+        return {metric: sketch.mean(include_inf) for metric, sketch in self.sketches.items()}
+
+    def summary(self, quantiles=(0.25, 0.5, 0.75, 0.95)) -> Dict:
+        """每个指标的计数、均值、分位数和误差上界"""
+        report = {}
+        for metric, sketch in self.sketches.items():
+            estimates = sketch.quantile(np.asarray(quantiles))
+            report[metric] = {
+                'count': sketch.count,
+                'mean': sketch.mean(),
+                'quantiles': {f'p{round(q * 100):g}': float(value) for q, value in zip(quantiles, estimates)},
+                'rank_error': round(sketch.rank_error(), 4),
+            }
+        return report
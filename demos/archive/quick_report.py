@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+小文件的纯Python广告报告
+几十行的CSV，导入pandas/numpy的时间是计算本身的上千倍；这里只用标准库复现ad_analysis的控制台报告
+(文字与print_report一致，修改报告格式时两处同步)
+数值处理与pandas/numpy的结果逐位一致: 除零得到inf/nan，均值按numpy的成对求和，
+分组合计按pandas的Kahan求和，round按numpy的 rint(x·10^d)/10^d
+文件中有缺失值或非数字时抛出ValueError (在输出任何内容之前)，由调用方改用pandas实现
+"""
+
+import csv
+import json
+import math
+import operator
+import os
+from typing import Dict, List
+
+# 不超过该大小的文件默认走纯Python实现
+QUICK_MAX_BYTES = 64 * 1024
+
+# 与alert_rules.load_alert_rules使用同一份规则文件 (不导入alert_rules，避免加载numpy)
+RULES_PATH_ENV = 'MARKETING_ALERT_RULES'
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alert_rules.json')
+
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt,
+             '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+COUNTER_COLUMNS = ['impressions', 'clicks', 'conversions']
+MONEY_COLUMNS = ['cost', 'revenue']
+
+# numpy成对求和的分块大小
+_PW_BLOCKSIZE = 128
+
+
+def read_small_csv(csv_file: str) -> List[Dict]:
+    """读取营销数据CSV，计数列为int、金额列为float；任何缺失或非法值都抛出ValueError"""
+    with open(csv_file, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError("空文件")
+    for row in rows:
+        if not row.get('ad_id') or not row.get('campaign'):
+            raise ValueError("缺少ad_id或campaign")
+        for col in COUNTER_COLUMNS:
+            row[col] = int(row[col])
+        for col in MONEY_COLUMNS:
+            row[col] = float(row[col])
+            if math.isnan(row[col]):
+                raise ValueError(f"{col}存在缺失值")
+    return rows
+
+
+def _div(a, b) -> float:
+    """与numpy的浮点除法一致: x/0为±inf，0/0为nan"""
+    if b == 0:
+        return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _pairwise_sum(values: List[float]) -> float:
+    """numpy对连续float64数组求和的成对求和 (8路展开)"""
+    n = len(values)
+    if n < 8:
+        total = 0.0
+        for value in values:
+            total += value
+        return total
+    if n <= _PW_BLOCKSIZE:
+        r = values[:8]
+        i = 8
+        while i < n - n % 8:
+            for j in range(8):
+                r[j] += values[i + j]
+            i += 8
+        total = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]))
+        for value in values[i:]:
+            total += value
+        return total
+    half = n // 2
+    half -= half % 8
+    return _pairwise_sum(values[:half]) + _pairwise_sum(values[half:])
+
+
+def _mean(values: List[float]) -> float:
+    """Series.mean(): NaN填0后求和，除以非NaN个数"""
+    count = sum(1 for value in values if not math.isnan(value))
+    if count == 0:
+        return math.nan
+    return _pairwise_sum([0.0 if math.isnan(value) else value for value in values]) / count
+
+
+def _quantile(values: List[float], q: float) -> float:
+    """Series.quantile()的线性插值 (numpy的_lerp写法)"""
+    ordered = sorted(value for value in values if not math.isnan(value))
+    if not ordered:
+        return math.nan
+    position = q * (len(ordered) - 1)
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    t = position - low
+    a, b = ordered[low], ordered[high]
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+def _kahan_sum(values: List[float]) -> float:
+    """pandas分组求和 (group_sum) 的Kahan补偿求和"""
+    total = compensation = 0.0
+    for value in values:
+        y = value - compensation
+        t = total + y
+        compensation = t - total - y
+        if compensation != compensation:
+            compensation = 0.0
+        total = t
+    return total
+
+
+def _round(value: float, decimals: int) -> float:
+    """numpy.round: rint(x·10^d)/10^d，恰好一半时取偶"""
+    if not math.isfinite(value):
+        return value
+    scale = 10.0 ** decimals
+    return float(round(value * scale)) / scale
+
+
+def _select_smallest(scores: List[float], k: int) -> List[int]:
+    """与selection.select_k一致: 最小的k个，同分按原始顺序，NaN不参与"""
+    valid = [i for i, score in enumerate(scores) if not math.isnan(score)]
+    return sorted(valid, key=lambda i: (scores[i], i))[:k]
+
+
+def _sort_desc(items: List, key) -> List:
+    """sort_values(ascending=False): 降序，同值保持原顺序，NaN排最后"""
+    return sorted(items, key=lambda item: (math.isnan(key(item)), -key(item) if not math.isnan(key(item)) else 0))
+
+
+def load_rules(group: str) -> Dict[str, Dict]:
+    path = os.environ.get(RULES_PATH_ENV) or DEFAULT_RULES_PATH
+    with open(path, encoding='utf-8') as f:
+        return {rule['name']: rule for rule in json.load(f)['rules'] if rule.get('group') == group}
+
+
+def _hits(rule: Dict, row: Dict) -> bool:
+    """规则的全部条件成立时命中；缺列视为不命中，NaN比较不成立"""
+    return all(column in row and OPERATORS[op](row[column], float(value))
+               for column, op, value in rule['when'])
+
+
+def compute_core_metrics(rows: List[Dict]) -> List[Dict]:
+    """与ad_analysis.compute_core_metrics相同的比例值指标"""
+    for row in rows:
+        row['CTR'] = _div(row['clicks'], row['impressions'])
+        row['conversion_rate'] = _div(row['conversions'], row['clicks'])
+        row['ROI'] = _div(row['revenue'] - row['cost'], row['cost'])
+        row['CPC'] = _div(row['cost'], row['clicks'])
+        row['CPA'] = _div(row['cost'], row['conversions'])
+    return rows
+
+
+def campaign_stats(rows: List[Dict]) -> Dict[str, Dict]:
+    """按campaign名称排序的汇总 (合计保留两位小数) 和活动级别比率"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['campaign'], []).append(row)
+    stats = {}
+    for campaign in sorted(groups):
+        members = groups[campaign]
+        total = {col: sum(row[col] for row in members) for col in COUNTER_COLUMNS}
+        total.update({col: _round(_kahan_sum([row[col] for row in members]), 2) for col in MONEY_COLUMNS})
+        total['CTR'] = _div(total['clicks'], total['impressions'])
+        total['conversion_rate'] = _div(total['conversions'], total['clicks'])
+        total['ROI'] = _div(total['revenue'] - total['cost'], total['cost'])
+        stats[campaign] = total
+    return stats
+
+
+def print_quick_report(csv_file: str, out=print):
+    """输出与ad_analysis.print_report (控制台模式) 相同的报告"""
+    rows = compute_core_metrics(read_small_csv(csv_file))
+    rules = load_rules('ad_analysis')
+
+    out("广告数据分析报告")
+    out("=" * 50)
+    out("分析师: Linus式数据驱动方法")
+    out("原则: 用数据说话，不搞理论，直接给结论\n")
+
+    out("=== 原始数据检查 ===")
+    out(f"总共 {len(rows)} 个广告")
+    out(f"涉及 {len({row['campaign'] for row in rows})} 个活动")
+    out()
+
+    metric_means = {col: _mean([row[col] for row in rows]) for col in ['CTR', 'conversion_rate', 'ROI']}
+    high_ctr_threshold = _quantile([row['CTR'] for row in rows], 0.75) * 2
+
+    out("=== 关键指标汇总 ===")
+    out("Ad_ID  Campaign      CTR%    Conv%    ROI%     CPC    CPA     Revenue")
+    out("-" * 75)
+    for row in rows:
+        out(f"{row['ad_id']:<6} {row['campaign']:<12} "
+            f"{row['CTR']*100:>6.2f}  {row['conversion_rate']*100:>6.2f}  "
+            f"{row['ROI']*100:>6.1f}   {row['CPC']:>6.1f}  {row['CPA']:>6.1f}   "
+            f"{row['revenue']:>7.0f}")
+    out()
+
+    scores = [row['CTR'] * 0.3 + row['conversion_rate'] * 0.3 + row['ROI'] * 0.4 for row in rows]
+    worst_ads = [rows[i] for i in _select_smallest(scores, 3)]
+
+    out("=== 表现最差的3个广告 ===")
+    for i, ad in enumerate(worst_ads, 1):
+        out(f"\n{i}. 广告 {ad['ad_id']} ({ad['campaign']})")
+        out(f"   CTR: {ad['CTR']*100:.2f}% (点击率)")
+        out(f"   转化率: {ad['conversion_rate']*100:.2f}%")
+        out(f"   ROI: {ad['ROI']*100:.1f}%")
+        out(f"   问题分析:")
+        problems = []
+        if ad['CTR'] < metric_means['CTR']:
+            problems.append(f"点击率低于平均值({metric_means['CTR']*100:.2f}%)")
+        if ad['conversion_rate'] < metric_means['conversion_rate']:
+            problems.append(f"转化率低于平均值({metric_means['conversion_rate']*100:.2f}%)")
+        if 'negative_roi' in rules and _hits(rules['negative_roi'], ad):
+            problems.append("ROI为负，亏损严重")
+        elif ad['ROI'] < metric_means['ROI']:
+            problems.append(f"ROI低于平均值({metric_means['ROI']*100:.1f}%)")
+        for problem in problems:
+            out(f"     - {problem}")
+
+    stats = campaign_stats(rows)
+    out(f"\n=== 活动层面分析 ===")
+    out("Campaign        总展示   总点击  总转化   总成本   总收入    CTR%   Conv%   ROI%")
+    out("-" * 85)
+    for campaign, total in stats.items():
+        out(f"{campaign:<12} {total['impressions']:>8.0f} {total['clicks']:>8.0f} "
+            f"{total['conversions']:>7.0f} {total['cost']:>8.0f} {total['revenue']:>8.0f} "
+            f"{total['CTR']*100:>6.2f} {total['conversion_rate']*100:>6.2f} {total['ROI']*100:>6.1f}")
+
+    out(f"\n=== 数据洞察与建议 ===")
+    out("1. 异常数据点检测:")
+    high_ctr = [row['ad_id'] for row in rows if row['CTR'] > high_ctr_threshold]
+    if high_ctr:
+        out(f"   - 异常高CTR广告: {high_ctr}")
+    if 'severe_loss' in rules:
+        severe_loss = [row['ad_id'] for row in rows if _hits(rules['severe_loss'], row)]
+        if severe_loss:
+            out(f"   - 严重亏损广告(ROI<{rules['severe_loss']['when'][0][2]:.0%}): {severe_loss}")
+
+    campaign_roi = _sort_desc(list(stats.items()), lambda item: item[1]['ROI'])
+    out(f"\n2. 活动表现排序(按ROI):")
+    for i, (campaign, total) in enumerate(campaign_roi, 1):
+        status = "优秀" if total['ROI'] > 1 else "一般" if total['ROI'] > 0 else "亏损"
+        out(f"   {i}. {campaign}: ROI {total['ROI']*100:.1f}% ({status})")
+
+    out(f"\n=== 终极结论和建议 ===")
+    out("基于数据的硬核事实:")
+    out(f"1. 最差广告是 {worst_ads[0]['ad_id']}，ROI仅{worst_ads[0]['ROI']*100:.1f}%")
+    out(f"2. 最佳活动是 {campaign_roi[0][0]}")
+    out(f"3. 整体平均ROI: {metric_means['ROI']*100:.1f}%")
+
+    out(f"\n立即行动建议:")
+    negative_roi = [row['ad_id'] for row in rows if 'negative_roi' in rules and _hits(rules['negative_roi'], row)]
+    # nlargest: 降序取前2个，非NaN不足时用NaN行补足
+    best = _sort_desc(list(range(len(rows))), lambda i: rows[i]['ROI'])[:2]
+    out(f"1. 停掉ROI<0的广告: {negative_roi}")
+    out(f"2. 增加投入到最佳广告: {[rows[i]['ad_id'] for i in best]}")
+    out(f"3. 重点优化转化率<2%的广告")
+
+    out(f"\n数据就是这样，不会撒谎。")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析过程输出
+计算代码只向Reporter报告，由Reporter决定怎么展示:
+- ConsoleReporter: 原有的控制台报告 (默认)
+- SummaryReporter: 每个阶段一行摘要
+- EventReporter: 每个阶段一行JSON结构化事件，便于日志采集
+- Reporter: 静默，批量任务不付出任何格式化开销
+
+逐行/逐广告的明细只在reporter.verbose为True时才格式化
+"""
+
+import json
+import sys
+import time
+
+
+class Reporter:
+    """静默模式 - 所有输出均为空操作，也是其他模式的基类"""
+
+    verbose = False
+
+    def section(self, title: str):
+        """阶段标题"""
+
+    def line(self, text: str = ''):
+        """明细文本，只有verbose模式会调用到格式化代码"""
+
+    def event(self, name: str, **fields):
+        """阶段完成事件，fields只放计数等轻量字段"""
+
+
+class ConsoleReporter(Reporter):
+    """控制台模式 - 保持原有的完整报告输出"""
+
+    verbose = True
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def section(self, title: str):
+        self.line("\n" + "=" * 50)
+        self.line(title)
+        self.line("=" * 50)
+
+    def line(self, text: str = ''):
+        print(text, file=self.stream)
+
+
+class SummaryReporter(Reporter):
+    """汇总模式 - 每个阶段只输出一行"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def event(self, name: str, **fields):
+        summary = ", ".join(f"{key}={value}" for key, value in fields.items())
+        print(f"[{name}] {summary}", file=self.stream)
+
+
+class EventReporter(Reporter):
+    """结构化事件模式 - 每个事件输出一行JSON"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def event(self, name: str, **fields):
+        record = {'event': name, 'time': round(time.time(), 3), **fields}
+        self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+
+REPORTERS = {
+    'console': ConsoleReporter,
+    'summary': SummaryReporter,
+    'events': EventReporter,
+    'silent': Reporter,
+}
+
+
+def make_reporter(mode: str = 'console') -> Reporter:
+    """按名称创建reporter: console / summary / events / silent"""
+    if mode not in REPORTERS:
+        raise ValueError(f"未知的输出模式: {mode}")
+    return REPORTERS[mode]()
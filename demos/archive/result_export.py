@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果导出
+DataFrame按列分批转为原生Python值后直接写文件 (嵌套在dict中的DataFrame和ndarray也一样)，
+不先构造完整的嵌套字典
+支持紧凑JSON、JSON Lines，以及给小结果用的缩进格式
+"""
+
+import json
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+# 小于该行数的结果默认输出缩进格式，便于人工查看
+PRETTY_MAX_ROWS = 10_000
+
+# 每批转换的行数，控制导出时的额外内存
+BATCH_SIZE = 50_000
+
+
+def _json_default(obj):
+    """json无法直接处理的对象: numpy标量/数组、pandas时间、dtype等"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    if isinstance(obj, pd.Series):
+        return obj.tolist()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+
+def encode_json(value) -> bytes:
+    """紧凑JSON的UTF-8字节，供HTTP等直接发送；嵌套的DataFrame/ndarray同样按批转换"""
+    parts = []
+    _write_value(parts.append, value)
+    return ''.join(parts).encode('utf-8')
+
+
+def iter_record_batches(frame: pd.DataFrame, batch_size: int = BATCH_SIZE) -> Iterator[List[Dict]]:
+    """按批把DataFrame转为记录列表，每列用tolist一次性转为原生类型"""
+    columns = [str(col) for col in frame.columns]
+    for start in range(0, len(frame), batch_size):
+        batch = frame.iloc[start:start + batch_size]
+        values = [batch[col].tolist() for col in batch.columns]
+        yield [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def _write_batches(write, batches):
+    """每批整体交给json编码器，再去掉外层方括号拼接成一个数组"""
+    write('[')
+    first = True
+    for batch in batches:
+        chunk = _dumps(batch)[1:-1]
+        if chunk:
+            write(chunk if first else ',' + chunk)
+            first = False
+    write(']')
+
+
+def _is_bulk(value) -> bool:
+    """值中 (含嵌套dict) 是否有需要按批写出的DataFrame或ndarray"""
+    if isinstance(value, (pd.DataFrame, np.ndarray)):
+        return True
+    return isinstance(value, dict) and any(_is_bulk(item) for item in value.values())
+
+
+def _write_value(write, value):
+    """写出一个JSON值: DataFrame按记录、ndarray按元素分批转换，包含它们的dict逐项写出，其余整体编码"""
+    if isinstance(value, pd.DataFrame):
+        _write_batches(write, iter_record_batches(value))
+    elif isinstance(value, np.ndarray):
+        _write_batches(write, (value[start:start + BATCH_SIZE].tolist()
+                               for start in range(0, len(value), BATCH_SIZE)))
+    elif _is_bulk(value):
+        write('{')
+        for i, (key, item) in enumerate(value.items()):
+            write(('' if i == 0 else ',') + _dumps(str(key)) + ':')
+            _write_value(write, item)
+        write('}')
+    else:
+        write(_dumps(value))
+
+
+def export_results(results: Dict, output_path: str, fmt: str = 'json', pretty: bool = False):
+    """
+    导出run_complete_analysis的结果
+    fmt='json': 单个JSON对象，DataFrame字段流式写为记录数组；pretty=True时按缩进格式输出
+    fmt='jsonl': 每行一个JSON，DataFrame每条记录一行 {"section": 字段名, "record": 记录}，
+                 其余字段一行 {"section": 字段名, "value": 值}
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        if fmt == 'jsonl':
+            for key, value in results.items():
+                if isinstance(value, pd.DataFrame):
+                    prefix = '{"section":' + _dumps(key) + ',"record":'
+                    for records in iter_record_batches(value):
+                        f.writelines(prefix + _dumps(record) + '}\n' for record in records)
+                else:
+                    f.write('{"section":' + _dumps(key) + ',"value":')
+                    _write_value(f.write, value)
+                    f.write('}\n')
+        elif fmt == 'json' and pretty:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=_json_default)
+        elif fmt == 'json':
+            f.write('{')
+            for i, (key, value) in enumerate(results.items()):
+                f.write(('' if i == 0 else ',') + _dumps(key) + ':')
+                _write_value(f.write, value)
+            f.write('}')
+        else:
+            raise ValueError(f"不支持的导出格式: {fmt}")
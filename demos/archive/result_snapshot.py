@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析结果快照与差异比较
+每次run_complete_analysis后把广告级指标、告警规则位图和campaign汇总存成一个紧凑的.npz文件
+(ad_id按字节排序，指标为float32)，两次运行的快照按ad_id归并连接，
+在线性时间内得到新增/移除/指标变化的广告、新出现和已解除的异常以及campaign的ROI变化
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from marketing_analysis import AD_LEVEL_COLUMNS, NUMERIC_COLUMNS, compute_campaign_ratios
+from result_export import export_results
+from selection import select_k
+
+# 快照中保存的广告级指标
+SNAPSHOT_METRICS = AD_LEVEL_COLUMNS[2:]
+
+# 快照格式版本，格式变化时旧快照不能直接比较
+FORMAT_VERSION = 1
+
+# 指标变化小于该值视为未变化 (指标按两位小数取整，float32在十万以内的误差远小于0.01)
+DEFAULT_TOLERANCE = 0.01
+
+# 差异摘要中每类列出的广告数
+TOP_CHANGES = 20
+
+
+class DuplicateAdIdError(ValueError):
+    """快照按ad_id归并连接，ad_id重复的数据不能建立快照"""
+
+
+class ResultSnapshot:
+    """
+    一次分析的广告级结果，所有数组按ad_id升序排列
+    campaign按编码保存 (campaigns为名称表)，规则位图的第i位对应rule_names[i]
+    """
+
+    def __init__(self, ad_id: np.ndarray, campaign_codes: np.ndarray, campaigns: np.ndarray,
+                 metrics: np.ndarray, bits: np.ndarray, rule_names: np.ndarray, rule_groups: np.ndarray,
+                 campaign_sums: np.ndarray, campaign_ads: np.ndarray, meta: Dict):
+        self.ad_id = ad_id
+        self.campaign_codes = campaign_codes
+        self.campaigns = campaigns
+        self.metrics = metrics
+        self.bits = bits
+        self.rule_names = rule_names
+        self.rule_groups = rule_groups
+        self.campaign_sums = campaign_sums
+        self.campaign_ads = campaign_ads
+        self.meta = meta
+
+    def __len__(self) -> int:
+        return len(self.ad_id)
+
+    @classmethod
+    def from_analyzer(cls, analyzer) -> 'ResultSnapshot':
+        """由已计算关键指标的MarketingDataAnalyzer生成快照，规则位图复用analyzer.alert_bits()"""
+        df = analyzer.metrics_data
+        rules, bits = analyzer.alert_bits()
+
+        encoded = df['ad_id'].str.encode('utf-8').to_numpy()
+        width = max(1, int(df['ad_id'].str.encode('utf-8').str.len().max())) if len(df) else 1
+        ad_id = np.asarray(encoded, dtype=f'S{width}')
+        order = np.argsort(ad_id, kind='stable')
+        ad_id = ad_id[order]
+        duplicated = ad_id[1:] == ad_id[:-1]
+        if duplicated.any():
+            examples = [value.decode('utf-8') for value in np.unique(ad_id[1:][duplicated])[:5]]
+            raise DuplicateAdIdError(f"{int(duplicated.sum())} 个ad_id重复 (如 {examples})，无法按广告建立快照")
+
+        codes, campaigns = pd.factorize(df['campaign'], sort=True)
+        code_dtype = np.int16 if len(campaigns) < np.iinfo(np.int16).max else np.int32
+        table = analyzer.campaign_table().reindex(campaigns)
+
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'source': analyzer.data_path,
+            'ads': len(df),
+        }
+        return cls(
+            ad_id=ad_id,
+            campaign_codes=codes.astype(code_dtype)[order],
+            campaigns=np.asarray(campaigns, dtype=str),
+            metrics=df[SNAPSHOT_METRICS].to_numpy(dtype='float32')[order],
+            bits=bits[order],
+            rule_names=np.asarray(rules.names, dtype=str),
+            rule_groups=np.asarray([rule.get('group', '') for rule in rules.rules], dtype=str),
+            campaign_sums=table[NUMERIC_COLUMNS].to_numpy(dtype='float64'),
+            campaign_ads=table['ad_count'].to_numpy(dtype='int64'),
+            meta=meta,
+        )
+
+    def save(self, path: str):
+        """写成未压缩的.npz (读取时按数组解析，不需要解压)"""
+        with open(path, 'wb') as f:
+            np.savez(f, ad_id=self.ad_id, campaign_codes=self.campaign_codes, campaigns=self.campaigns,
+                     metrics=self.metrics, bits=self.bits, rule_names=self.rule_names,
+                     rule_groups=self.rule_groups, campaign_sums=self.campaign_sums,
+                     campaign_ads=self.campaign_ads, meta=np.array(json.dumps(self.meta, ensure_ascii=False)))
+
+    def campaign_frame(self) -> pd.DataFrame:
+        """campaign汇总及由合计计算的比率指标"""
+        frame = pd.DataFrame(self.campaign_sums, columns=NUMERIC_COLUMNS, index=pd.Index(self.campaigns, name='campaign'))
+        frame['ad_count'] = self.campaign_ads
+        return compute_campaign_ratios(frame)
+
+    def rule_mask(self, name: str) -> np.ndarray:
+        """命中某条规则的广告 (快照中没有该规则时全为False)"""
+        names = self.rule_names.tolist()
+        if name not in names:
+            return np.zeros(len(self), dtype=bool)
+        return (self.bits & self.bits.dtype.type(1 << names.index(name))) != 0
+
+
+def save_snapshot(analyzer, path: str) -> ResultSnapshot:
+    snapshot = ResultSnapshot.from_analyzer(analyzer)
+    snapshot.save(path)
+    return snapshot
+
+
+def load_snapshot(path: str) -> ResultSnapshot:
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"快照格式版本不匹配: {path}")
+        arrays = {name: data[name] for name in data.files if name != 'meta'}
+    return ResultSnapshot(meta=meta, **arrays)
+
+
+def merge_join(left: np.ndarray, right: np.ndarray) -> tuple:
+    """
+    两个升序且无重复的键数组的归并连接，返回 (left中的位置, right中的位置)
+    拼接后做稳定排序: 输入是两段有序序列，timsort只做一次线性归并；
+    相邻且相等的两个键即一对匹配，稳定排序保证left的元素在前
+    """
+    keys = np.concatenate([left, right])
+    order = np.argsort(keys, kind='stable')
+    matched = keys[order[1:]] == keys[order[:-1]]
+    return order[:-1][matched], order[1:][matched] - len(left)
+
+
+class SnapshotDiff:
+    """
+    两个快照的比较结果
+    matched_old/matched_new为两边同一广告的位置，其余广告为新增或移除
+    """
+
+    def __init__(self, old: ResultSnapshot, new: ResultSnapshot, tolerance: float = DEFAULT_TOLERANCE):
+        self.old = old
+        self.new = new
+        self.tolerance = tolerance
+        self.matched_old, self.matched_new = merge_join(old.ad_id, new.ad_id)
+
+        self.removed = np.ones(len(old), dtype=bool)
+        self.removed[self.matched_old] = False
+        self.added = np.ones(len(new), dtype=bool)
+        self.added[self.matched_new] = False
+
+        # 指标变化: NaN -> NaN不算变化，NaN与数值之间算变化
+        before, after = old.metrics[self.matched_old], new.metrics[self.matched_new]
+        self.deltas = after - before
+        moved = np.abs(self.deltas) > tolerance
+        moved |= np.isnan(before) != np.isnan(after)
+        # campaign变化按名称比较 (两边的编码表可能不同)
+        old_names = pd.Index(old.campaigns).get_indexer(new.campaigns)
+        switched = old_names[new.campaign_codes[self.matched_new]] != old.campaign_codes[self.matched_old]
+        self.changed = moved.any(axis=1) | switched
+
+    def _ad_ids(self, snapshot: ResultSnapshot, positions: np.ndarray) -> List[str]:
+        return np.char.decode(snapshot.ad_id[positions], 'utf-8').tolist()
+
+    def changed_ads(self, rows: np.ndarray = None) -> pd.DataFrame:
+        """
+        指标或campaign有变化的广告: 新快照中的campaign、各指标的新值和变化量
+        rows为变化广告的下标 (matched数组中的位置)，默认全部
+        """
+        if rows is None:
+            rows = np.flatnonzero(self.changed)
+        old_pos, new_pos = self.matched_old[rows], self.matched_new[rows]
+        frame = pd.DataFrame({
+            'ad_id': np.char.decode(self.new.ad_id[new_pos], 'utf-8'),
+            'campaign': pd.Categorical.from_codes(self.new.campaign_codes[new_pos], categories=self.new.campaigns),
+        })
+        for i, metric in enumerate(SNAPSHOT_METRICS):
+            frame[metric] = self.new.metrics[new_pos, i].astype('float64').round(2)
+            frame[f'{metric}_delta'] = self.deltas[rows, i].astype('float64').round(2)
+        frame['previous_campaign'] = self.old.campaigns[self.old.campaign_codes[old_pos]]
+        return frame
+
+    def anomaly_changes(self, group: str = 'anomaly') -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        两次都存在的广告中，每条规则新命中 (new) 和不再命中 (resolved) 的位置 (新快照中的位置)
+        规则按名称对应；只存在于一边的规则不比较
+        """
+        old_rules = set(self.old.rule_names.tolist())
+        changes = {}
+        for name, rule_group in zip(self.new.rule_names.tolist(), self.new.rule_groups.tolist()):
+            if rule_group != group or name not in old_rules:
+                continue
+            before = self.old.rule_mask(name)[self.matched_old]
+            after = self.new.rule_mask(name)[self.matched_new]
+            changes[name] = {
+                'new': self.matched_new[after & ~before],
+                'resolved': self.matched_new[before & ~after],
+            }
+        return changes
+
+    def campaign_deltas(self) -> pd.DataFrame:
+        """两次都存在的campaign按合计计算的ROI/ROAS/花费/收入/广告数变化，按ROI变化幅度降序"""
+        old, new = self.old.campaign_frame(), self.new.campaign_frame()
+        common = new.index.intersection(old.index)
+        frame = pd.DataFrame({
+            'ROI_before': old.loc[common, 'ROI'],
+            'ROI': new.loc[common, 'ROI'],
+            'ROAS_before': old.loc[common, 'ROAS'],
+            'ROAS': new.loc[common, 'ROAS'],
+            'cost_delta': (new.loc[common, 'cost'] - old.loc[common, 'cost']).round(2),
+            'revenue_delta': (new.loc[common, 'revenue'] - old.loc[common, 'revenue']).round(2),
+            'ad_count_delta': new.loc[common, 'ad_count'] - old.loc[common, 'ad_count'],
+        })
+        frame.insert(2, 'ROI_delta', (frame['ROI'] - frame['ROI_before']).round(2))
+        return frame.iloc[np.argsort(-frame['ROI_delta'].abs().to_numpy(), kind='stable')].reset_index()
+
+    def summary(self, top_n: int = TOP_CHANGES) -> Dict:
+        """差异摘要: 广告数量变化、ROI变化最大的广告、各异常规则的新增/解除和campaign变化"""
+        changed_rows = np.flatnonzero(self.changed)
+        roi = SNAPSHOT_METRICS.index('ROI')
+        roi_moves = np.abs(self.deltas[changed_rows, roi]).astype('float64')
+        # 只为选中的广告构造明细，变化广告很多时也不生成整表
+        top = changed_rows[select_k(np.nan_to_num(roi_moves, nan=np.inf), top_n, largest=True)]
+        top_ads = self.changed_ads(top)[['ad_id', 'campaign', 'ROI', 'ROI_delta', 'ROAS', 'ROAS_delta', 'CTR_delta', 'CPA_delta']]
+
+        anomalies = {}
+        for name, change in self.anomaly_changes().items():
+            anomalies[name] = {
+                'new': len(change['new']),
+                'resolved': len(change['resolved']),
+                'new_ads': self._ad_ids(self.new, change['new'][:top_n]),
+                'resolved_ads': self._ad_ids(self.new, change['resolved'][:top_n]),
+            }
+
+        campaigns = self.campaign_deltas()
+        removed_campaigns = sorted(set(self.old.campaigns.tolist()) - set(self.new.campaigns.tolist()))
+        added_campaigns = sorted(set(self.new.campaigns.tolist()) - set(self.old.campaigns.tolist()))
+        return {
+            "before": self.old.meta,
+            "after": self.new.meta,
+            "ads": {
+                "before": len(self.old),
+                "after": len(self.new),
+                "added": int(self.added.sum()),
+                "removed": int(self.removed.sum()),
+                "changed": int(len(changed_rows)),
+                "added_ads": self._ad_ids(self.new, np.flatnonzero(self.added)[:top_n]),
+                "removed_ads": self._ad_ids(self.old, np.flatnonzero(self.removed)[:top_n]),
+            },
+            "top_roi_changes": top_ads.astype(object).where(top_ads.notna(), None).to_dict('records'),
+            "anomalies": anomalies,
+            "campaigns": campaigns.astype(object).where(campaigns.notna(), None).to_dict('records'),
+            "added_campaigns": added_campaigns,
+            "removed_campaigns": removed_campaigns,
+        }
+
+
+def diff_snapshots(old: ResultSnapshot, new: ResultSnapshot, tolerance: float = DEFAULT_TOLERANCE) -> SnapshotDiff:
+    return SnapshotDiff(old, new, tolerance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较两次分析的结果快照")
+    parser.add_argument('before', help="较早的快照 (.npz)")
+    parser.add_argument('after', help="较新的快照 (.npz)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="指标变化的忽略阈值")
+    parser.add_argument('--top', type=int, default=TOP_CHANGES, help="每类列出的广告数")
+    parser.add_argument('--output', help="差异摘要JSON输出路径")
+    args = parser.parse_args()
+
+    diff = diff_snapshots(load_snapshot(args.before), load_snapshot(args.after), args.tolerance)
+    summary = diff.summary(args.top)
+    if args.output:
+        export_results(summary, args.output)
+        print(f"📄 差异摘要已保存到: {args.output}")
+        return
+
+    ads = summary['ads']
+    print(f"广告: {ads['before']:,} -> {ads['after']:,} (新增 {ads['added']:,}, 移除 {ads['removed']:,}, 指标变化 {ads['changed']:,})")
+    for name, change in summary['anomalies'].items():
+        if change['new'] or change['resolved']:
+            print(f"🚨 {name}: 新增 {change['new']:,}, 解除 {change['resolved']:,}")
+    for row in summary['campaigns']:
+        print(f"📊 {row['campaign']}: ROI {row['ROI_before']}% -> {row['ROI']}% ({row['ROI_delta']:+})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多维汇总立方体 (rollup cube)
+对配置的维度组合预先汇总可加的计数列，比率指标 (CTR/ROI/ROAS/CPA等) 在查询时由单元格合计计算
+原始数据只扫描一次得到最细粒度的汇总，较粗的组合都从最细汇总再上卷，不再回到原始行
+每个组合 (cuboid) 保存维度编码 (按取值数选最窄的整数类型) 和一个合计矩阵
+"""
+
+import math
+from itertools import combinations
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from marketing_analysis import NUMERIC_COLUMNS, compute_campaign_ratios
+from marketing_schema import TIMESTAMP_COLUMN
+
+# 可加总的度量: 原始计数列 + 行数
+CUBE_MEASURES = NUMERIC_COLUMNS + ['ad_count']
+
+# 由timestamp派生的时间维度: 名称 -> 取整粒度
+TIME_DIMENSIONS = {'day': 'D', 'hour': 'h'}
+
+_CODE_DTYPES = [np.uint8, np.uint16, np.uint32, np.int64]
+
+
+def _code_dtype(cardinality: int):
+    return next(t for t in _CODE_DTYPES if cardinality <= np.iinfo(t).max)
+
+
+def _is_multi(selected) -> bool:
+    return isinstance(selected, (list, tuple, set, np.ndarray, pd.Index))
+
+
+def _dimension_values(frame: pd.DataFrame, dimension: str) -> pd.Series:
+    if dimension in TIME_DIMENSIONS and dimension not in frame:
+        return frame[TIMESTAMP_COLUMN].dt.floor(TIME_DIMENSIONS[dimension])
+    return frame[dimension]
+
+
+def _group(codes: List[np.ndarray], cardinalities: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按多列编码分组: 返回每行的组号和每组的代表行 (组按编码字典序排列)
+    编码组合能放进int64时合成单个键，一次哈希分组；否则逐列factorize后再合成
+    """
+    key = np.zeros(len(codes[0]) if codes else 0, dtype=np.int64)
+    capacity = 1
+    for column, cardinality in zip(codes, cardinalities):
+        if capacity * max(cardinality, 1) >= 2 ** 62:
+            # 组合数太大时先把已有的键压缩成连续编号
+            key, uniques = pd.factorize(key, sort=True)
+            key, capacity = key.astype(np.int64), max(len(uniques), 1)
+        key = key * max(cardinality, 1) + column
+        capacity *= max(cardinality, 1)
+    groups, uniques = pd.factorize(key, sort=True)
+    first = np.full(len(uniques), -1, dtype=np.int64)
+    # 每组的第一行 (倒序赋值，最终留下最小的行号)
+    first[groups[::-1]] = np.arange(len(groups) - 1, -1, -1)
+    return groups, first
+
+
+class Cuboid:
+    """一个维度组合的汇总: 每个单元格一行，codes[维度]为该维度的编码，sums为度量合计"""
+
+    def __init__(self, dimensions: Tuple[str, ...], codes: Dict[str, np.ndarray], sums: np.ndarray):
+        self.dimensions = dimensions
+        self.codes = codes
+        self.sums = sums
+        self._cells = None
+
+    def __len__(self) -> int:
+        return len(self.sums)
+
+    def cell_index(self) -> Dict[tuple, int]:
+        """编码元组 -> 行号，首次单元格查询时建立"""
+        if self._cells is None:
+            columns = [self.codes[d].tolist() for d in self.dimensions]
+            self._cells = {key: row for row, key in enumerate(zip(*columns))}
+        return self._cells
+
+    @property
+    def nbytes(self) -> int:
+        return self.sums.nbytes + sum(codes.nbytes for codes in self.codes.values())
+
+
+class RollupCube:
+    """
+    dimensions中每个维度可以是数据中的列，或由timestamp派生的day/hour
+    groupings为需要预先汇总的维度组合，默认是dimensions的全部子集 (含空组合，即总计)；
+    查询时选能覆盖所需维度、单元格最少的组合，必要时在该组合上再上卷
+    """
+
+    def __init__(self, dimensions: Sequence[str], groupings: Sequence[Sequence[str]] = None):
+        self.dimensions = tuple(dimensions)
+        if groupings is None:
+            groupings = [c for size in range(len(self.dimensions) + 1)
+                         for c in combinations(self.dimensions, size)]
+        unknown = {d for grouping in groupings for d in grouping} - set(self.dimensions)
+        if unknown:
+            raise ValueError(f"组合中包含未声明的维度: {sorted(unknown)}")
+        # 组合内的维度统一按dimensions中的顺序排列
+        self.groupings = sorted({tuple(d for d in self.dimensions if d in grouping) for grouping in groupings},
+                                key=len)
+        self.values: Dict[str, pd.Index] = {}
+        # 原始数据中为整数类型的度量，查询结果保持整数
+        self.integer_measures = ['ad_count']
+        self.cuboids: Dict[Tuple[str, ...], Cuboid] = {}
+        self._lookups = {}
+
+    def build(self, frame: pd.DataFrame) -> 'RollupCube':
+        """扫描一次原始数据得到最细粒度汇总，其余组合由它上卷"""
+        codes = {}
+        for dimension in self.dimensions:
+            values = _dimension_values(frame, dimension)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # categorical直接用已有编码，只保留实际出现的取值
+                values = values.cat.remove_unused_categories()
+                column_codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+                if (column_codes < 0).any():
+                    column_codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=False)
+            else:
+                column_codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=False)
+            self.values[dimension] = pd.Index(uniques, name=dimension)
+            self._lookups.pop(dimension, None)
+            codes[dimension] = column_codes.astype(_code_dtype(len(uniques)))
+
+        self.integer_measures = [c for c in NUMERIC_COLUMNS if pd.api.types.is_integer_dtype(frame[c])] + ['ad_count']
+        # 与groupby().sum()一致，缺失值按0累加
+        measures = np.column_stack([np.nan_to_num(frame[NUMERIC_COLUMNS].to_numpy(dtype='float64')),
+                                    np.ones(len(frame))])
+        finest = self._rollup(self.dimensions, codes, measures)
+        self.cuboids = {grouping: self._rollup(grouping, finest.codes, finest.sums)
+                        for grouping in self.groupings if grouping != self.dimensions}
+        if self.dimensions in self.groupings:
+            self.cuboids[self.dimensions] = finest
+        return self
+
+    def _rollup(self, dimensions: Tuple[str, ...], codes: Dict[str, np.ndarray], sums: np.ndarray) -> Cuboid:
+        if not dimensions:
+            return Cuboid((), {}, sums.sum(axis=0, keepdims=True))
+        groups, first = _group([codes[d] for d in dimensions], [len(self.values[d]) for d in dimensions])
+        rolled = np.zeros((len(first), sums.shape[1]))
+        for j in range(sums.shape[1]):
+            rolled[:, j] = np.bincount(groups, sums[:, j], len(first))
+        return Cuboid(dimensions, {d: codes[d][first] for d in dimensions}, rolled)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(cuboid.nbytes for cuboid in self.cuboids.values())
+
+    def _covering(self, needed: set) -> Cuboid:
+        """包含所需全部维度且单元格最少的组合"""
+        candidates = [c for grouping, c in self.cuboids.items() if needed <= set(grouping)]
+        if not candidates:
+            raise KeyError(f"没有预先汇总包含 {sorted(needed)} 的维度组合")
+        return min(candidates, key=len)
+
+    def _codes_for(self, dimension: str, selected) -> np.ndarray:
+        """过滤条件 (单个取值或取值列表) 对应的编码，不存在的取值忽略"""
+        values = list(selected) if _is_multi(selected) else [selected]
+        if dimension in TIME_DIMENSIONS:
+            values = [pd.Timestamp(value) for value in values]
+        positions = self.values[dimension].get_indexer(values)
+        return positions[positions >= 0]
+
+    def query(self, by: Sequence[str] = (), where: Dict = None) -> pd.DataFrame:
+        """
+        按by分组、where过滤 ({维度: 取值或取值列表}) 的合计和比率指标
+        by为空时返回一行总计；结果按by各维度的取值排序
+        """
+        by, where = tuple(by), where or {}
+        unknown = (set(by) | set(where)) - set(self.dimensions)
+        if unknown:
+            raise KeyError(f"未知维度: {sorted(unknown)}")
+        cuboid = self._covering(set(by) | set(where))
+
+        mask = np.ones(len(cuboid), dtype=bool)
+        for dimension, selected in where.items():
+            mask &= np.isin(cuboid.codes[dimension], self._codes_for(dimension, selected))
+        sums, codes = cuboid.sums[mask], {d: cuboid.codes[d][mask] for d in by}
+        if by != cuboid.dimensions or where:
+            rolled = self._rollup(by, codes, sums)
+            sums, codes = rolled.sums, rolled.codes
+
+        frame = pd.DataFrame({d: self.values[d].take(codes[d]) for d in by})
+        for j, measure in enumerate(CUBE_MEASURES):
+            frame[measure] = sums[:, j]
+        for measure in self.integer_measures:
+            frame[measure] = frame[measure].round().astype('int64')
+        frame[['cost', 'revenue']] = frame[['cost', 'revenue']].round(2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return compute_campaign_ratios(frame)
+
+    def drill_down(self, dimension: str, where: Dict = None) -> pd.DataFrame:
+        """在where确定的切片内按dimension展开一层，例如 where={'campaign': 'x'} 展开到day"""
+        where = where or {}
+        return self.query([d for d in where if d != dimension] + [dimension], where)
+
+    def cell(self, **coordinates) -> Dict[str, float]:
+        """
+        单个单元格的合计和比率，如 cell(campaign='x', day='2024-01-01')
+        维度组合已预先汇总时只做两次字典查找；不存在的单元格返回全0合计
+        """
+        grouping = tuple(d for d in self.dimensions if d in coordinates)
+        if len(grouping) != len(coordinates):
+            raise KeyError(f"未知维度: {sorted(set(coordinates) - set(self.dimensions))}")
+        cuboid = self.cuboids.get(grouping)
+        if cuboid is None:
+            rolled = self.query((), {d: [v] for d, v in coordinates.items()})
+            return cell_metrics(rolled[CUBE_MEASURES].to_numpy()[0].tolist())
+
+        key = []
+        for dimension in grouping:
+            value = coordinates[dimension]
+            if dimension in TIME_DIMENSIONS and not isinstance(value, pd.Timestamp):
+                value = pd.Timestamp(value)
+            key.append(self._value_codes(dimension).get(value, -1))
+        row = cuboid.cell_index().get(tuple(key))
+        return cell_metrics(cuboid.sums[row].tolist() if row is not None else [0.0] * len(CUBE_MEASURES))
+
+    def _value_codes(self, dimension: str) -> Dict:
+        """维度取值 -> 编码的字典，首次单元格查询时建立"""
+        if dimension not in self._lookups:
+            self._lookups[dimension] = {value: code for code, value in enumerate(self.values[dimension])}
+        return self._lookups[dimension]
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    """与numpy的浮点除法一致: x/0为±inf，0/0为nan"""
+    if denominator == 0:
+        return math.nan if numerator == 0 else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+def _round2(value: float) -> float:
+    """与numpy.round(value, 2)一致: rint(x·100)/100"""
+    return float(round(value * 100)) / 100 if math.isfinite(value) else value
+
+
+def cell_metrics(sums: List[float]) -> Dict[str, float]:
+    """单元格合计 -> 与compute_campaign_ratios相同公式的比率 (纯Python标量运算，不构造DataFrame)"""
+    impressions, clicks, conversions, cost, revenue, ad_count = sums
+    # 与query一致，比率由保留两位小数后的金额合计计算
+    cost, revenue = _round2(cost), _round2(revenue)
+    metrics = {'impressions': int(impressions), 'clicks': int(clicks), 'conversions': int(conversions),
+               'cost': cost, 'revenue': revenue, 'ad_count': int(ad_count)}
+    ratios = {
+        'CTR': _ratio(clicks, impressions) * 100,
+        'conversion_rate': _ratio(conversions, clicks) * 100,
+        'ROI': _ratio(revenue - cost, cost) * 100,
+        'ROAS': _ratio(revenue, cost),
+        'CPC': _ratio(cost, clicks),
+        'CPA': _ratio(cost, conversions),
+    }
+    metrics.update({name: _round2(value) for name, value in ratios.items()})
+    return metrics
+
+
+def default_dimensions(frame: pd.DataFrame) -> List[str]:
+    """默认维度: campaign，有事件时间时再加day"""
+    return ['campaign'] + (['day'] if TIMESTAMP_COLUMN in frame else [])
+
+
+def build_cube(frame: pd.DataFrame, dimensions: Sequence[str] = None,
+               groupings: Sequence[Sequence[str]] = None) -> RollupCube:
+    return RollupCube(dimensions or default_dimensions(frame), groupings).build(frame)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表现评分与Top-K选择
+直接在列的numpy数组上计算百分位排名和加权得分，不复制DataFrame；
+最差/最佳N个用argpartition选取，按campaign分组的Top-K只做一次排序
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+def percentile_rank(values: np.ndarray) -> np.ndarray:
+    """
+    与Series.rank(pct=True)一致的百分位排名: 并列取平均名次，NaN保持NaN
+    np.unique一次排序得到每个取值的名次区间
+    """
+    values = np.asarray(values, dtype='float64')
+    ranks = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    n_valid = int(valid.sum())
+    if n_valid == 0:
+        return ranks
+
+    unique_values, inverse, counts = np.unique(values[valid], return_inverse=True, return_counts=True)
+    # 每个取值占据名次 (累计数-个数+1) 到 累计数，平均名次取中点
+    upper = np.cumsum(counts)
+    average_rank = upper - (counts - 1) / 2.0
+    ranks[valid] = average_rank[inverse] / n_valid
+    return ranks
+
+
+def weighted_rank_score(frame: pd.DataFrame, weights: Dict[str, float]) -> np.ndarray:
+    """按权重合成各列百分位排名，返回与frame行顺序一致的数组"""
+    score = np.zeros(len(frame))
+    for column, weight in weights.items():
+        score += percentile_rank(frame[column].to_numpy(dtype='float64')) * weight
+    return score
+
+
+def select_k(scores: np.ndarray, k: int, largest: bool = False) -> np.ndarray:
+    """
+    返回得分最小 (largest=True时最大) 的k个位置，按得分排序
+    与nsmallest/nlargest一致: 同分按原始顺序，NaN不参与
+    """
+    scores = np.asarray(scores, dtype='float64')
+    if largest:
+        scores = -scores
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if k <= 0 or len(candidates) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(candidates):
+        # O(n)找出第k小的值，再把所有不超过它的候选做稳定排序，保证同分顺序稳定
+        kth = np.partition(scores[candidates], k - 1)[k - 1]
+        candidates = candidates[scores[candidates] <= kth]
+    order = np.argsort(scores[candidates], kind='stable')
+    return candidates[order][:k]
+
+
+def grouped_select_k(scores: np.ndarray, groups, k: int,
+                     largest: bool = False) -> np.ndarray:
+    """
+    每组得分最小 (largest=True时最大) 的k个位置
+    整体排序一次后取每组前k个；结果按组、得分排列
+    """
+    scores = np.asarray(scores, dtype='float64')
+    if largest:
+        scores = -scores
+    codes, _ = pd.factorize(groups, sort=True)
+
+    valid = np.flatnonzero(~np.isnan(scores) & (codes >= 0))
+    if k <= 0 or len(valid) == 0:
+        return np.array([], dtype=np.int64)
+    # 先按得分稳定排序，再按组号稳定排序 (窄整数组号走基数排序)，等价于按 (组, 得分, 位置) 排序
+    order = valid[np.argsort(scores[valid], kind='stable')]
+    group_codes = codes[order].astype(np.min_scalar_type(codes.max()))
+    order = order[np.argsort(group_codes, kind='stable')]
+
+    sorted_codes = codes[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    position_in_group = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+    return order[position_in_group < k]
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比率指标的批量显著性检验
+CTR (点击/展示) 和转化率 (转化/点击) 都是二项比例，对所有比较一次性做数组运算:
+- 双比例z检验 (合并方差)，双侧p值
+- Beta-二项后验的胜出概率 P(p_B > p_A)，先验Beta(1, 1)，后验差按正态近似
+- 多重比较校正: Holm (控制FWER) 和 Benjamini-Hochberg (控制FDR)
+两种比较方式: 每个广告对同campaign其余广告 (留一基线)，以及一组对象 (campaign或变体) 两两比较
+正态分布尾概率用erfc的Chebyshev近似 (相对误差<1.2e-7)，不依赖scipy
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# 比率指标 -> (成功数列, 试验数列)
+PROPORTION_METRICS = {
+    'CTR': ('clicks', 'impressions'),
+    'conversion_rate': ('conversions', 'clicks'),
+}
+
+# 默认显著性水平
+DEFAULT_ALPHA = 0.05
+
+# dashboard中每个指标列出的显著广告/campaign对数
+TOP_SIGNIFICANT = 10
+
+_ERFC_COEFFICIENTS = [0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807,
+                      -0.18628806, 0.09678418, 0.37409196, 1.00002368, -1.26551223]
+
+
+def erfc(x: np.ndarray) -> np.ndarray:
+    """互补误差函数 (Numerical Recipes erfcc)，尾部也保持相对精度"""
+    x = np.asarray(x, dtype='float64')
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    poly = np.zeros_like(t)
+    for coefficient in _ERFC_COEFFICIENTS:
+        poly = poly * t + coefficient
+    with np.errstate(over='ignore', under='ignore'):
+        result = t * np.exp(-z * z + poly)
+    return np.where(x >= 0, result, 2.0 - result)
+
+
+def normal_cdf(z: np.ndarray) -> np.ndarray:
+    return 0.5 * erfc(-np.asarray(z, dtype='float64') / np.sqrt(2.0))
+
+
+def two_proportion_ztest(x1, n1, x2, n2):
+    """
+    H0: p1 == p2 的双比例z检验，返回 (z, 双侧p值)；z > 0 表示第二组比例更高
+    试验数为0或两组比例都是0/1 (方差为0) 时z为NaN
+    """
+    x1, n1, x2, n2 = (np.asarray(v, dtype='float64') for v in (x1, n1, x2, n2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled = (x1 + x2) / (n1 + n2)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+        z = (x2 / n2 - x1 / n1) / se
+    z = np.where(np.isfinite(z), z, np.nan)
+    return z, erfc(np.abs(z) / np.sqrt(2.0))
+
+
+def beta_win_probability(x1, n1, x2, n2, prior: float = 1.0) -> np.ndarray:
+    """
+    Beta(prior + x, prior + n - x) 后验下 P(p2 > p1)
+    两个后验的差按均值和方差做正态近似，计数较大时与精确积分的差异可以忽略
+    """
+    x1, n1, x2, n2 = (np.asarray(v, dtype='float64') for v in (x1, n1, x2, n2))
+    a1, b1 = prior + x1, prior + n1 - x1
+    a2, b2 = prior + x2, prior + n2 - x2
+    mean1, mean2 = a1 / (a1 + b1), a2 / (a2 + b2)
+    var1 = a1 * b1 / ((a1 + b1) ** 2 * (a1 + b1 + 1))
+    var2 = a2 * b2 / ((a2 + b2) ** 2 * (a2 + b2 + 1))
+    return normal_cdf((mean2 - mean1) / np.sqrt(var1 + var2))
+
+
+def _win_probability(x1, n1, x2, n2) -> np.ndarray:
+    """beta_win_probability，任一方试验数为0时为NaN (否则只反映先验，不是数据给出的结论)"""
+    n1, n2 = np.asarray(n1, dtype='float64'), np.asarray(n2, dtype='float64')
+    return np.where((n1 > 0) & (n2 > 0), beta_win_probability(x1, n1, x2, n2), np.nan)
+
+
+def holm_adjust(p_values: np.ndarray) -> np.ndarray:
+    """Holm逐步校正后的p值，NaN不计入检验数且保持NaN"""
+    p_values = np.asarray(p_values, dtype='float64')
+    adjusted = np.full(len(p_values), np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    m = len(valid)
+    if m == 0:
+        return adjusted
+    # 相同p值校正后也相同，与并列的先后顺序无关，不需要稳定排序
+    order = valid[np.argsort(p_values[valid])]
+    scaled = np.minimum(1.0, (m - np.arange(m)) * p_values[order])
+    adjusted[order] = np.maximum.accumulate(scaled)
+    return adjusted
+
+
+def bh_adjust(p_values: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg校正后的p值 (q值)，NaN不计入检验数且保持NaN"""
+    p_values = np.asarray(p_values, dtype='float64')
+    adjusted = np.full(len(p_values), np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    m = len(valid)
+    if m == 0:
+        return adjusted
+    order = valid[np.argsort(p_values[valid])]
+    scaled = p_values[order] * m / np.arange(1, m + 1)
+    adjusted[order] = np.minimum(1.0, np.minimum.accumulate(scaled[::-1])[::-1])
+    return adjusted
+
+
+def _counts(frame: pd.DataFrame, metric: str):
+    """成功数截断到 [0, 试验数]，避免数据逻辑错误 (点击数超过展示数) 产生负方差"""
+    success_col, trial_col = PROPORTION_METRICS[metric]
+    trials = np.maximum(frame[trial_col].to_numpy(dtype='float64'), 0)
+    successes = np.clip(frame[success_col].to_numpy(dtype='float64'), 0, trials)
+    return successes, trials
+
+
+def compare_to_baseline(frame: pd.DataFrame, metric: str, group: str = 'campaign') -> pd.DataFrame:
+    """
+    每行对同组其余行合计 (留一基线) 的检验，与frame同索引
+    列: baseline (其余行的比例)、z、p_value、q_value (组内外全部行一起做BH校正)、
+    win_prob (该行比例高于基线的后验概率；该行或基线试验数为0时为NaN，例如campaign只有一个广告)
+    """
+    successes, trials = _counts(frame, metric)
+    codes, _ = pd.factorize(frame[group], use_na_sentinel=False)
+    group_successes = np.bincount(codes, successes)[codes]
+    group_trials = np.bincount(codes, trials)[codes]
+    rest_successes, rest_trials = group_successes - successes, group_trials - trials
+
+    z, p_value = two_proportion_ztest(rest_successes, rest_trials, successes, trials)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseline = rest_successes / rest_trials
+    return pd.DataFrame({
+        'baseline': baseline,
+        'z': z,
+        'p_value': p_value,
+        'q_value': bh_adjust(p_value),
+        'win_prob': _win_probability(rest_successes, rest_trials, successes, trials),
+    }, index=frame.index)
+
+
+def pairwise_comparisons(frame: pd.DataFrame, metric: str, label: str) -> pd.DataFrame:
+    """
+    frame中所有行两两比较 (每行是一个campaign或变体的合计)，一次生成全部 n(n-1)/2 对
+    列: a, b, rate_a, rate_b, z (b相对a)、p_value、p_holm、q_value、win_prob (b优于a的后验概率，任一方试验数为0时为NaN)
+    """
+    successes, trials = _counts(frame, metric)
+    first, second = np.triu_indices(len(frame), k=1)
+    labels = frame[label].to_numpy()
+    z, p_value = two_proportion_ztest(successes[first], trials[first], successes[second], trials[second])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = successes / trials
+    return pd.DataFrame({
+        'a': labels[first],
+        'b': labels[second],
+        'rate_a': rates[first],
+        'rate_b': rates[second],
+        'z': z,
+        'p_value': p_value,
+        'p_holm': holm_adjust(p_value),
+        'q_value': bh_adjust(p_value),
+        'win_prob': _win_probability(successes[first], trials[first], successes[second], trials[second]),
+    })
+
+
+def add_significance_columns(metrics_data: pd.DataFrame, group: str = 'campaign') -> pd.DataFrame:
+    """
+    在metrics_data上原地追加每个广告相对campaign基线的检验结果 (float32):
+    <指标>_z、<指标>_q_value、<指标>_win_prob，指标为CTR和conversion_rate
+    """
+    for metric in PROPORTION_METRICS:
+        result = compare_to_baseline(metrics_data, metric, group)
+        for col in ['z', 'q_value', 'win_prob']:
+            metrics_data[f'{metric}_{col}'] = result[col].to_numpy(dtype='float32')
+    return metrics_data
+
+
+def _records(frame: pd.DataFrame) -> list:
+    # float32列先转为float64再取整，避免JSON中出现float32的尾数
+    frame = frame.astype({col: 'float64' for col in frame.columns if frame[col].dtype == np.float32}).round(4)
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def significance_summary(metrics_data: pd.DataFrame, campaign_sums: pd.DataFrame,
+                         alpha: float = DEFAULT_ALPHA, top_n: int = TOP_SIGNIFICANT) -> Dict:
+    """
+    dashboard摘要: 每个指标中显著高于/低于campaign基线的广告 (BH校正)，
+    以及campaign两两比较中显著的差异 (Holm校正)，按|z|取前top_n
+    metrics_data需已有add_significance_columns的列，campaign_sums为campaign计数列合计 (campaign为索引)
+    """
+    campaigns = campaign_sums.reset_index()
+    summary = {"alpha": alpha, "ads_vs_campaign": {}, "campaign_pairs": {}}
+    for metric in PROPORTION_METRICS:
+        z = metrics_data[f'{metric}_z'].to_numpy(dtype='float64')
+        significant = metrics_data[f'{metric}_q_value'].to_numpy() < alpha
+        columns = ['ad_id', 'campaign', metric, f'{metric}_z', f'{metric}_q_value', f'{metric}_win_prob']
+        better = np.flatnonzero(significant & (z > 0))
+        worse = np.flatnonzero(significant & (z < 0))
+        summary["ads_vs_campaign"][metric] = {
+            "tested": int(np.isfinite(z).sum()),
+            "significantly_better": len(better),
+            "significantly_worse": len(worse),
+            "top_better": _records(metrics_data.iloc[better[np.argsort(-z[better], kind='stable')[:top_n]]][columns]),
+            "top_worse": _records(metrics_data.iloc[worse[np.argsort(z[worse], kind='stable')[:top_n]]][columns]),
+        }
+
+        pairs = pairwise_comparisons(campaigns, metric, 'campaign')
+        pairs = pairs[pairs['p_holm'] < alpha]
+        pairs = pairs.iloc[np.argsort(-pairs['z'].abs().to_numpy(), kind='stable')[:top_n]]
+        summary["campaign_pairs"][metric] = _records(pairs)
+    return summary
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成广告数据生成器
+生成与marketing_data.csv同schema的数据 (ad_id,campaign,impressions,clicks,conversions,cost,revenue)，
+规模从1万到1亿行，分块写出，内存占用与行数无关；
+指定days时追加按时间递增的timestamp列，供时间窗口指标使用
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# 每次生成并写出的行数
+CHUNK_ROWS = 1_000_000
+
+# 带timestamp时的起始时间
+START_TIME = pd.Timestamp('2024-01-01')
+
+
+def _campaign_profiles(rng: np.random.Generator, campaigns: int) -> pd.DataFrame:
+    """每个campaign的基准CTR、转化率、CPC和客单价，广告在此基础上波动"""
+    return pd.DataFrame({
+        'name': [f"campaign_{i:05d}" for i in range(campaigns)],
+        'ctr': rng.beta(2, 60, campaigns),
+        'cvr': rng.beta(2, 40, campaigns),
+        'cpc': rng.lognormal(np.log(3.0), 0.4, campaigns),
+        'order_value': rng.lognormal(np.log(120.0), 0.6, campaigns),
+    })
+
+
+def generate_chunk(rng: np.random.Generator, profiles: pd.DataFrame, start_id: int, rows: int,
+                   zero_click_rate: float = 0.05, zero_conversion_rate: float = 0.2,
+                   id_width: int = 9) -> pd.DataFrame:
+    """生成一块合成数据，ad_id从start_id开始连续编号"""
+    campaign_idx = rng.integers(0, len(profiles), rows)
+    ctr = profiles['ctr'].to_numpy()[campaign_idx] * rng.lognormal(0, 0.5, rows)
+    cvr = profiles['cvr'].to_numpy()[campaign_idx] * rng.lognormal(0, 0.5, rows)
+    cpc = profiles['cpc'].to_numpy()[campaign_idx] * rng.lognormal(0, 0.3, rows)
+    order_value = profiles['order_value'].to_numpy()[campaign_idx]
+
+    impressions = np.maximum(rng.lognormal(np.log(8000), 1.0, rows).astype(np.int64), 1)
+    clicks = rng.binomial(impressions, np.clip(ctr, 0, 1))
+    clicks[rng.random(rows) < zero_click_rate] = 0
+    conversions = rng.binomial(clicks, np.clip(cvr, 0, 1))
+    conversions[rng.random(rows) < zero_conversion_rate] = 0
+
+    # 没有点击的广告仍按展示计费一小部分，保证cost>0
+    cost = np.round(np.where(clicks > 0, clicks * cpc, impressions * 0.001 * cpc), 2)
+    revenue = np.round(conversions * order_value * rng.lognormal(0, 0.3, rows), 2)
+
+    ad_ids = np.char.zfill(np.arange(start_id, start_id + rows).astype(str), id_width)
+    return pd.DataFrame({
+        'ad_id': ad_ids,
+        'campaign': profiles['name'].to_numpy()[campaign_idx],
+        'impressions': impressions,
+        'clicks': clicks,
+        'conversions': conversions,
+        'cost': cost,
+        'revenue': revenue,
+    })
+
+
+def generate_marketing_csv(output_path: str, rows: int, campaigns: int = 50,
+                           zero_click_rate: float = 0.05, zero_conversion_rate: float = 0.2,
+                           seed: int = 42, days: int = 0) -> str:
+    """分块生成合成数据CSV，返回输出路径；days>0时事件时间均匀分布在START_TIME起的days天内"""
+    rng = np.random.default_rng(seed)
+    profiles = _campaign_profiles(rng, campaigns)
+    id_width = max(3, len(str(rows)))
+
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = generate_chunk(rng, profiles, start + 1, min(CHUNK_ROWS, rows - start),
+                               zero_click_rate, zero_conversion_rate, id_width)
+        if days > 0:
+            # 行号加随机偏移后映射到时间轴，整个文件按时间递增
+            position = (start + np.arange(len(chunk)) + rng.random(len(chunk))) / rows
+            chunk['timestamp'] = (START_TIME + pd.to_timedelta(position * days, unit='D')).floor('s')
+        chunk.to_csv(output_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成广告数据")
+    parser.add_argument('output', help="输出CSV路径")
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--campaigns', type=int, default=50)
+    parser.add_argument('--zero-click-rate', type=float, default=0.05)
+    parser.add_argument('--zero-conversion-rate', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=0, help="大于0时生成跨越这么多天的timestamp列")
+    args = parser.parse_args()
+
+    generate_marketing_csv(args.output, args.rows, args.campaigns,
+                           args.zero_click_rate, args.zero_conversion_rate, args.seed, args.days)
+    print(f"✅ 已生成 {args.rows:,} 行合成数据: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
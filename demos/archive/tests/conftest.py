@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置: 归档脚本按顶层模块互相导入，这里把归档目录加入导入路径"""
+
+import os
+import sys
+
+import pytest
+
+ARCHIVE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ARCHIVE_DIR not in sys.path:
+    sys.path.insert(0, ARCHIVE_DIR)
+
+SAMPLE_CSV = os.path.join(ARCHIVE_DIR, 'marketing_data.csv')
+
+
+@pytest.fixture
+def timed_csv(tmp_path):
+    """带timestamp列、跨越3天的合成数据"""
+    from synthetic_data import generate_marketing_csv
+    return generate_marketing_csv(str(tmp_path / 'timed.csv'), 600, campaigns=5, seed=7, days=3)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""ad_analysis的返回形状和告警位图，以及detect_anomalies输出的阈值"""
+
+import numpy as np
+
+from ad_analysis import analyze_ad_performance, print_report
+from alert_rules import load_alert_rules
+from conftest import SAMPLE_CSV
+from marketing_analysis import MarketingDataAnalyzer
+from reporting import Reporter
+
+
+def test_analyze_ad_performance_returns_three_items():
+    df, worst_ads, campaign_stats = analyze_ad_performance(SAMPLE_CSV, Reporter())
+    assert len(worst_ads) == 3
+    assert len(campaign_stats) == df['campaign'].nunique()
+    assert len(print_report(SAMPLE_CSV, Reporter())) == 3
+
+
+def test_return_alerts_exposes_rule_bits():
+    df, _, _, (rules, bits) = analyze_ad_performance(SAMPLE_CSV, Reporter(), return_alerts=True)
+    np.testing.assert_array_equal(bits, load_alert_rules().evaluate(df, ['ad_analysis']))
+    np.testing.assert_array_equal(rules.mask(bits, 'negative_roi'), (df['ROI'] < 0).to_numpy())
+
+
+def test_anomaly_thresholds_keep_normal_ranges():
+    analyzer = MarketingDataAnalyzer(SAMPLE_CSV, reporter=Reporter())
+    analyzer.calculate_key_metrics()
+    assert analyzer.detect_anomalies()['thresholds'] == {
+        'CTR': {'low': 2.0, 'high': 15.0, 'name': '点击率'},
+        'conversion_rate': {'low': 1.0, 'high': 10.0, 'name': '转化率'},
+        'ROI': {'low': 50.0, 'high': float('inf'), 'name': 'ROI'},
+        'ROAS': {'low': 2.0, 'high': float('inf'), 'name': 'ROAS'},
+        'CPC': {'low': 0, 'high': 5.0, 'name': '每次点击成本'},
+        'CPA': {'low': 0, 'high': 100.0, 'name': '每次获客成本'},
+    }
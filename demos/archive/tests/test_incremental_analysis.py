@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""增量分析: 分批追加 (含各步骤中断) 后的结果与全量重算一致"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import incremental_analysis
+from incremental_analysis import STATE_FILE, IncrementalAnalyzer
+from marketing_analysis import CampaignAccumulator, MarketingDataAnalyzer
+from reporting import Reporter
+from synthetic_data import generate_marketing_csv
+
+ROWS = 700
+FIRST_BATCH = 300
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """完整数据和只写了前FIRST_BATCH行的追加数据源；分片上限调小以便触发合并"""
+    monkeypatch.setattr(incremental_analysis, 'MAX_SUMMARY_PARTS', 4)
+    full_path = generate_marketing_csv(str(tmp_path / 'full.csv'), ROWS, campaigns=6, seed=3)
+    with open(full_path, encoding='utf-8') as f:
+        lines = f.readlines()
+    data_path = tmp_path / 'data.csv'
+    data_path.write_text(''.join(lines[:FIRST_BATCH + 1]), encoding='utf-8')
+    return full_path, str(data_path), lines[FIRST_BATCH + 1:]
+
+
+def _analyzer(data_path, state_dir):
+    return IncrementalAnalyzer(data_path, state_dir, chunksize=50, reporter=Reporter())
+
+
+def _assert_matches_full(incremental, full_path):
+    expected = MarketingDataAnalyzer(full_path, reporter=Reporter()).run_complete_analysis()['dashboard_data']
+    actual = incremental.dashboard_data()
+
+    assert incremental.accumulator.total_records == ROWS
+    assert actual['overall_metrics'] == pytest.approx(expected['overall_metrics'])
+    assert actual['campaign_summary'] == expected['campaign_summary']
+    pd.testing.assert_frame_equal(actual['ad_level_metrics'], expected['ad_level_metrics'],
+                                  check_dtype=False, check_categorical=False)
+    assert set(actual) == set(expected)
+    for key in ['anomaly_alerts', 'worst_performers', 'optimization_flags', 'budget_plan', 'significance']:
+        assert actual[key] == expected[key], key
+    assert (actual['alert_bits']['bits'] == expected['alert_bits']['bits']).all()
+
+    # 磁盘上只剩状态文件和清单中的分片
+    files = set(os.listdir(incremental.state_dir))
+    assert files == {STATE_FILE, *incremental.state['parts']}
+
+
+def _fail_after(monkeypatch, owner, name, calls=1):
+    """owner.name第calls次调用正常完成后抛出Interrupted，模拟进程在这一步之后退出"""
+    original = getattr(owner, name)
+    count = {'n': 0}
+
+    def wrapper(*args, **kwargs):
+        result = original(*args, **kwargs)
+        count['n'] += 1
+        if count['n'] == calls:
+            raise Interrupted(name)
+        return result
+
+    monkeypatch.setattr(owner, name, wrapper)
+
+
+def test_appended_batches_match_full_recompute(source, tmp_path):
+    full_path, data_path, rest = source
+    incremental = _analyzer(data_path, str(tmp_path / 'state'))
+    assert incremental.update() == FIRST_BATCH
+    assert incremental.update() == 0
+
+    with open(data_path, 'a', encoding='utf-8') as f:
+        f.writelines(rest)
+    assert _analyzer(data_path, str(tmp_path / 'state')).update() == ROWS - FIRST_BATCH
+
+    _assert_matches_full(_analyzer(data_path, str(tmp_path / 'state')), full_path)
+
+
+def test_partial_last_line_is_left_for_next_update(source, tmp_path):
+    full_path, data_path, rest = source
+    incremental = _analyzer(data_path, str(tmp_path / 'state'))
+    incremental.update()
+
+    with open(data_path, 'a', encoding='utf-8') as f:
+        f.writelines(rest[:-1])
+        f.write(rest[-1][:5])
+    assert incremental.update() == ROWS - FIRST_BATCH - 1
+    with open(data_path, 'a', encoding='utf-8') as f:
+        f.write(rest[-1][5:])
+    assert incremental.update() == 1
+
+    _assert_matches_full(incremental, full_path)
+
+
+@pytest.mark.parametrize('owner, name, calls', [
+    (CampaignAccumulator, 'update', 3),
+    (IncrementalAnalyzer, '_append_summary', 2),
+    (IncrementalAnalyzer, '_compact_summary', 1),
+    (incremental_analysis.pickle, 'dump', 1),
+    (incremental_analysis.os, 'replace', 1),
+    (IncrementalAnalyzer, '_remove_stale_files', 1),
+])
+@pytest.mark.parametrize('restart', [False, True])
+def test_interrupted_update_recovers(source, tmp_path, monkeypatch, owner, name, calls, restart):
+    full_path, data_path, rest = source
+    state_dir = str(tmp_path / 'state')
+    _analyzer(data_path, state_dir).update()
+
+    with open(data_path, 'a', encoding='utf-8') as f:
+        f.writelines(rest)
+    incremental = _analyzer(data_path, state_dir)
+    with monkeypatch.context() as patch:
+        _fail_after(patch, owner, name, calls)
+        with pytest.raises(Interrupted):
+            incremental.update()
+
+    # restart为True时模拟进程退出后重新启动，否则在同一个实例上重试
+    if restart:
+        incremental = _analyzer(data_path, state_dir)
+    incremental.update()
+    _assert_matches_full(incremental, full_path)
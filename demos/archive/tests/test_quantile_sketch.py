@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""KLL草图: 排名误差不超过rank_error、合并、均值与pandas一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ad_analysis import analyze_ad_performance, sketch_ad_metrics
+from conftest import SAMPLE_CSV
+from quantile_sketch import PERCENT, RATIO, KLLSketch, MetricSketches
+from reporting import Reporter
+
+QUANTILES = np.linspace(0.01, 0.99, 99)
+
+
+def _rank_errors(sketch, values):
+    """每个估计分位数在真实数据中的排名与目标q之差"""
+    ordered = np.sort(values)
+    estimates = sketch.quantile(QUANTILES)
+    ranks = np.searchsorted(ordered, estimates, side='right') / len(ordered)
+    return np.abs(ranks - QUANTILES)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [100, 200])
+def test_rank_error_within_bound(seed, k):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(size=50_000)
+    sketch = KLLSketch(k, seed).update(values)
+
+    assert sketch.retained() < len(values) // 20
+    assert _rank_errors(sketch, values).max() <= sketch.rank_error()
+    assert sketch.quantile(0) == values.min() and sketch.quantile(1) == values.max()
+
+
+def test_merged_partitions_within_bound():
+    rng = np.random.default_rng(11)
+    parts = [rng.normal(loc, size=20_000) for loc in range(5)]
+    merged = KLLSketch(seed=1)
+    for i, part in enumerate(parts):
+        merged.merge(KLLSketch(seed=i).update(part))
+    values = np.concatenate(parts)
+
+    assert merged.count == len(values)
+    assert merged.mean() == pytest.approx(values.mean())
+    assert _rank_errors(merged, values).max() <= merged.rank_error()
+
+
+def test_mean_matches_pandas_with_inf():
+    values = np.array([1.0, np.nan, 3.0, np.inf])
+    sketch = KLLSketch().update(values)
+    assert sketch.count == 2
+    assert sketch.mean() == 2.0
+    assert sketch.mean(include_inf=True) == pd.Series(values).mean() == np.inf
+
+    both = KLLSketch().update(values).merge(KLLSketch().update([-np.inf]))
+    assert np.isnan(both.mean(include_inf=True))
+
+
+def test_units_must_match():
+    with pytest.raises(ValueError):
+        MetricSketches(unit=RATIO).merge(MetricSketches(unit=PERCENT))
+    with pytest.raises(ValueError):
+        analyze_ad_performance(SAMPLE_CSV, Reporter(), sketches=MetricSketches(unit=PERCENT))
+
+
+def test_sketch_means_match_ad_analysis(tmp_path):
+    # 零成本且有收入的广告ROI为inf，草图均值必须与df.mean()相同
+    path = tmp_path / 'zero_cost.csv'
+    with open(SAMPLE_CSV, encoding='utf-8') as f:
+        path.write_text(f.read().rstrip('\n') + '\n999,零成本,1000,50,5,0,300\n', encoding='utf-8')
+
+    df, _, _ = analyze_ad_performance(str(path), Reporter())
+    sketches = sketch_ad_metrics(str(path), chunksize=7)
+    expected = df[['CTR', 'conversion_rate', 'ROI']].mean().to_dict()
+    means = sketches.means(include_inf=True)
+    assert means['ROI'] == expected['ROI'] == np.inf
+    assert means['CTR'] == pytest.approx(expected['CTR'])
+    assert means['conversion_rate'] == pytest.approx(expected['conversion_rate'])
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""汇总立方体的查询结果与对原始行直接groupby的结果一致"""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from marketing_analysis import NUMERIC_COLUMNS, compute_campaign_ratios
+from marketing_schema import load_marketing_csv
+from rollup_cube import CUBE_MEASURES, RollupCube, build_cube
+
+DIMENSIONS = ['campaign', 'day', 'hour']
+
+
+@pytest.fixture
+def frame(timed_csv):
+    frame = load_marketing_csv(timed_csv)
+    frame['day'] = frame['timestamp'].dt.floor('D')
+    frame['hour'] = frame['timestamp'].dt.floor('h')
+    return frame
+
+
+def _source(frame):
+    """立方体由timestamp自行派生day/hour，不使用测试里预先算好的列"""
+    return frame.drop(columns=['day', 'hour'])
+
+
+def _expected(frame, by, where=None):
+    """直接对原始行过滤、分组求和，再用与立方体相同的方式计算比率"""
+    for dimension, selected in (where or {}).items():
+        values = selected if isinstance(selected, list) else [selected]
+        frame = frame[frame[dimension].isin(values)]
+    if by:
+        grouped = frame.groupby(list(by), observed=True, sort=True)
+        sums = grouped[NUMERIC_COLUMNS].sum().astype('float64')
+        sums['ad_count'] = grouped.size()
+        sums = sums.reset_index()
+    else:
+        sums = frame[NUMERIC_COLUMNS].sum().astype('float64').to_frame().T
+        sums['ad_count'] = len(frame)
+    for col in ['impressions', 'clicks', 'conversions', 'ad_count']:
+        sums[col] = sums[col].round().astype('int64')
+    sums[['cost', 'revenue']] = sums[['cost', 'revenue']].round(2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return compute_campaign_ratios(sums)
+
+
+def _assert_same(actual, expected):
+    actual, expected = actual.reset_index(drop=True), expected.reset_index(drop=True)
+    for col in expected.columns:
+        if col in DIMENSIONS:
+            assert actual[col].astype(object).tolist() == expected[col].astype(object).tolist(), col
+        else:
+            np.testing.assert_allclose(actual[col].to_numpy(dtype='float64'),
+                                       expected[col].to_numpy(dtype='float64'), rtol=1e-12, err_msg=col)
+
+
+@pytest.mark.parametrize('by', [c for size in range(4) for c in combinations(DIMENSIONS, size)])
+def test_query_matches_groupby(frame, by):
+    cube = build_cube(_source(frame), DIMENSIONS)
+    _assert_same(cube.query(by), _expected(frame, by))
+
+
+def test_rollup_from_finest_only(frame):
+    # 只预先汇总最细组合时，所有查询都在它上面上卷
+    cube = RollupCube(DIMENSIONS, groupings=[DIMENSIONS]).build(_source(frame))
+    assert list(cube.cuboids) == [tuple(DIMENSIONS)]
+    for by in [(), ('campaign',), ('day', 'hour')]:
+        _assert_same(cube.query(by), _expected(frame, by))
+
+
+def test_filters_and_drill_down(frame):
+    cube = build_cube(_source(frame), DIMENSIONS)
+    campaigns = sorted(frame['campaign'].astype(str).unique())
+    day = frame['day'].iloc[0]
+
+    where = {'campaign': campaigns[:2], 'day': str(day.date())}
+    _assert_same(cube.query(['hour'], where), _expected(frame, ['hour'], {'campaign': campaigns[:2], 'day': day}))
+    _assert_same(cube.drill_down('day', {'campaign': campaigns[0]}),
+                 _expected(frame, ['campaign', 'day'], {'campaign': campaigns[0]}))
+    # 不存在的取值被忽略
+    _assert_same(cube.query(['campaign'], {'campaign': [campaigns[0], 'missing']}),
+                 _expected(frame, ['campaign'], {'campaign': campaigns[0]}))
+
+
+def test_cell_matches_query(frame):
+    cube = build_cube(_source(frame), ['campaign', 'day'])
+    campaign = frame['campaign'].iloc[0]
+    day = frame['day'].iloc[0]
+
+    row = cube.query(['campaign', 'day'], {'campaign': campaign, 'day': day}).iloc[0]
+    cell = cube.cell(campaign=campaign, day=str(day.date()))
+    for measure in CUBE_MEASURES + ['CTR', 'conversion_rate', 'ROI', 'ROAS', 'CPC', 'CPA']:
+        assert cell[measure] == pytest.approx(row[measure], nan_ok=True), measure
+
+    empty = cube.cell(campaign='missing')
+    assert empty['impressions'] == 0 and np.isnan(empty['CTR'])
+
+
+def test_unknown_dimensions(frame):
+    cube = RollupCube(['campaign', 'day'], groupings=[['campaign']]).build(_source(frame))
+    with pytest.raises(KeyError):
+        cube.query(['day'])
+    with pytest.raises(KeyError):
+        cube.query(['region'])
+    with pytest.raises(ValueError):
+        RollupCube(['campaign'], groupings=[['day']])
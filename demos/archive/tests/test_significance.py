@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""显著性检验: 多重比较校正与逐个计算的定义一致，留一基线和胜出概率的边界情况"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from significance import (
+    beta_win_probability, bh_adjust, compare_to_baseline, holm_adjust, normal_cdf,
+    pairwise_comparisons, two_proportion_ztest
+)
+
+
+def _holm_reference(p_values):
+    """按定义逐个计算: 第i小的p值校正为 max_{j<=i} min(1, (m-j)·p_(j))"""
+    valid = [(p, i) for i, p in enumerate(p_values) if not math.isnan(p)]
+    ordered = sorted(valid)
+    m = len(ordered)
+    adjusted = [math.nan] * len(p_values)
+    running = 0.0
+    for rank, (p, i) in enumerate(ordered):
+        running = max(running, min(1.0, (m - rank) * p))
+        adjusted[i] = running
+    return adjusted
+
+
+def _bh_reference(p_values):
+    """按定义逐个计算: 第i小的p值校正为 min_{j>=i} min(1, m·p_(j)/j)"""
+    valid = [(p, i) for i, p in enumerate(p_values) if not math.isnan(p)]
+    ordered = sorted(valid)
+    m = len(ordered)
+    adjusted = [math.nan] * len(p_values)
+    for rank, (p, i) in enumerate(ordered):
+        adjusted[i] = min(min(1.0, m * q / (j + 1)) for j, (q, _) in enumerate(ordered) if j >= rank)
+    return adjusted
+
+
+def test_known_example():
+    p_values = [0.01, 0.04, 0.03, 0.005]
+    np.testing.assert_allclose(holm_adjust(p_values), [0.03, 0.06, 0.06, 0.02])
+    np.testing.assert_allclose(bh_adjust(p_values), [0.02, 0.04, 0.04, 0.02])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_adjustments_match_definition(seed):
+    rng = np.random.default_rng(seed)
+    p_values = np.concatenate([rng.uniform(size=40), rng.uniform(0, 0.01, size=10),
+                               [0.02, 0.02, 0.02, np.nan, np.nan, 0.0, 1.0]])
+    rng.shuffle(p_values)
+
+    np.testing.assert_allclose(holm_adjust(p_values), _holm_reference(p_values.tolist()), equal_nan=True)
+    np.testing.assert_allclose(bh_adjust(p_values), _bh_reference(p_values.tolist()), equal_nan=True)
+    # Holm比BH保守，两者都不小于原始p值
+    valid = ~np.isnan(p_values)
+    assert (holm_adjust(p_values)[valid] >= bh_adjust(p_values)[valid]).all()
+    assert (bh_adjust(p_values)[valid] >= p_values[valid]).all()
+
+
+def test_adjust_all_nan():
+    assert np.isnan(holm_adjust([np.nan, np.nan])).all()
+    assert bh_adjust([]).size == 0
+
+
+def test_ztest_and_normal_cdf():
+    # 200/1000 对 250/1000: 合并比例0.225，z = 0.05 / sqrt(0.225·0.775·0.002)
+    z, p_value = two_proportion_ztest(200, 1000, 250, 1000)
+    expected_z = 0.05 / math.sqrt(0.225 * 0.775 * 0.002)
+    assert z == pytest.approx(expected_z)
+    assert p_value == pytest.approx(math.erfc(expected_z / math.sqrt(2)), rel=1e-6)
+    np.testing.assert_allclose(normal_cdf([-3, 0, 1.96]), [0.0013499, 0.5, 0.9750021], atol=1e-6)
+
+    z, p_value = two_proportion_ztest([0, 5], [0, 10], [3, 0], [10, 10])
+    assert np.isnan(z[0]) and np.isnan(p_value[0])
+
+
+def test_win_probability_direction():
+    assert beta_win_probability(10, 1000, 30, 1000) > 0.99
+    assert beta_win_probability(30, 1000, 10, 1000) < 0.01
+    assert beta_win_probability(20, 1000, 20, 1000) == pytest.approx(0.5)
+
+
+def test_baseline_masks_win_prob_without_trials():
+    frame = pd.DataFrame({
+        'campaign': ['a', 'a', 'a', 'b', 'c', 'c'],
+        'impressions': [1000, 1000, 2000, 500, 0, 800],
+        'clicks': [20, 40, 60, 10, 0, 16],
+        'conversions': [1, 2, 3, 1, 0, 1],
+    })
+    result = compare_to_baseline(frame, 'CTR')
+
+    # a组: 每个广告对其余两个广告合计
+    np.testing.assert_allclose(result['baseline'][:3], [100 / 3000, 80 / 3000, 60 / 2000])
+    z, p_value = two_proportion_ztest(100, 3000, 20, 1000)
+    assert result['z'].iloc[0] == pytest.approx(z)
+    assert result['p_value'].iloc[0] == pytest.approx(p_value)
+    assert result['win_prob'][:3].notna().all()
+
+    # b只有一个广告 (没有基线)，c中一个广告没有展示: 胜出概率和检验都为NaN
+    assert result.loc[3:5, 'win_prob'].isna().all()
+    assert result.loc[3:5, 'z'].isna().all() and result.loc[3:5, 'q_value'].isna().all()
+    # BH只在有p值的行之间校正
+    np.testing.assert_allclose(result['q_value'].dropna(), bh_adjust(result['p_value'].dropna()))
+
+
+def test_pairwise_comparisons():
+    campaigns = pd.DataFrame({'campaign': ['a', 'b', 'c', 'empty'],
+                              'impressions': [10000, 10000, 10000, 0],
+                              'clicks': [200, 300, 210, 0]})
+    pairs = pairwise_comparisons(campaigns, 'CTR', 'campaign')
+
+    assert list(zip(pairs['a'], pairs['b'])) == [('a', 'b'), ('a', 'c'), ('a', 'empty'),
+                                                 ('b', 'c'), ('b', 'empty'), ('c', 'empty')]
+    assert pairs.loc[0, 'z'] > 0 and pairs.loc[3, 'z'] < 0
+    np.testing.assert_allclose(pairs['p_holm'], holm_adjust(pairs['p_value']), equal_nan=True)
+    assert pairs[pairs['b'] == 'empty'][['z', 'win_prob']].isna().all().all()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""时间窗口聚合: 与直接分组求和对比，以及timestamp缺失的处理"""
+
+import numpy as np
+import pandas as pd
+
+from marketing_analysis import NUMERIC_COLUMNS, MarketingDataAnalyzer
+from marketing_schema import load_marketing_csv
+from reporting import Reporter
+from windowed_metrics import WindowedAggregator
+
+
+def _grouped(frame, start, end):
+    """[start, end) 内各campaign的计数合计"""
+    inside = frame[(frame['timestamp'] >= start) & (frame['timestamp'] < end)]
+    sums = inside.groupby('campaign', observed=True)[NUMERIC_COLUMNS].sum().astype('float64')
+    sums['events'] = inside.groupby('campaign', observed=True).size()
+    return sums.sort_index()
+
+
+def _window_sums(frame):
+    sums = frame.set_index('campaign')[NUMERIC_COLUMNS + ['events']].astype('float64')
+    sums.index = sums.index.astype(object)
+    return sums.sort_index()
+
+
+def test_tumbling_windows_match_groupby(timed_csv):
+    frame = load_marketing_csv(timed_csv)
+    aggregator = WindowedAggregator('1D', key='campaign')
+    for _, chunk in frame.groupby(np.arange(len(frame)) // 97):
+        aggregator.update(chunk)
+
+    series = aggregator.series()
+    assert aggregator.late_events == 0
+    assert series['events'].sum() == len(frame)
+    for window_start, window in series.groupby('window_start'):
+        expected = _grouped(frame, window_start, window_start + pd.Timedelta('1D'))
+        expected.index = expected.index.astype(object)
+        pd.testing.assert_frame_equal(_window_sums(window), expected, check_dtype=False,
+                                      check_names=False, atol=0.01)
+
+
+def test_sliding_window_matches_groupby(timed_csv):
+    frame = load_marketing_csv(timed_csv)
+    aggregator = WindowedAggregator('24h', '1h', key='campaign').update(frame)
+
+    current = aggregator.current()
+    window_end = current['window_end'].iloc[0]
+    expected = _grouped(frame, window_end - pd.Timedelta('24h'), window_end)
+    expected.index = expected.index.astype(object)
+    pd.testing.assert_frame_equal(_window_sums(current), expected, check_dtype=False,
+                                  check_names=False, atol=0.01)
+
+
+def test_missing_timestamps_are_dropped_and_counted(timed_csv):
+    frame = load_marketing_csv(timed_csv)
+    holed = frame.copy()
+    holed.loc[[0, 10, 300], 'timestamp'] = pd.NaT
+
+    aggregator = WindowedAggregator('1D', key='campaign').update(holed)
+    reference = WindowedAggregator('1D', key='campaign').update(holed.dropna(subset=['timestamp']))
+
+    assert aggregator.missing_timestamps == 3
+    assert aggregator.late_events == 0
+    pd.testing.assert_frame_equal(aggregator.series(), reference.series())
+    # 不会因为NaT产生1677年的虚假窗口
+    assert aggregator.series()['window_start'].min() >= frame['timestamp'].min().floor('1D')
+
+
+def test_analysis_with_missing_timestamp(timed_csv, tmp_path):
+    frame = pd.read_csv(timed_csv, dtype={'ad_id': str})
+    frame.loc[3, 'timestamp'] = None
+    path = tmp_path / 'missing_timestamp.csv'
+    frame.to_csv(path, index=False)
+
+    analyzer = MarketingDataAnalyzer(str(path), reporter=Reporter())
+    results = analyzer.run_complete_analysis()
+
+    windows = results['dashboard_data']['time_windows']['daily_campaign']
+    assert windows
+    assert sum(record['events'] for record in windows) == len(frame) - 1
+    assert all(aggregator.missing_timestamps == 1 for aggregator in analyzer.time_windows().values())
+
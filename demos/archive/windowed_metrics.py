@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间窗口指标 - 滚动(tumbling)与滑动(sliding)窗口
+按campaign或广告维护环形缓冲区: 窗口被切成若干个slide宽的桶，每个事件只累加到所在的桶和窗口合计，
+时钟前进时淘汰最旧的桶，不需要对历史数据重新分组；窗口关闭时输出一行记录
+数据需要timestamp列 (见marketing_schema.TIMESTAMP_COLUMN)
+"""
+
+from collections import deque
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from marketing_analysis import NUMERIC_COLUMNS, compute_campaign_ratios
+from marketing_schema import TIMESTAMP_COLUMN
+
+# 环形缓冲区中每个桶保存的列: 可加总的计数列 + 事件数
+WINDOW_COLUMNS = NUMERIC_COLUMNS + ['events']
+
+# dashboard默认输出的窗口: 名称 -> (维度, 窗口长度, 滑动步长)
+DASHBOARD_WINDOWS = {
+    'daily_campaign': ('campaign', '1D', '1D'),
+    'rolling_24h_campaign': ('campaign', '24h', '1h'),
+}
+
+
+class WindowedAggregator:
+    """
+    单一维度 (key列) 的窗口聚合器
+    slide等于window时为滚动窗口，否则为滑动窗口 (window必须是slide的整数倍)
+    内存为 维度取值数 × 桶数 × 计数列数，与事件数无关；按广告聚合时应选较少的桶数
+    """
+
+    def __init__(self, window: str = '1D', slide: str = None, key: str = 'campaign',
+                 max_history: int = 1000):
+        self.window = pd.Timedelta(window)
+        self.slide = pd.Timedelta(slide or window)
+        if self.window % self.slide:
+            raise ValueError(f"窗口长度 {window} 必须是滑动步长 {slide} 的整数倍")
+        self.key = key
+        self.slots = int(self.window // self.slide)
+        self._slide_ns = self.slide.value
+
+        self._key_index = pd.Index([], dtype=object)
+        self._buckets = np.zeros((0, self.slots, len(WINDOW_COLUMNS)))
+        self._totals = np.zeros((0, len(WINDOW_COLUMNS)))
+        self._current = None
+        self.late_events = 0
+        # timestamp缺失的事件无法分桶，同样丢弃并计数
+        self.missing_timestamps = 0
+        # 已关闭窗口: (窗口结束时间, 该窗口内有数据的维度取值及合计)
+        self.history = deque(maxlen=max_history)
+
+    def _key_positions(self, keys: pd.Series) -> np.ndarray:
+        """维度取值对应的行号，新取值追加到末尾，数组按倍数扩容"""
+        positions = self._key_index.get_indexer(keys)
+        new_keys = pd.unique(keys[positions < 0])
+        if len(new_keys):
+            self._key_index = self._key_index.append(pd.Index(np.asarray(new_keys, dtype=object)))
+            capacity = len(self._totals)
+            if len(self._key_index) > capacity:
+                grow = max(len(self._key_index), capacity * 2) - capacity
+                self._buckets = np.concatenate([self._buckets, np.zeros((grow,) + self._buckets.shape[1:])])
+                self._totals = np.concatenate([self._totals, np.zeros((grow, self._totals.shape[1]))])
+            positions = self._key_index.get_indexer(keys)
+        return positions
+
+    def _advance(self, bucket: int):
+        """时钟前进到bucket: 依次关闭经过的窗口并淘汰离开窗口的桶"""
+        if self._current is None:
+            self._current = bucket
+            return
+        while self._current < bucket:
+            if not self._totals[:, -1].any():
+                # 窗口内已经没有数据，直接跳到新时间
+                self._current = bucket
+                break
+            self._emit()
+            self._current += 1
+            slot = self._current % self.slots
+            self._totals -= self._buckets[:, slot]
+            self._buckets[:, slot] = 0
+            # 事件数归零的维度清掉金额相减留下的浮点残差
+            self._totals[self._totals[:, -1] == 0] = 0
+
+    def _emit(self):
+        window_end = pd.Timestamp((self._current + 1) * self._slide_ns)
+        active = np.flatnonzero(self._totals[:, -1])
+        self.history.append((window_end, self._key_index[active], self._totals[active].copy()))
+
+    def update(self, frame: pd.DataFrame) -> 'WindowedAggregator':
+        """
+        加入一批事件 (需要timestamp、key和计数列)
+        批内按时间顺序处理；早于当前窗口起点的迟到事件和timestamp缺失的事件丢弃并计数
+        """
+        missing = frame[TIMESTAMP_COLUMN].isna()
+        if missing.any():
+            # NaT转为int64是int64最小值，会变成一个虚假的极早的桶
+            self.missing_timestamps += int(missing.sum())
+            frame = frame[~missing]
+        if len(frame) == 0:
+            return self
+        buckets = frame[TIMESTAMP_COLUMN].to_numpy(dtype='datetime64[ns]').astype(np.int64) // self._slide_ns
+        positions = self._key_positions(frame[self.key])
+        values = np.column_stack([frame[NUMERIC_COLUMNS].to_numpy(dtype='float64'), np.ones(len(frame))])
+
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        bucket_ids, starts = np.unique(sorted_buckets, return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        for bucket, start, end in zip(bucket_ids.tolist(), starts.tolist(), ends.tolist()):
+            if self._current is None or bucket > self._current:
+                self._advance(bucket)
+            rows = order[start:end]
+            if bucket <= self._current - self.slots:
+                self.late_events += len(rows)
+                continue
+            # 每个事件只加到一个桶和一行合计上
+            np.add.at(self._buckets, (positions[rows], bucket % self.slots), values[rows])
+            np.add.at(self._totals, positions[rows], values[rows])
+        return self
+
+    def _frame(self, keys, totals: np.ndarray) -> pd.DataFrame:
+        frame = pd.DataFrame(totals, columns=WINDOW_COLUMNS)
+        frame.insert(0, self.key, np.asarray(keys))
+        for col in ['impressions', 'clicks', 'conversions', 'events']:
+            frame[col] = frame[col].round().astype('int64')
+        frame[['cost', 'revenue']] = frame[['cost', 'revenue']].round(2)
+        # 窗口内没有点击/转化时比率记为空，而不是无穷大
+        return compute_campaign_ratios(frame).replace([np.inf, -np.inf], np.nan)
+
+    def current(self) -> pd.DataFrame:
+        """当前 (尚未关闭) 窗口内各维度取值的合计和比率指标"""
+        if self._current is None:
+            frame, window_end = self._frame([], np.zeros((0, len(WINDOW_COLUMNS)))), pd.NaT
+        else:
+            active = np.flatnonzero(self._totals[:, -1])
+            frame = self._frame(self._key_index[active], self._totals[active])
+            window_end = pd.Timestamp((self._current + 1) * self._slide_ns)
+        frame.insert(0, 'window_start', window_end - self.window)
+        frame.insert(1, 'window_end', window_end)
+        return frame
+
+    def closed_windows(self) -> pd.DataFrame:
+        """已关闭窗口的时间序列，每个窗口每个维度取值一行"""
+        frames = []
+        for window_end, keys, totals in self.history:
+            frame = self._frame(keys, totals)
+            frame.insert(0, 'window_start', window_end - self.window)
+            frame.insert(1, 'window_end', window_end)
+            frames.append(frame)
+        if not frames:
+            return self.current().iloc[0:0]
+        return pd.concat(frames, ignore_index=True)
+
+    def series(self) -> pd.DataFrame:
+        """已关闭窗口加上当前窗口，便于画趋势图"""
+        return pd.concat([self.closed_windows(), self.current()], ignore_index=True)
+
+
+def build_windows(frame: pd.DataFrame, windows: Dict = None) -> Dict[str, WindowedAggregator]:
+    """按windows配置 (名称 -> (维度, 窗口长度, 滑动步长)) 为frame建立窗口聚合器"""
+    aggregators = {}
+    for name, (key, window, slide) in (windows or DASHBOARD_WINDOWS).items():
+        aggregators[name] = WindowedAggregator(window, slide, key).update(frame)
+    return aggregators
+
+
+def window_records(frame: pd.DataFrame) -> List[Dict]:
+    """窗口结果转为dashboard中的记录列表，时间输出为ISO字符串"""
+    frame = frame.copy()
+    for col in ['window_start', 'window_end']:
+        frame[col] = frame[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def dashboard_windows(aggregators: Dict[str, WindowedAggregator]) -> Dict[str, List[Dict]]:
+    """
+    dashboard输出: 滚动窗口给出完整时间序列 (如每日ROI趋势)，
+    滑动窗口只给出当前窗口，避免每个步长都输出一遍
+    """
+    return {
+        name: window_records(aggregator.series() if aggregator.slide == aggregator.window
+                             else aggregator.current())
+        for name, aggregator in aggregators.items()
+    }